@@ -12,16 +12,33 @@ https://docs.djangoproject.com/en/5.1/ref/settings/
 
 from pathlib import Path
 import os
+import tempfile
+from urllib.parse import unquote, urlsplit
 from dotenv import load_dotenv
 
 load_dotenv()
 
 GEMINI_API_KEY = os.getenv("GEMINI_API_KEY")
 
-
 # Build paths inside the project like this: BASE_DIR / 'subdir'.
 BASE_DIR = Path(__file__).resolve().parent.parent
 
+# Category prediction (see tracker/categorizer.py). Set TRACKER_CATEGORY_BACKEND
+# to tracker.categorizer.KeywordBackend to run without the remote model.
+TRACKER_CATEGORY_BACKEND = os.getenv("TRACKER_CATEGORY_BACKEND", "tracker.categorizer.GeminiBackend")
+TRACKER_CATEGORY_ASYNC = os.getenv("TRACKER_CATEGORY_ASYNC", "") == "1"
+TRACKER_CATEGORY_CACHE_SIZE = 10000
+TRACKER_CATEGORY_BATCH_SIZE = 20
+TRACKER_CATEGORY_BATCH_WAIT = 0.2  # seconds to wait for more names before sending a batch
+# Local classifier tried before the backend; built by `manage.py train_category_model`.
+TRACKER_CATEGORY_MODEL_PATH = os.getenv("TRACKER_CATEGORY_MODEL_PATH", str(BASE_DIR / 'category_model.joblib'))
+TRACKER_CATEGORY_MIN_CONFIDENCE = float(os.getenv("TRACKER_CATEGORY_MIN_CONFIDENCE", "0.6"))
+# Async views call the Gemini REST API directly; point TRACKER_GEMINI_API_URL at a
+# local fake to run without the service. Timeout in seconds, concurrency per process.
+TRACKER_GEMINI_API_URL = os.getenv("TRACKER_GEMINI_API_URL", "https://generativelanguage.googleapis.com/v1beta")
+TRACKER_CATEGORY_TIMEOUT = float(os.getenv("TRACKER_CATEGORY_TIMEOUT", "10"))
+TRACKER_CATEGORY_MAX_CONCURRENCY = int(os.getenv("TRACKER_CATEGORY_MAX_CONCURRENCY", "8"))
+
 
 # Quick-start development settings - unsuitable for production
 # See https://docs.djangoproject.com/en/5.1/howto/deployment/checklist/
@@ -48,6 +65,7 @@ INSTALLED_APPS = [
 ]
 
 MIDDLEWARE = [
+    'tracker.perf.PerfMiddleware',
     'django.middleware.security.SecurityMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
@@ -81,13 +99,138 @@ WSGI_APPLICATION = 'ExpenseTracker.wsgi.application'
 # Database
 # https://docs.djangoproject.com/en/5.1/ref/settings/#databases
 
+# WAL lets readers and the single writer proceed concurrently; synchronous=NORMAL
+# is durable across app crashes under WAL. IMMEDIATE transactions take the write
+# lock up front, so concurrent writers queue on `timeout` instead of failing
+# with "database is locked" when a read transaction tries to upgrade.
+SQLITE_OPTIONS = {
+    'init_command': (
+        'PRAGMA journal_mode=WAL;'
+        'PRAGMA synchronous=NORMAL;'
+        'PRAGMA cache_size=-20000;'
+        'PRAGMA temp_store=MEMORY;'
+        'PRAGMA mmap_size=134217728'
+    ),
+    'transaction_mode': 'IMMEDIATE',
+    'timeout': 20,
+}
+
 DATABASES = {
     'default': {
         'ENGINE': 'django.db.backends.sqlite3',
         'NAME': BASE_DIR / 'db.sqlite3',
+        'OPTIONS': SQLITE_OPTIONS,
+        # Keep connections across requests; health checks replace ones that went away.
+        'CONN_MAX_AGE': int(os.getenv("TRACKER_DB_CONN_MAX_AGE", "600")),
+        'CONN_HEALTH_CHECKS': True,
+    }
+}
+
+
+def _replica_database(location):
+    """DATABASES entry for TRACKER_DB_REPLICA: a postgres:// URL or a SQLite file path."""
+    url = urlsplit(location)
+    if url.scheme in ('postgres', 'postgresql'):
+        database = {
+            'ENGINE': 'django.db.backends.postgresql',
+            'NAME': url.path.lstrip('/'),
+            'USER': unquote(url.username or ''),
+            'PASSWORD': unquote(url.password or ''),
+            'HOST': url.hostname or '',
+            'PORT': str(url.port or ''),
+        }
+    else:
+        # A copy of db.sqlite3 refreshed by `manage.py sync_replica`.
+        database = {
+            'ENGINE': 'django.db.backends.sqlite3',
+            'NAME': location,
+            'OPTIONS': {**SQLITE_OPTIONS, 'init_command': SQLITE_OPTIONS['init_command'] + ';PRAGMA query_only=ON'},
+        }
+    database.update({
+        'CONN_MAX_AGE': DATABASES['default']['CONN_MAX_AGE'],
+        'CONN_HEALTH_CHECKS': True,
+        'TEST': {'MIRROR': 'default'},
+    })
+    return database
+
+
+# Dashboard and report reads go to this read-only copy when it is set. After a
+# user writes, their reads stay on the primary until the replica has caught up
+# with that write, for at most TRACKER_DB_REPLICA_PIN_SECONDS; keep it above the
+# replica's worst lag (the sync_replica interval for the SQLite stand-in).
+if os.getenv("TRACKER_DB_REPLICA"):
+    DATABASES['replica'] = _replica_database(os.getenv("TRACKER_DB_REPLICA"))
+DATABASE_ROUTERS = ['tracker.routers.ReplicaRouter']
+TRACKER_DB_REPLICA_PIN_SECONDS = int(os.getenv("TRACKER_DB_REPLICA_PIN_SECONDS", "600"))
+
+
+# Cache
+# Every worker process must see the same entries: invalidation, data versions
+# and replica pins are written by whichever worker handled the write. The
+# file-based backend shares them between the processes of one host; point
+# TRACKER_CACHE_DIR at a directory all workers can reach.
+
+CACHES = {
+    'default': {
+        'BACKEND': 'django.core.cache.backends.filebased.FileBasedCache',
+        'LOCATION': os.getenv("TRACKER_CACHE_DIR") or os.path.join(tempfile.gettempdir(), 'expense-tracker-cache'),
+        'OPTIONS': {'MAX_ENTRIES': int(os.getenv("TRACKER_CACHE_MAX_ENTRIES", "10000"))},
     }
 }
 
+# Anomaly alerts are cached per user under a version that expense writes replace.
+# When TRACKER_ANOMALY_ASYNC is on, writes also recompute them on a background
+# thread pool.
+TRACKER_ANOMALY_CACHE_TIMEOUT = 60 * 60 * 24
+TRACKER_ANOMALY_ASYNC = os.getenv("TRACKER_ANOMALY_ASYNC", "") == "1"
+TRACKER_ANOMALY_WORKERS = int(os.getenv("TRACKER_ANOMALY_WORKERS", "2"))
+# Next-month forecasts are cached per user and day and dropped when expenses change.
+TRACKER_FORECAST_CACHE_TIMEOUT = 60 * 60 * 24
+# Rendered dashboard fragments, keyed by user and sync.data_version(); writes make them unreachable.
+TRACKER_FRAGMENT_CACHE_TIMEOUT = 60 * 60
+# Memory-mapped per-user column snapshots for analytics (see tracker/snapshots.py);
+# off unless a directory is given. Deltas past TRACKER_SNAPSHOT_COMPACT_ROWS
+# rows are folded into a new base on the next write. Changes are re-read from
+# TRACKER_SNAPSHOT_SLACK_SECONDS before each watermark, since a transaction can
+# commit after it with rows stamped earlier.
+TRACKER_SNAPSHOT_DIR = os.getenv("TRACKER_SNAPSHOT_DIR") or None
+TRACKER_SNAPSHOT_COMPACT_ROWS = int(os.getenv("TRACKER_SNAPSHOT_COMPACT_ROWS", "2000"))
+TRACKER_SNAPSHOT_SLACK_SECONDS = 5
+# The change feed (tracker/sync.py) starts each sync this many seconds before
+# the client's cursor, for the same reason; clients apply changes by id.
+TRACKER_SYNC_SLACK_SECONDS = 5
+
+# archive_expenses moves expenses older than this many days (from the start of
+# that month) to the archive table, leaving monthly summaries behind.
+TRACKER_ARCHIVE_AFTER_DAYS = int(os.getenv("TRACKER_ARCHIVE_AFTER_DAYS", "730"))
+
+# Budgets project the period's spend from the average daily spend over this many days.
+TRACKER_BUDGET_BURN_DAYS = int(os.getenv("TRACKER_BUDGET_BURN_DAYS", "14"))
+
+# Per-request timings (tracker/perf.py): Server-Timing header plus one JSON log
+# line per request. TRACKER_PERF_PROFILE_RATE is the fraction of requests run
+# under the stack sampler; its output is passed to TRACKER_PERF_PROFILE_HOOK
+# when the request takes TRACKER_PERF_SLOW_MS or longer.
+TRACKER_PERF = os.getenv("TRACKER_PERF", "1") == "1"
+TRACKER_PERF_SLOW_MS = float(os.getenv("TRACKER_PERF_SLOW_MS", "500"))
+TRACKER_PERF_PROFILE_RATE = float(os.getenv("TRACKER_PERF_PROFILE_RATE", "0"))
+TRACKER_PERF_PROFILE_HOOK = "tracker.perf.log_profile"
+
+LOGGING = {
+    'version': 1,
+    'disable_existing_loggers': False,
+    'handlers': {
+        'console': {'class': 'logging.StreamHandler'},
+    },
+    'loggers': {
+        'tracker.perf': {
+            'handlers': ['console'],
+            'level': os.getenv("TRACKER_PERF_LOG_LEVEL", "INFO"),
+            'propagate': False,
+        },
+    },
+}
+
 
 # Password validation
 # https://docs.djangoproject.com/en/5.1/ref/settings/#auth-password-validators
@@ -1,8 +1,57 @@
 from django.contrib import admin
-from django.contrib import admin
-from .models import Expense
+from django.db import transaction
+from .models import (ArchiveCutoff, ArchivedExpense, Budget, DailyCategoryTotal, Expense, MonthlyCategoryTotal,
+                     RecurringExpense, Report, ReportRun)
+from . import rollups, sync
+from .hooks import expenses_changed
+
+
+@admin.register(Expense)
+class ExpenseAdmin(admin.ModelAdmin):
+    # Keep the spend rollups in step with edits made through the admin, in the
+    # same transaction as the row; the hooks run once it has committed.
+    def save_model(self, request, obj, form, change):
+        with transaction.atomic():
+            before = Expense.objects.filter(pk=obj.pk).first() if change else None
+            super().save_model(request, obj, form, change)
+            if before is not None:
+                rollups.move_expense(before, obj)
+                if before.user_id != obj.user_id:
+                    _changed_on_commit(before.user_id)
+            else:
+                rollups.record_expense(obj)
+            _changed_on_commit(obj.user_id)
+
+    def delete_model(self, request, obj):
+        with transaction.atomic():
+            rollups.forget_expense(obj)
+            sync.record_deletions([obj])
+            super().delete_model(request, obj)
+            _changed_on_commit(obj.user_id)
+
+    def delete_queryset(self, request, queryset):
+        with transaction.atomic():
+            user_ids = set(queryset.values_list('user_id', flat=True))
+            rollups.forget_expenses(queryset)
+            sync.record_deletions(queryset)
+            super().delete_queryset(request, queryset)
+            for user_id in user_ids:
+                _changed_on_commit(user_id)
+
+
+def _changed_on_commit(user_id):
+    # The admin's change and delete views already run inside a transaction.
+    transaction.on_commit(lambda: expenses_changed(user_id))
+
 
-admin.site.register(Expense)
+admin.site.register(DailyCategoryTotal)
+admin.site.register(Budget)
+admin.site.register(RecurringExpense)
+admin.site.register(ReportRun)
+admin.site.register(Report)
+admin.site.register(ArchivedExpense)
+admin.site.register(MonthlyCategoryTotal)
+admin.site.register(ArchiveCutoff)
 
 
 # Register your models here.
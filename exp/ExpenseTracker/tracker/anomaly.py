@@ -0,0 +1,147 @@
+"""
+Vectorized spending anomaly detection.
+
+Works on whole ExpenseColumns arrays: no per-row iteration and no per-group
+Python loops. The detectors run in display order (large expenses, weekly
+bill clusters, per-category/per-week IQR outliers) and stop as soon as
+`limit` alerts have been found.
+"""
+import datetime
+from dataclasses import asdict, dataclass
+from typing import Optional
+
+import numpy as np
+
+LARGE_EXPENSE_FLOOR = 2000
+LARGE_EXPENSE_MEDIAN_FACTOR = 2.5
+BILL_CLUSTER_MIN = 2
+IQR_FACTOR = 1.5
+MAX_ALERTS = 5
+
+_EPOCH_ORDINAL = datetime.date(1970, 1, 1).toordinal()
+
+
+@dataclass(frozen=True)
+class Alert:
+    kind: str                     # 'large', 'bill_cluster' or 'category'
+    amount: float
+    name: Optional[str] = None
+    category: Optional[str] = None
+    week: Optional[datetime.date] = None
+    count: Optional[int] = None
+    lower: Optional[float] = None
+    upper: Optional[float] = None
+
+    @property
+    def message(self):
+        if self.kind == 'large':
+            return (f"⚠️ Large Expense: ₹{self.amount:.2f} for {self.name} "
+                    f"(exceeds ₹{self.upper:.2f} threshold)")
+        if self.kind == 'bill_cluster':
+            return (f"⚠️ Bill Cluster: {self.count} bills totaling "
+                    f"₹{self.amount:.2f} (week of {self.week.strftime('%m/%d')})")
+        return (f"⚠️ Unusual {self.category} spending: ₹{self.amount:.2f} "
+                f"(typical range: ₹{self.lower:.2f}-₹{self.upper:.2f})")
+
+    def __str__(self):
+        return self.message
+
+    def as_dict(self):
+        data = asdict(self)
+        data['message'] = self.message
+        if self.week is not None:
+            data['week'] = self.week.isoformat()
+        return data
+
+
+def week_starts(dates):
+    """Monday of each date's week, as int days since the epoch (1970-01-01 was a Thursday)."""
+    days = dates.astype('int64')
+    return days - (days + 3) % 7
+
+
+def _grouped_quantile(sorted_values, starts, sizes, q):
+    """Linear-interpolated quantile of each contiguous sorted group, all groups at once."""
+    pos = (sizes - 1) * q
+    lo = np.floor(pos).astype(np.intp)
+    hi = np.ceil(pos).astype(np.intp)
+    below = sorted_values[starts + lo]
+    above = sorted_values[starts + hi]
+    return below + (above - below) * (pos - lo)
+
+
+def large_expenses(columns, limit):
+    threshold = max(LARGE_EXPENSE_FLOOR, float(np.median(columns.amounts)) * LARGE_EXPENSE_MEDIAN_FACTOR)
+    hits = np.flatnonzero(columns.amounts > threshold)[:limit]
+    return [
+        Alert('large', float(columns.amounts[i]), name=columns.names[i], upper=threshold)
+        for i in hits
+    ]
+
+
+def bill_clusters(columns, limit, weeks=None):
+    is_bill = np.array(['bill' in str(c).lower() for c in columns.categories], dtype=bool)
+    mask = is_bill[columns.category_codes] if len(is_bill) else np.zeros(len(columns), dtype=bool)
+    if not mask.any():
+        return []
+    weeks = week_starts(columns.dates) if weeks is None else weeks
+    unique_weeks, inverse, counts = np.unique(weeks[mask], return_inverse=True, return_counts=True)
+    totals = np.bincount(inverse, weights=columns.amounts[mask])
+    hits = np.flatnonzero(counts >= BILL_CLUSTER_MIN)[:limit]
+    return [
+        Alert('bill_cluster', float(totals[i]), count=int(counts[i]),
+              week=datetime.date.fromordinal(_EPOCH_ORDINAL + int(unique_weeks[i])))
+        for i in hits
+    ]
+
+
+def category_outliers(columns, limit, weeks=None):
+    n = len(columns)
+    if n < 2:
+        return []
+    weeks = week_starts(columns.dates) if weeks is None else weeks
+    amounts = columns.amounts
+    codes = columns.category_codes
+
+    # Sort by (category, week, amount) so every group is a contiguous, sorted run.
+    order = np.lexsort((amounts, weeks, codes))
+    s_codes, s_weeks, s_amounts = codes[order], weeks[order], amounts[order]
+    boundary = np.empty(n, dtype=bool)
+    boundary[0] = True
+    boundary[1:] = (s_codes[1:] != s_codes[:-1]) | (s_weeks[1:] != s_weeks[:-1])
+    starts = np.flatnonzero(boundary)
+    sizes = np.diff(np.append(starts, n))
+
+    q1 = _grouped_quantile(s_amounts, starts, sizes, 0.25)
+    q3 = _grouped_quantile(s_amounts, starts, sizes, 0.75)
+    iqr = q3 - q1
+    lower, upper = q1 - IQR_FACTOR * iqr, q3 + IQR_FACTOR * iqr
+
+    # Map group bounds back onto rows in their original (display) order.
+    group_of_sorted = np.cumsum(boundary) - 1
+    group = np.empty(n, dtype=np.intp)
+    group[order] = group_of_sorted
+    row_lower, row_upper = lower[group], upper[group]
+    outlier = (sizes[group] > 1) & ((amounts < row_lower) | (amounts > row_upper))
+    rows = np.flatnonzero(outlier)
+    rows = rows[np.lexsort((rows, group[rows]))][:limit]
+    return [
+        Alert('category', float(amounts[i]), category=columns.categories[codes[i]],
+              lower=float(row_lower[i]), upper=float(row_upper[i]))
+        for i in rows
+    ]
+
+
+def detect(columns, limit=MAX_ALERTS):
+    """Run the detectors in display order and return up to `limit` Alerts."""
+    if not len(columns):
+        return []
+    alerts = large_expenses(columns, limit)
+    if len(alerts) >= limit:
+        return alerts
+    weeks = week_starts(columns.dates)
+    for detector in (bill_clusters, category_outliers):
+        alerts.extend(detector(columns, limit - len(alerts), weeks))
+        if len(alerts) >= limit:
+            break
+    return alerts
@@ -0,0 +1,93 @@
+"""
+Per-user cache of anomaly alerts.
+
+The dashboard serves whatever was last computed for the user. Entries are
+keyed by a per-user version that expense writes replace (and, with
+TRACKER_ANOMALY_ASYNC, recompute on a small thread pool). A computation
+reads the version before the rows, so one that raced a write stores its
+alerts under the old version, where no later read looks. The version lives
+in the shared cache, so a write in one worker process reaches all of them.
+
+The NumPy-backed detection modules are imported on first compute, so
+importing this module (and with it the URLconf) stays cheap.
+"""
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import connections
+
+from . import perf
+
+_executor = None
+_executor_lock = threading.Lock()
+
+
+def _version_key(user_id):
+    return f"tracker:anomaly-version:{user_id}"
+
+
+def _version(user_id):
+    key = _version_key(user_id)
+    # A clock value, so a version that was evicted never comes back as one whose alerts are cached.
+    cache.add(key, time.time_ns(), None)
+    return cache.get(key)
+
+
+def _key(user_id, version):
+    return f"tracker:anomaly:{user_id}:{version}"
+
+
+def compute(user_id, columns=None, version=None):
+    """Run detection for a user and store the result."""
+    from . import anomaly, snapshots
+
+    if version is None:
+        version = _version(user_id)
+    with perf.span('anomaly'):
+        if columns is None:
+            columns = snapshots.load(user_id)
+        alerts = tuple(anomaly.detect(columns, limit=anomaly.MAX_ALERTS))
+    cache.set(_key(user_id, version), alerts, settings.TRACKER_ANOMALY_CACHE_TIMEOUT)
+    return alerts
+
+
+def get_alerts(user_id, columns=None):
+    """Cached alerts for a user, computing them on a miss."""
+    with perf.span('cache'):
+        version = _version(user_id)
+        alerts = cache.get(_key(user_id, version))
+    perf.count('anomaly_cache_hit' if alerts is not None else 'anomaly_cache_miss')
+    if alerts is None:
+        alerts = compute(user_id, columns, version)
+    return alerts
+
+
+def _refresh(user_id):
+    try:
+        compute(user_id)
+    except Exception as e:
+        print(f"Anomaly refresh error for user {user_id}: {e}")
+    finally:
+        connections.close_all()  # only this worker thread's connections
+
+
+def _get_executor():
+    global _executor
+    with _executor_lock:
+        if _executor is None:
+            _executor = ThreadPoolExecutor(
+                max_workers=settings.TRACKER_ANOMALY_WORKERS,
+                thread_name_prefix='anomaly-refresh',
+            )
+        return _executor
+
+
+def invalidate(user_id):
+    """Called after a user's expenses change (and committed)."""
+    # A fresh value rather than incr(): two concurrent writes must not both land on the same next version.
+    cache.set(_version_key(user_id), time.time_ns(), None)
+    if settings.TRACKER_ANOMALY_ASYNC:
+        _get_executor().submit(_refresh, user_id)
@@ -0,0 +1,210 @@
+"""
+JSON API for expenses.
+
+GET  /api/expenses/?after=<cursor>   one keyset page, newest first
+POST /api/expenses/                  {"create": [...], "update": [...], "delete": [ids]}
+GET  /api/changes/?since=<cursor>    rows changed or deleted since the cursor
+
+A batch is validated as a whole and applied in one transaction with
+bulk_create/bulk_update/one DELETE and a single rollup update, so a client
+can sync any number of changes (up to MAX_OPERATIONS) in one round trip.
+Nothing is written if any operation is invalid.
+
+The views are async: category predictions for a batch go out concurrently
+and the ORM work runs in the request's sync thread.
+"""
+import json
+
+from asgiref.sync import sync_to_async
+
+from django.db import transaction
+from django.http import JsonResponse
+from django.utils import timezone
+
+from . import archive, categorizer, rollups, sync
+from .forms import ExpenseForm
+from .hooks import expenses_changed
+from .models import Expense
+
+MAX_OPERATIONS = 1000
+FIELDS = ('name', 'amount', 'date', 'category', 'updated_at')
+
+
+def serialize(expense):
+    return {'id': expense.id, 'name': expense.name, 'amount': str(expense.amount),
+            'date': expense.date.isoformat(), 'category': expense.category,
+            'updated_at': expense.updated_at.isoformat()}
+
+
+def _error(status, message, **extra):
+    return JsonResponse({'error': message, **extra}, status=status)
+
+
+def _clean_category(value):
+    if value in (None, ''):
+        return None
+    if not isinstance(value, str) or len(value) > 100:
+        raise ValueError("category must be a string of at most 100 characters")
+    return value
+
+
+def _form_errors(form):
+    return '; '.join(f"{field}: {' '.join(errors)}" for field, errors in form.errors.items())
+
+
+def _check_batch(payload):
+    creates, updates, deletes = (payload.get(key, []) for key in ('create', 'update', 'delete'))
+    if not all(isinstance(ops, list) for ops in (creates, updates, deletes)):
+        raise ValueError("create, update and delete must be arrays")
+    if len(creates) + len(updates) + len(deletes) > MAX_OPERATIONS:
+        raise ValueError(f"at most {MAX_OPERATIONS} operations per request")
+    if not all(isinstance(op, dict) for op in creates + updates):
+        raise ValueError("create and update entries must be objects")
+    if not all(isinstance(pk, int) for pk in deletes):
+        raise ValueError("delete must be an array of expense ids")
+    if not all(isinstance(op.get('id'), int) for op in updates):
+        raise ValueError("every update needs an integer id")
+    return creates, updates, deletes
+
+
+async def _predict(creates):
+    """{name: category} for creates without a category, in one predictor call."""
+    names = [op['name'] for op in creates
+             if not op.get('category') and isinstance(op.get('name'), str) and op['name'].strip()]
+    return dict(zip(names, await categorizer.apredict_many(names))) if names else {}
+
+
+def _apply_batch(user, creates, updates, deletes, predicted):
+    """Validate and apply a batch; returns (result, errors) with errors as [{op, index, error}]."""
+    errors = []
+
+    new = []
+    for index, data in enumerate(creates):
+        form = ExpenseForm(data)
+        try:
+            category = _clean_category(data.get('category'))
+        except ValueError as e:
+            errors.append({'op': 'create', 'index': index, 'error': str(e)})
+            continue
+        if not form.is_valid():
+            errors.append({'op': 'create', 'index': index, 'error': _form_errors(form)})
+            continue
+        expense = form.save(commit=False)
+        expense.user = user
+        expense.category = category or predicted.get(data.get('name'), categorizer.DEFAULT_CATEGORY)
+        new.append(expense)
+
+    touched = [data['id'] for data in updates] + deletes
+    if len(set(touched)) != len(touched):
+        errors.append({'op': 'batch', 'index': None, 'error': "an id may appear only once per batch"})
+    existing = {
+        expense.id: expense
+        for expense in Expense.objects.select_for_update().filter(user=user, id__in=set(touched))
+    }
+
+    moved = []
+    for index, data in enumerate(updates):
+        expense = existing.get(data['id'])
+        if expense is None:
+            errors.append({'op': 'update', 'index': index, 'error': "no such expense"})
+            continue
+        before = rollups.snapshot(expense)
+        merged = {field: data.get(field, getattr(expense, field)) for field in ('name', 'amount', 'date')}
+        form = ExpenseForm(merged, instance=expense)
+        try:
+            category = _clean_category(data.get('category', expense.category))
+        except ValueError as e:
+            errors.append({'op': 'update', 'index': index, 'error': str(e)})
+            continue
+        if not form.is_valid():
+            errors.append({'op': 'update', 'index': index, 'error': _form_errors(form)})
+            continue
+        expense.category = category or categorizer.DEFAULT_CATEGORY
+        expense.updated_at = timezone.now()  # bulk_update skips auto_now
+        moved.append((before, expense))
+
+    removed = []
+    for index, pk in enumerate(deletes):
+        if pk not in existing:
+            errors.append({'op': 'delete', 'index': index, 'error': "no such expense"})
+        else:
+            removed.append(existing[pk])
+
+    if errors:
+        return None, errors
+
+    Expense.objects.bulk_create(new)
+    rollups.record_expenses(new)
+    Expense.objects.bulk_update([expense for _, expense in moved], FIELDS)
+    rollups.move_expenses(moved)
+    rollups.forget_expenses(removed)
+    sync.record_deletions(removed)
+    Expense.objects.filter(id__in=[expense.id for expense in removed]).delete()
+
+    return {'created': [expense.id for expense in new], 'updated': len(moved), 'deleted': len(removed)}, None
+
+
+def _commit_batch(user, creates, updates, deletes, predicted):
+    with transaction.atomic():
+        result, errors = _apply_batch(user, creates, updates, deletes, predicted)
+    if result and (result['created'] or result['updated'] or result['deleted']):
+        expenses_changed(user.id)
+    return result, errors
+
+
+def _page(user, cursor):
+    rows, next_cursor = archive.paginate(user, cursor)
+    return {'expenses': [serialize(expense) for expense in rows], 'next': next_cursor}
+
+
+def _feed(user, cursor):
+    feed = sync.changes(user, cursor)
+    income = feed['income']
+    return {
+        'expenses': [serialize(expense) for expense in feed['expenses']],
+        'deleted': [{'kind': t.kind, 'id': t.object_id, 'deleted_at': t.deleted_at.isoformat()}
+                    for t in feed['deleted']],
+        'income': None if income is None else {'amount': str(income.amount),
+                                               'updated_at': income.updated_at.isoformat()},
+        'cursor': feed['cursor'],
+        'more': feed['more'],
+    }
+
+
+@sync.conditional_on_data
+async def expenses(request):
+    user = await request.auser()
+    if not user.is_authenticated:
+        return _error(401, "authentication required")
+
+    if request.method == 'GET':
+        return JsonResponse(await sync_to_async(_page)(user, request.GET.get('after')))
+
+    if request.method != 'POST':
+        return _error(405, "use GET or POST")
+    try:
+        payload = json.loads(request.body)
+        if not isinstance(payload, dict):
+            raise ValueError("body must be a JSON object")
+        creates, updates, deletes = _check_batch(payload)
+    except ValueError as e:  # includes JSONDecodeError
+        return _error(400, str(e))
+
+    # Predict before taking row locks: the backend may be a remote call.
+    predicted = await _predict(creates)
+    result, errors = await sync_to_async(_commit_batch)(user, creates, updates, deletes, predicted)
+    if errors:
+        return _error(400, "batch rejected", errors=errors)
+    return JsonResponse(result)
+
+
+@sync.conditional_on_data
+async def changes(request):
+    """Expenses changed and deleted since ?since=<cursor>; start with no cursor for a full sync."""
+    user = await request.auser()
+    if not user.is_authenticated:
+        return _error(401, "authentication required")
+    try:
+        return JsonResponse(await sync_to_async(_feed)(user, request.GET.get('since') or None))
+    except ValueError as e:
+        return _error(400, str(e))
@@ -0,0 +1,152 @@
+"""
+Cold-data archival of old expenses.
+
+archive_user() moves a user's expenses dated before a month boundary out of
+the Expense table into ArchivedExpense (ids kept), and swaps their daily
+rollups for MonthlyCategoryTotal rows. ArchiveCutoff records the boundary,
+so the hot table, its indexes and the daily rollups only grow with recent
+data.
+
+Readers include the archive only when the requested range reaches before
+the cutoff: paginate() continues into it once a page runs past the cutoff,
+series() and the exports and reports add it for ranges that start earlier.
+Whole archived months come from the monthly summaries; anything finer
+reads ArchivedExpense rows.
+
+Archived expenses are read-only. Anomaly detection, budgets and the
+forecast only look at recent data and ignore them.
+"""
+import datetime
+import heapq
+from collections import defaultdict
+from decimal import Decimal
+
+from django.db import IntegrityError, transaction
+from django.db.models import F, Sum
+from django.db.models.functions import TruncMonth, TruncWeek
+
+from . import pagination, rollups
+from .models import ArchiveCutoff, ArchivedExpense, Expense, MonthlyCategoryTotal
+
+BATCH_SIZE = 2000
+
+UNKNOWN = object()
+
+
+def month_start(day):
+    return day.replace(day=1)
+
+
+def cutoff(user_id):
+    """The user's archive boundary, or None if nothing is archived."""
+    return ArchiveCutoff.objects.filter(user_id=user_id).values_list('before', flat=True).first()
+
+
+def needs_archive(before, start):
+    return before is not None and (start is None or start < before)
+
+
+def whole_months(before, start, end):
+    """Whether start..end covers only whole archived months, so the monthly summaries answer it."""
+    return ((start is None or start.day == 1)
+            and (end is None or end >= before or (end + datetime.timedelta(days=1)).day == 1))
+
+
+def _add_monthly(user_id, expenses):
+    deltas = defaultdict(lambda: [Decimal('0'), 0])
+    for expense in expenses:
+        delta = deltas[(month_start(expense.date), expense.category or 'Other')]
+        delta[0] += expense.amount
+        delta[1] += 1
+    for (month, category), (amount, count) in deltas.items():
+        lookup = dict(user_id=user_id, month=month, category=category)
+        updated = MonthlyCategoryTotal.objects.filter(**lookup).update(
+            total=F('total') + amount, count=F('count') + count)
+        if not updated:
+            try:
+                with transaction.atomic():
+                    MonthlyCategoryTotal.objects.create(total=amount, count=count, **lookup)
+            except IntegrityError:
+                MonthlyCategoryTotal.objects.filter(**lookup).update(
+                    total=F('total') + amount, count=F('count') + count)
+
+
+def archive_user(user_id, before, batch_size=BATCH_SIZE):
+    """Move the user's expenses dated before `before` (a 1st of the month) to the archive; returns the count."""
+    moved = 0
+    while True:
+        with transaction.atomic():
+            batch = list(Expense.objects.select_for_update()
+                         .filter(user_id=user_id, date__lt=before).order_by('id')[:batch_size])
+            if not batch:
+                break
+            ArchivedExpense.objects.bulk_create([
+                ArchivedExpense(id=e.id, user_id=e.user_id, name=e.name, amount=e.amount, date=e.date,
+                                category=e.category, updated_at=e.updated_at)
+                for e in batch
+            ])
+            _add_monthly(user_id, batch)
+            rollups.forget_expenses(batch)
+            # No tombstones: the rows still exist, so sync clients keep them.
+            Expense.objects.filter(id__in=[e.id for e in batch]).delete()
+            # Saved on every batch, even at the same cutoff: its updated_at moves the user's ETags.
+            current = cutoff(user_id)
+            ArchiveCutoff.objects.update_or_create(
+                user_id=user_id, defaults={'before': max(current, before) if current else before})
+        moved += len(batch)
+    return moved
+
+
+def paginate(user, cursor=None, size=pagination.PAGE_SIZE, before=UNKNOWN):
+    """
+    pagination.paginate() over the user's live and archived expenses. The
+    archive is read only once a page reaches past the cutoff; callers that
+    already know the cutoff pass it as `before` to save the lookup.
+    """
+    rows, next_cursor = pagination.paginate(Expense.objects.filter(user=user), cursor, size)
+    if before is UNKNOWN:
+        before = cutoff(user.id)
+    if before is None or (next_cursor and rows[-1].date >= before):
+        return rows, next_cursor
+
+    archived = list(pagination.after(
+        ArchivedExpense.objects.filter(user=user).order_by(*pagination.ORDERING), cursor)[:size + 1])
+    merged = sorted(rows + archived, key=lambda e: (e.date, e.amount, e.id), reverse=True)
+    page = merged[:size]
+    more = next_cursor is not None or len(merged) > size
+    return page, pagination.encode_cursor(page[-1]) if more else None
+
+
+def monthly_totals(user_id, start=None, end=None):
+    """MonthlyCategoryTotal rows for the months in start..end."""
+    rows = MonthlyCategoryTotal.objects.filter(user_id=user_id)
+    if start:
+        rows = rows.filter(month__gte=month_start(start))
+    if end:
+        rows = rows.filter(month__lte=end)
+    return rows
+
+
+def expenses(user_id, start=None, end=None):
+    rows = ArchivedExpense.objects.filter(user_id=user_id)
+    if start:
+        rows = rows.filter(date__gte=start)
+    if end:
+        rows = rows.filter(date__lte=end)
+    return rows
+
+
+def series(user_id, bucket, start, end, before):
+    """{period_start: total} of archived spend between start and end, for rollups.bucketed_series()."""
+    if bucket == 'month' and whole_months(before, start, end):
+        rows = monthly_totals(user_id, start, end).values_list('month').annotate(amount=Sum('total'))
+    else:
+        period = {'day': F('date'), 'week': TruncWeek('date'), 'month': TruncMonth('date')}[bucket]
+        rows = (expenses(user_id, start, end).annotate(period=period).values_list('period')
+                .annotate(amount=Sum('amount')))
+    return dict(rows.order_by())
+
+
+def merge_rows(live, archived):
+    """Merge two date-ordered row iterators (values_list tuples whose first field is the date)."""
+    return heapq.merge(archived, live, key=lambda row: row[0])
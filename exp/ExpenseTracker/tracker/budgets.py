@@ -0,0 +1,122 @@
+"""
+Weekly/monthly budgets with burn-rate projections.
+
+Spend is read from the DailyCategoryTotal rollups: one grouped query per
+period kind in use returns, per category, both the period-to-date total and
+the total over the trailing burn window. A page therefore pays at most three
+queries for budgets however long the user's history is.
+"""
+import datetime
+import math
+from dataclasses import dataclass
+from decimal import Decimal
+
+from django.conf import settings
+from django.db.models import Q, Sum
+
+from .models import Budget, DailyCategoryTotal
+
+
+def period_bounds(period, day):
+    """First and last day of the week (Monday-based) or month containing `day`."""
+    if period == 'week':
+        start = day - datetime.timedelta(days=day.weekday())
+        return start, start + datetime.timedelta(days=6)
+    start = day.replace(day=1)
+    following = (start + datetime.timedelta(days=32)).replace(day=1)
+    return start, following - datetime.timedelta(days=1)
+
+
+@dataclass
+class BudgetStatus:
+    budget: Budget
+    spent: Decimal
+    burn_rate: Decimal          # average spend per day over the trailing window
+    days_left: int              # days of the period after today
+    days_to_exceed: int = None  # at the current burn rate; None if it never does
+
+    @property
+    def label(self):
+        return self.budget.category or "Total spending"
+
+    @property
+    def remaining(self):
+        return self.budget.limit - self.spent
+
+    @property
+    def projected(self):
+        return self.spent + self.burn_rate * self.days_left
+
+    @property
+    def percent(self):
+        return min(100, int(self.spent * 100 / self.budget.limit)) if self.budget.limit else 100
+
+    @property
+    def over(self):
+        return self.spent > self.budget.limit
+
+    @property
+    def at_risk(self):
+        return self.over or (self.days_to_exceed is not None and self.days_to_exceed <= self.days_left)
+
+    @property
+    def message(self):
+        period = self.budget.get_period_display().lower()
+        if self.over:
+            return f"{self.label} is ₹{-self.remaining:.2f} over its {period} budget"
+        if self.at_risk:
+            when = "today" if self.days_to_exceed == 0 else f"in {self.days_to_exceed} day{'s' if self.days_to_exceed != 1 else ''}"
+            return f"{self.label} will exceed its {period} budget {when}"
+        return f"{self.label}: ₹{self.remaining:.2f} left of ₹{self.budget.limit:.2f} this {self.budget.period}"
+
+
+def _period_spend(user, period, today, window_start):
+    """{category: (period_total, window_total)} for the period containing today."""
+    start, end = period_bounds(period, today)
+    rows = (
+        DailyCategoryTotal.objects
+        .filter(user=user, date__gte=min(start, window_start), date__lte=end)
+        .values('category')
+        .annotate(
+            period_total=Sum('total', filter=Q(date__gte=start)),
+            window_total=Sum('total', filter=Q(date__gte=window_start, date__lte=today)),
+        )
+        .order_by()
+    )
+    return {
+        row['category']: (row['period_total'] or Decimal('0'), row['window_total'] or Decimal('0'))
+        for row in rows
+    }
+
+
+def status(user, today=None):
+    """BudgetStatus for each of the user's budgets, at-risk ones first."""
+    today = today or datetime.date.today()
+    budgets = list(Budget.objects.filter(user=user).order_by('period', 'category'))
+    if not budgets:
+        return []
+
+    window = settings.TRACKER_BUDGET_BURN_DAYS
+    window_start = today - datetime.timedelta(days=window - 1)
+    spend = {period: _period_spend(user, period, today, window_start)
+             for period in {budget.period for budget in budgets}}
+
+    statuses = []
+    for budget in budgets:
+        totals = spend[budget.period]
+        if budget.category:
+            spent, recent = totals.get(budget.category, (Decimal('0'), Decimal('0')))
+        else:
+            spent = sum((value[0] for value in totals.values()), Decimal('0'))
+            recent = sum((value[1] for value in totals.values()), Decimal('0'))
+        burn_rate = recent / window
+        days_left = (period_bounds(budget.period, today)[1] - today).days
+        days_to_exceed = None
+        if spent > budget.limit:
+            days_to_exceed = 0
+        elif burn_rate > 0:
+            days_to_exceed = math.ceil((budget.limit - spent) / burn_rate)
+        statuses.append(BudgetStatus(budget, spent, burn_rate, days_left, days_to_exceed))
+
+    statuses.sort(key=lambda s: (not s.at_risk, s.days_to_exceed if s.days_to_exceed is not None else math.inf))
+    return statuses
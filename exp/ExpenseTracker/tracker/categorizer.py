@@ -0,0 +1,433 @@
+"""
+Expense category prediction.
+
+Names are normalized and memoized in a bounded LRU cache, cache misses are
+sent to the configured backend in batches (one prompt for many names), and
+with TRACKER_CATEGORY_ASYNC the expense is saved straight away and its
+category filled in by a background queue.
+
+The backend is chosen by settings.TRACKER_CATEGORY_BACKEND: GeminiBackend
+talks to the remote model with a single reused client, KeywordBackend is a
+local stand-in for offline use and tests. A locally trained classifier
+(tracker/classifier.py), when present, answers before either of them.
+"""
+import asyncio
+import atexit
+import queue
+import re
+import threading
+from collections import OrderedDict
+
+from asgiref.sync import sync_to_async
+
+from django.conf import settings
+from django.db import connections, transaction
+from django.utils.module_loading import import_string
+
+from . import perf, rollups
+from .hooks import expenses_changed
+from .models import Expense
+
+CATEGORIES = ["Food", "Transport", "Entertainment", "Shopping", "Bills", "Health", "Other"]
+DEFAULT_CATEGORY = "Other"
+
+
+def normalize_name(name):
+    """'  Uber  ride #42 ' -> 'uber ride'"""
+    name = re.sub(r'[^a-z ]', ' ', str(name).lower())
+    return ' '.join(name.split())
+
+
+def parse_category(text):
+    """Map free-form model output onto one of CATEGORIES."""
+    text = re.sub(r'[^a-zA-Z]', '', text or '').capitalize()
+    # Fuzzy correction: handle small differences (e.g., "Foods", "Transporting")
+    for category in CATEGORIES:
+        if category.lower() in text.lower():
+            return category
+    print(f"[⚠️ Category Output Unrecognized] Got: {text}")
+    return DEFAULT_CATEGORY
+
+
+class LRUCache:
+    """Thread-safe, size-bounded memo of normalized name -> category."""
+
+    def __init__(self, maxsize):
+        self.maxsize = maxsize
+        self._data = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        with self._lock:
+            if key not in self._data:
+                return None
+            self._data.move_to_end(key)
+            return self._data[key]
+
+    def set(self, key, value):
+        with self._lock:
+            self._data[key] = value
+            self._data.move_to_end(key)
+            while len(self._data) > self.maxsize:
+                self._data.popitem(last=False)
+
+    def clear(self):
+        with self._lock:
+            self._data.clear()
+
+    def __len__(self):
+        return len(self._data)
+
+
+class GeminiBackend:
+    """
+    Remote prediction through Gemini; the client is configured once and reused.
+    The async path calls the REST API at TRACKER_GEMINI_API_URL with httpx, so
+    tests (or a local fake server) can stand in for the service.
+
+    Under WSGI every async view runs on a fresh event loop, and an httpx
+    client is tied to the loop it was created on. The async requests
+    therefore all run on one long-lived loop in a background thread, whose
+    client keeps its connections open across views; close() shuts it down
+    (also at exit).
+    """
+
+    model_name = "gemini-2.5-flash"
+
+    def __init__(self, transport=None):
+        self._model = None
+        self._lock = threading.Lock()
+        self._transport = transport  # httpx transport override, e.g. httpx.MockTransport
+        self._loop = None  # runs the AsyncClient, on its own thread
+        self._client = None
+        self._semaphore = None
+
+    def _get_model(self):
+        with self._lock:
+            if self._model is None:
+                import google.generativeai as genai
+                genai.configure(api_key=settings.GEMINI_API_KEY)
+                self._model = genai.GenerativeModel(self.model_name)
+            return self._model
+
+    def build_prompt(self, names):
+        listing = "\n".join(f'{i}. "{name}"' for i, name in enumerate(names, 1))
+        return f"""
+        Categorize each of the following expenses into one of these categories ONLY:
+        [{", ".join(CATEGORIES)}]
+
+        Expenses:
+        {listing}
+
+        Output exactly one line per expense, in the form "<number>. <Category>",
+        using the category name exactly as listed above.
+        """
+
+    def parse_response(self, text, count):
+        categories = [DEFAULT_CATEGORY] * count
+        for line in text.splitlines():
+            match = re.match(r'\s*(\d+)\s*[.):\-]\s*(.+)', line)
+            if match and 1 <= int(match.group(1)) <= count:
+                categories[int(match.group(1)) - 1] = parse_category(match.group(2))
+        return categories
+
+    def predict_batch(self, names):
+        response = self._get_model().generate_content(self.build_prompt(names))
+        return self.parse_response(response.text.strip(), len(names))
+
+    def _client_loop(self):
+        with self._lock:
+            if self._loop is None:
+                self._loop = asyncio.new_event_loop()
+                threading.Thread(target=self._loop.run_forever, name='gemini-client', daemon=True).start()
+                atexit.register(self.close)
+            return self._loop
+
+    def _async_client(self):
+        # Only called on the client loop, so no lock is needed.
+        if self._client is None:
+            import httpx
+
+            limit = settings.TRACKER_CATEGORY_MAX_CONCURRENCY
+            self._client = httpx.AsyncClient(
+                base_url=settings.TRACKER_GEMINI_API_URL,
+                timeout=settings.TRACKER_CATEGORY_TIMEOUT,
+                limits=httpx.Limits(max_connections=limit),
+                transport=self._transport,
+            )
+            self._semaphore = asyncio.Semaphore(limit)
+        return self._client, self._semaphore
+
+    async def _generate(self, prompt):
+        client, semaphore = self._async_client()
+        async with semaphore:
+            response = await client.post(
+                f"/models/{self.model_name}:generateContent",
+                headers={'x-goog-api-key': settings.GEMINI_API_KEY or ''},
+                json={'contents': [{'parts': [{'text': prompt}]}]},
+            )
+        response.raise_for_status()
+        return response.json()
+
+    async def apredict_batch(self, names):
+        future = asyncio.run_coroutine_threadsafe(self._generate(self.build_prompt(names)), self._client_loop())
+        parts = (await asyncio.wrap_future(future))['candidates'][0]['content']['parts']
+        text = ''.join(part.get('text', '') for part in parts)
+        return self.parse_response(text.strip(), len(names))
+
+    def close(self):
+        """Close the async client and stop its loop; a later call starts new ones."""
+        with self._lock:
+            loop, self._loop = self._loop, None
+        if loop is None:
+            return
+
+        async def shutdown():
+            if self._client is not None:
+                await self._client.aclose()
+            self._client = self._semaphore = None
+
+        asyncio.run_coroutine_threadsafe(shutdown(), loop).result(timeout=settings.TRACKER_CATEGORY_TIMEOUT)
+        loop.call_soon_threadsafe(loop.stop)
+
+
+class KeywordBackend:
+    """Offline stand-in for the remote model: simple keyword rules."""
+
+    keywords = {
+        "Food": ("food", "lunch", "dinner", "breakfast", "pizza", "burger", "cafe", "coffee",
+                 "restaurant", "grocer", "swiggy", "zomato", "snack", "tea"),
+        "Transport": ("uber", "ola", "taxi", "cab", "bus", "train", "metro", "fuel", "petrol",
+                      "diesel", "parking", "flight", "auto"),
+        "Entertainment": ("movie", "netflix", "spotify", "concert", "game", "cinema", "prime"),
+        "Shopping": ("amazon", "flipkart", "shirt", "shoes", "clothes", "mall", "laptop", "phone"),
+        "Bills": ("bill", "electricity", "water", "rent", "internet", "wifi", "recharge", "gas"),
+        "Health": ("doctor", "medicine", "pharmacy", "hospital", "gym", "clinic", "dental"),
+    }
+
+    def predict_batch(self, names):
+        return [self.predict_one(name) for name in names]
+
+    async def apredict_batch(self, names):
+        return self.predict_batch(names)
+
+    def predict_one(self, name):
+        words = normalize_name(name).split()
+        for category, keywords in self.keywords.items():
+            if any(word.startswith(keyword) for word in words for keyword in keywords):
+                return category
+        return DEFAULT_CATEGORY
+
+
+_memo = LRUCache(getattr(settings, 'TRACKER_CATEGORY_CACHE_SIZE', 10000))
+_backend = None
+_backend_path = None
+_backend_lock = threading.Lock()
+
+
+def get_backend():
+    global _backend, _backend_path
+    path = settings.TRACKER_CATEGORY_BACKEND
+    with _backend_lock:
+        if _backend is None or _backend_path != path:
+            _backend = import_string(path)()
+            _backend_path = path
+        return _backend
+
+
+def clear_cache():
+    _memo.clear()
+
+
+def cached_category(name):
+    return _memo.get(normalize_name(name))
+
+
+def _lookup(names):
+    """
+    (keys, results, misses): normalized names, {key: category or None} from the
+    memo and the local classifier, and the distinct keys still unanswered.
+    """
+    from . import classifier
+
+    keys = [normalize_name(name) for name in names]
+    results = {}
+    misses = []
+    for key in keys:
+        if key in results:
+            continue
+        category = _memo.get(key)
+        if category is None:
+            results[key] = None
+            misses.append(key)
+        else:
+            results[key] = category
+
+    # First tier: the local classifier; only unsure names go to the backend.
+    if misses:
+        with perf.span('classify'):
+            local = classifier.predict_confident(misses)
+        remote = []
+        for key, category in zip(misses, local):
+            if category is None:
+                remote.append(key)
+            else:
+                results[key] = category
+                _memo.set(key, category)
+        misses = remote
+    return keys, results, misses
+
+
+def _batches(misses):
+    batch_size = settings.TRACKER_CATEGORY_BATCH_SIZE
+    return [misses[start:start + batch_size] for start in range(0, len(misses), batch_size)]
+
+
+def _store(results, batch, predicted):
+    """Record a backend answer (or, with predicted=None, a failure that is not memoized)."""
+    if predicted is None:
+        results.update((key, DEFAULT_CATEGORY) for key in batch)
+        return
+    for key, category in zip(batch, predicted):
+        results[key] = category
+        _memo.set(key, category)
+
+
+def predict_many(names):
+    """
+    Categories for `names`, in order. Memo hits cost nothing, then the local
+    classifier answers what it is confident about, and the remaining distinct
+    names go to the backend in batches of TRACKER_CATEGORY_BATCH_SIZE.
+    """
+    keys, results, misses = _lookup(names)
+    for batch in _batches(misses):
+        perf.count('predict_calls')
+        try:
+            with perf.span('predict'):
+                predicted = get_backend().predict_batch(batch)
+        except Exception as e:
+            print("Category prediction error:", e)
+            predicted = None  # don't memoize failures; the next call retries
+        _store(results, batch, predicted)
+    return [results[key] for key in keys]
+
+
+async def apredict_many(names):
+    """
+    predict_many() for async views: backend batches run concurrently (bounded
+    by the backend's concurrency limit) without holding a worker thread.
+    """
+    keys, results, misses = await sync_to_async(_lookup, thread_sensitive=False)(names)
+    backend = get_backend()
+    if hasattr(backend, 'apredict_batch'):
+        call = backend.apredict_batch
+    else:
+        call = sync_to_async(backend.predict_batch, thread_sensitive=False)
+
+    async def run(batch):
+        perf.count('predict_calls')
+        try:
+            with perf.span('predict'):
+                return await call(batch)
+        except Exception as e:
+            print("Category prediction error:", e)
+            return None
+
+    batches = _batches(misses)
+    for batch, predicted in zip(batches, await asyncio.gather(*(run(batch) for batch in batches))):
+        _store(results, batch, predicted)
+    return [results[key] for key in keys]
+
+
+async def apredict(name):
+    return (await apredict_many([name]))[0]
+
+
+def predict(name):
+    return predict_many([name])[0]
+
+
+def gemini_predict_category(expense_name):
+    """
+    Predicts expense category using the configured backend (Gemini by default).
+    Ensures flexible parsing and more accurate matching.
+    """
+    return predict(expense_name)
+
+
+class PredictionQueue:
+    """
+    Background worker that fills in categories for already-saved expenses.
+    Pending names are drained in batches so that a burst of adds costs one
+    backend call.
+    """
+
+    def __init__(self):
+        self._queue = queue.Queue()
+        self._thread = None
+        self._lock = threading.Lock()
+
+    def submit(self, expense):
+        self._ensure_worker()
+        self._queue.put((expense.id, expense.name))
+
+    def _ensure_worker(self):
+        with self._lock:
+            if self._thread is None or not self._thread.is_alive():
+                self._thread = threading.Thread(target=self._run, name='category-queue', daemon=True)
+                self._thread.start()
+
+    def _next_batch(self):
+        batch = [self._queue.get()]
+        wait = settings.TRACKER_CATEGORY_BATCH_WAIT
+        while len(batch) < settings.TRACKER_CATEGORY_BATCH_SIZE:
+            try:
+                batch.append(self._queue.get(timeout=wait))
+            except queue.Empty:
+                break
+        return batch
+
+    def _run(self):
+        while True:
+            batch = self._next_batch()
+            try:
+                categories = predict_many([name for _, name in batch])
+                apply_categories(dict(zip((expense_id for expense_id, _ in batch), categories)))
+            except Exception as e:
+                print("Category queue error:", e)
+            finally:
+                connections.close_all()
+                for _ in batch:
+                    self._queue.task_done()
+
+    def join(self):
+        """Block until every submitted expense has been processed."""
+        self._queue.join()
+
+
+def apply_categories(categories_by_id):
+    """Write predicted categories onto expenses still waiting for one."""
+    changed_users = set()
+    with transaction.atomic():
+        pending = Expense.objects.select_for_update().filter(
+            id__in=list(categories_by_id), category=DEFAULT_CATEGORY
+        )
+        for expense in pending:
+            category = categories_by_id[expense.id]
+            if category == expense.category:
+                continue
+            before = rollups.snapshot(expense)
+            expense.category = category
+            expense.save(update_fields=['category', 'updated_at'])
+            rollups.move_expense(before, expense)
+            changed_users.add(expense.user_id)
+    for user_id in changed_users:
+        expenses_changed(user_id)
+
+
+prediction_queue = PredictionQueue()
+
+
+def categorize_later(expense):
+    """Queue a saved expense for background categorization."""
+    prediction_queue.submit(expense)
@@ -0,0 +1,91 @@
+"""
+Local, offline category classifier.
+
+Hashed character n-grams feed a linear model trained on the categories users
+have already assigned (see the train_category_model command). The fitted
+pipeline is stored with joblib and loaded once per process; the categorizer
+asks it first and only sends names it is unsure about to the remote model.
+"""
+import threading
+
+from django.conf import settings
+
+from .categorizer import DEFAULT_CATEGORY, normalize_name
+
+_model = None
+_loaded = False
+_lock = threading.Lock()
+
+
+def build_pipeline():
+    from sklearn.feature_extraction.text import HashingVectorizer
+    from sklearn.linear_model import LogisticRegression
+    from sklearn.pipeline import make_pipeline
+
+    return make_pipeline(
+        HashingVectorizer(analyzer='char_wb', ngram_range=(2, 4), n_features=2 ** 18,
+                          alternate_sign=False, norm='l2'),
+        LogisticRegression(max_iter=1000, C=10.0),
+    )
+
+
+def train(names, categories):
+    """Fit a new pipeline on (name, category) pairs."""
+    if len(set(categories)) < 2:
+        raise ValueError("Need examples of at least two categories to train a classifier")
+    model = build_pipeline()
+    model.fit([normalize_name(name) for name in names], list(categories))
+    return model
+
+
+def save(model, path=None):
+    import joblib
+
+    joblib.dump(model, path or settings.TRACKER_CATEGORY_MODEL_PATH)
+
+
+def get_model():
+    """The persisted model, loaded on first use; None if none has been trained."""
+    global _model, _loaded
+    if _loaded:
+        return _model
+    with _lock:
+        if not _loaded:
+            import os
+
+            import joblib
+
+            path = settings.TRACKER_CATEGORY_MODEL_PATH
+            try:
+                _model = joblib.load(path) if os.path.exists(path) else None
+            except Exception as e:
+                print(f"Could not load category model from {path}: {e}")
+                _model = None
+            _loaded = True
+    return _model
+
+
+def reset():
+    """Forget the loaded model so the next call reloads it from disk."""
+    global _model, _loaded
+    with _lock:
+        _model, _loaded = None, False
+
+
+def predict_confident(names, threshold=None):
+    """
+    Categories for `names` (already normalized), or None where the model is
+    missing or less than `threshold` sure.
+    """
+    model = get_model()
+    if model is None or not names:
+        return [None] * len(names)
+    if threshold is None:
+        threshold = settings.TRACKER_CATEGORY_MIN_CONFIDENCE
+    probabilities = model.predict_proba(list(names))
+    best = probabilities.argmax(axis=1)
+    classes = model.classes_
+    return [
+        str(classes[i]) if p[i] >= threshold and classes[i] != DEFAULT_CATEGORY else None
+        for i, p in zip(best, probabilities)
+    ]
@@ -0,0 +1,78 @@
+"""
+Column-oriented view of a user's expenses.
+
+A user's expenses are fetched once into an ExpenseColumns (NumPy arrays)
+that analytics such as anomaly detection work on directly, instead of
+re-evaluating the queryset for every consumer.
+"""
+from dataclasses import dataclass
+
+import numpy as np
+from django.db.models import FloatField
+from django.db.models.functions import Cast
+
+from .models import Expense
+
+
+@dataclass
+class ExpenseColumns:
+    ids: np.ndarray             # int64
+    names: np.ndarray           # object (str)
+    amounts: np.ndarray         # float64
+    dates: np.ndarray           # datetime64[D]
+    category_codes: np.ndarray  # intp, index into `categories`
+    categories: np.ndarray      # sorted unique category labels
+
+    def __len__(self):
+        return len(self.ids)
+
+    @property
+    def category_labels(self):
+        return self.categories[self.category_codes]
+
+    def total(self):
+        return float(self.amounts.sum()) if len(self) else 0.0
+
+    @classmethod
+    def empty(cls):
+        return cls(
+            ids=np.empty(0, dtype=np.int64),
+            names=np.empty(0, dtype=object),
+            amounts=np.empty(0, dtype=np.float64),
+            dates=np.empty(0, dtype='datetime64[D]'),
+            category_codes=np.empty(0, dtype=np.intp),
+            categories=np.empty(0, dtype=object),
+        )
+
+    @classmethod
+    def from_rows(cls, rows):
+        """Build from (id, name, category, amount, date) tuples."""
+        if not rows:
+            return cls.empty()
+        ids, names, categories, amounts, dates = zip(*rows)
+        labels, codes = np.unique(np.array(categories, dtype=object), return_inverse=True)
+        return cls(
+            ids=np.array(ids, dtype=np.int64),
+            names=np.array(names, dtype=object),
+            amounts=np.array(amounts, dtype=np.float64),
+            dates=np.array(dates, dtype='datetime64[D]'),
+            category_codes=codes,
+            categories=labels,
+        )
+
+
+def query_columns(queryset):
+    """Fetch the queryset's expenses in one query, newest/largest first."""
+    rows = list(
+        queryset
+        .order_by('-date', '-amount')
+        # Let the database hand back floats so we skip per-row Decimal conversion.
+        .annotate(amount_f=Cast('amount', FloatField()))
+        .values_list('id', 'name', 'category', 'amount_f', 'date')
+    )
+    return ExpenseColumns.from_rows(rows)
+
+
+def load_columns(user):
+    """Fetch all of a user's expenses in one query, newest/largest first."""
+    return query_columns(Expense.objects.filter(user=user))
@@ -0,0 +1,61 @@
+"""
+Streaming export of a user's expenses as CSV or NDJSON.
+
+Rows come straight from a values_list() iterator with a fixed chunk size
+and are encoded one at a time, so memory stays flat however many rows a
+user has. Ranges reaching before the archive cutoff merge in the archived
+rows the same way.
+"""
+import csv
+import json
+
+from . import archive
+from .models import ArchivedExpense, Expense
+
+FIELDS = ('date', 'name', 'category', 'amount')
+CHUNK_SIZE = 2000
+FORMATS = {
+    'csv': ('text/csv', 'csv'),
+    'ndjson': ('application/x-ndjson', 'ndjson'),
+}
+
+
+class _Echo:
+    """File-like object whose write() just returns the value, for csv.writer."""
+
+    def write(self, value):
+        return value
+
+
+def _rows(expenses, start, end, category):
+    if start:
+        expenses = expenses.filter(date__gte=start)
+    if end:
+        expenses = expenses.filter(date__lte=end)
+    if category:
+        expenses = expenses.filter(category=category)
+    return expenses.order_by('date', 'id').values_list(*FIELDS).iterator(chunk_size=CHUNK_SIZE)
+
+
+def export_rows(user, start=None, end=None, category=None):
+    rows = _rows(Expense.objects.filter(user=user), start, end, category)
+    if not archive.needs_archive(archive.cutoff(user.id), start):
+        return rows
+    return archive.merge_rows(rows, _rows(ArchivedExpense.objects.filter(user=user), start, end, category))
+
+
+def iter_csv(rows):
+    writer = csv.writer(_Echo())
+    yield writer.writerow(FIELDS)
+    for day, name, category, amount in rows:
+        yield writer.writerow((day.isoformat(), name, category, amount))
+
+
+def iter_ndjson(rows):
+    for day, name, category, amount in rows:
+        yield json.dumps({'date': day.isoformat(), 'name': name, 'category': category,
+                          'amount': str(amount)}, ensure_ascii=False) + '\n'
+
+
+def encode(rows, fmt):
+    return iter_ndjson(rows) if fmt == 'ndjson' else iter_csv(rows)
@@ -0,0 +1,101 @@
+"""
+Next-month spend forecasts per category.
+
+The user's recent daily rollups become a (categories x days) matrix and every
+model runs on the whole matrix at once: simple exponential smoothing (a
+weighted dot product over the days) and weekly seasonal-naive (the mean of
+each weekday over the last few weeks). Each category uses whichever model had
+the lower error on a held-out final stretch of its history.
+"""
+import calendar
+import datetime
+
+import numpy as np
+
+from .models import DailyCategoryTotal
+
+HISTORY_DAYS = 182
+HOLDOUT_DAYS = 28
+SEASON = 7
+SEASONS = 4          # weeks averaged by seasonal-naive
+ALPHA = 0.1          # smoothing factor for exponential smoothing
+METHODS = ('smoothing', 'seasonal')
+
+
+def next_month(today):
+    """First and last day of the month after `today`."""
+    start = (today.replace(day=1) + datetime.timedelta(days=32)).replace(day=1)
+    return start, start.replace(day=calendar.monthrange(start.year, start.month)[1])
+
+
+def load_matrix(user, today):
+    """(categories, matrix) of daily spend for the HISTORY_DAYS days up to `today`."""
+    first = today - datetime.timedelta(days=HISTORY_DAYS - 1)
+    rows = list(
+        DailyCategoryTotal.objects.filter(user=user, date__gte=first, date__lte=today)
+        .values_list('category', 'date', 'total')
+    )
+    if not rows:
+        return np.empty(0, dtype=object), np.zeros((0, HISTORY_DAYS))
+    names, dates, totals = zip(*rows)
+    categories, codes = np.unique(np.array(names, dtype=object), return_inverse=True)
+    offsets = np.array([(day - first).days for day in dates], dtype=np.intp)
+    matrix = np.zeros((len(categories), HISTORY_DAYS))
+    np.add.at(matrix, (codes, offsets), np.array(totals, dtype=np.float64))
+    return categories, matrix
+
+
+def smoothing(matrix, horizon, alpha=ALPHA):
+    """Flat exponential-smoothing forecast for `horizon` days, one row per series."""
+    days = matrix.shape[1]
+    weights = alpha * (1 - alpha) ** np.arange(days - 1, -1, -1)
+    weights[0] = (1 - alpha) ** (days - 1)  # the initial level is the first observation
+    level = matrix @ weights
+    return np.repeat(level[:, None], horizon, axis=1)
+
+
+def seasonal(matrix, horizon, season=SEASON, seasons=SEASONS):
+    """Weekday means over the last `seasons` weeks, repeated over `horizon` days."""
+    days = matrix.shape[1]
+    span = min(seasons, days // season) * season
+    recent = matrix[:, days - span:].reshape(matrix.shape[0], -1, season)
+    profile = recent.mean(axis=1)
+    # `span` is a whole number of seasons, so day h ahead has the phase of profile column h % season.
+    return profile[:, np.arange(horizon) % season]
+
+
+def project(matrix, horizon):
+    """(forecast of `horizon` daily values per row, index into METHODS chosen per row)."""
+    if matrix.shape[0] == 0:
+        return np.zeros((0, horizon)), np.zeros(0, dtype=np.intp)
+    train, test = matrix[:, :-HOLDOUT_DAYS], matrix[:, -HOLDOUT_DAYS:]
+    errors = np.stack([
+        np.abs(model(train, HOLDOUT_DAYS) - test).mean(axis=1)
+        for model in (smoothing, seasonal)
+    ])
+    choice = errors.argmin(axis=0)
+    candidates = np.stack([smoothing(matrix, horizon), seasonal(matrix, horizon)])
+    return candidates[choice, np.arange(matrix.shape[0])], choice
+
+
+def forecast(user, today=None):
+    """Projected spend per category for the month after `today`, as a JSON-ready dict."""
+    today = today or datetime.date.today()
+    start, end = next_month(today)
+    gap = (start - today).days - 1  # days left this month, skipped over
+    horizon = gap + (end - start).days + 1
+
+    categories, matrix = load_matrix(user, today)
+    daily, choice = project(matrix, horizon)
+    totals = np.clip(daily[:, gap:], 0, None).sum(axis=1)
+    rows = sorted(
+        ({'category': str(category), 'amount': round(float(total), 2), 'method': METHODS[method]}
+         for category, total, method in zip(categories, totals, choice)),
+        key=lambda row: -row['amount'],
+    )
+    return {
+        'month': start.strftime('%Y-%m'),
+        'generated': today.isoformat(),
+        'total': round(sum(row['amount'] for row in rows), 2),
+        'categories': rows,
+    }
@@ -0,0 +1,50 @@
+"""
+Per-user cache of next-month forecasts.
+
+Entries are keyed by user, day and a per-user version that
+expenses_changed() replaces, so a forecast is computed at most once a day
+and again only after a write. As in anomaly_cache, the version is read
+before the forecast is computed, so one that raced a write is stored under
+the old version, where no later read looks. The NumPy forecasting module is
+imported on the first miss.
+"""
+import datetime
+import time
+
+from django.conf import settings
+from django.core.cache import cache
+
+from . import perf
+
+
+def _version_key(user_id):
+    return f"tracker:forecast-version:{user_id}"
+
+
+def _version(user_id):
+    key = _version_key(user_id)
+    # A clock value, so a version that was evicted never comes back as one whose forecast is cached.
+    cache.add(key, time.time_ns(), None)
+    return cache.get(key)
+
+
+def _key(user_id, today, version):
+    return f"tracker:forecast:{user_id}:{today.isoformat()}:{version}"
+
+
+def get_forecast(user_id, today=None):
+    today = today or datetime.date.today()
+    with perf.span('cache'):
+        key = _key(user_id, today, _version(user_id))
+        result = cache.get(key)
+    if result is None:
+        from . import forecast
+
+        with perf.span('forecast'):
+            result = forecast.forecast(user_id, today)
+        cache.set(key, result, settings.TRACKER_FORECAST_CACHE_TIMEOUT)
+    return result
+
+
+def invalidate(user_id):
+    cache.set(_version_key(user_id), time.time_ns(), None)
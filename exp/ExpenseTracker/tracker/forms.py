@@ -1,6 +1,7 @@
 from django import forms
 from django.contrib.auth.forms import UserCreationForm
-from .models import Expense,Income
+from .models import Budget, Expense, Income
+from .categorizer import CATEGORIES
 
 class ExpenseForm(forms.ModelForm):
     date = forms.DateField(
@@ -19,3 +20,44 @@ class IncomeForm(forms.ModelForm):
         fields = ['amount']
 
 
+class ImportForm(forms.Form):
+    file = forms.FileField(help_text="CSV (name/description, amount, date[, category]) or OFX/QFX bank export")
+    format = forms.ChoiceField(
+        choices=[('', 'Detect from file name'), ('csv', 'CSV'), ('ofx', 'OFX / QFX')],
+        required=False,
+    )
+
+
+class BudgetForm(forms.ModelForm):
+    category = forms.ChoiceField(
+        choices=[('', 'All categories')] + [(c, c) for c in CATEGORIES],
+        required=False,
+    )
+
+    class Meta:
+        model = Budget
+        fields = ['category', 'period', 'limit']
+
+    def clean_limit(self):
+        limit = self.cleaned_data['limit']
+        if limit <= 0:
+            raise forms.ValidationError("Limit must be positive")
+        return limit
+
+
+class SearchForm(forms.Form):
+    q = forms.CharField(required=False, max_length=200, label="Search")
+    category = forms.ChoiceField(choices=[('', 'All categories')] + [(c, c) for c in CATEGORIES], required=False)
+    start = forms.DateField(required=False, widget=forms.DateInput(attrs={'type': 'date'}))
+    end = forms.DateField(required=False, widget=forms.DateInput(attrs={'type': 'date'}))
+    min_amount = forms.DecimalField(required=False, min_value=0, decimal_places=2)
+    max_amount = forms.DecimalField(required=False, min_value=0, decimal_places=2)
+
+    def clean(self):
+        data = super().clean()
+        if data.get('start') and data.get('end') and data['start'] > data['end']:
+            raise forms.ValidationError("Start date must not be after the end date")
+        if data.get('min_amount') is not None and data.get('max_amount') is not None \
+                and data['min_amount'] > data['max_amount']:
+            raise forms.ValidationError("Minimum amount must not be above the maximum")
+        return data
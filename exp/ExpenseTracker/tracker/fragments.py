@@ -0,0 +1,61 @@
+"""
+Per-user cached template fragments.
+
+Every fragment key includes the user's data version, sync.data_version():
+the newest write of any kind, read from the database. A cached fragment is
+therefore reused until the user's data changes, in whichever worker process
+the change was made, and is never invalidated one key at a time: stale
+entries simply stop being read and expire. conditional_on_data() reads the
+same version for the ETag and leaves it on the request, so fragments cost no
+extra query.
+
+Templates use the {% usercache %} tag from tracker_cache; hits and misses are
+counted on the request's perf stats as fragment_hit / fragment_miss. A view
+can lookup() its fragments first and skip the queries behind the ones that
+hit; the tag then reuses that lookup instead of reading the cache again.
+"""
+import hashlib
+
+from django.conf import settings
+from django.core.cache import cache
+
+from . import perf, sync
+
+
+# The fragments a request has looked up, {key: html or None}.
+LOOKUPS_ATTR = 'tracker_fragments'
+
+
+def version(request):
+    """The request user's data version, as read for the ETag when there was one."""
+    if not hasattr(request, sync.VERSION_ATTR):
+        setattr(request, sync.VERSION_ATTR, sync.data_version(request.user.id))
+    stamp = getattr(request, sync.VERSION_ATTR)
+    return stamp.isoformat() if stamp else '-'
+
+
+def key(user_id, data_version, name, vary_on=()):
+    vary = hashlib.blake2b(':'.join(map(str, vary_on)).encode(), digest_size=8).hexdigest()
+    return f"tracker:fragment:{user_id}:{data_version}:{name}:{vary}"
+
+
+def get(fragment_key):
+    with perf.span('cache'):
+        html = cache.get(fragment_key)
+    perf.count('fragment_hit' if html is not None else 'fragment_miss')
+    return html
+
+
+def lookup(request, name, vary_on=()):
+    """(key, cached html or None) of a fragment of the request user's data, read from the cache once per request."""
+    fragment_key = key(request.user.id, version(request), name, vary_on)
+    if not hasattr(request, LOOKUPS_ATTR):
+        setattr(request, LOOKUPS_ATTR, {})
+    found = getattr(request, LOOKUPS_ATTR)
+    if fragment_key not in found:
+        found[fragment_key] = get(fragment_key)
+    return fragment_key, found[fragment_key]
+
+
+def store(fragment_key, html):
+    cache.set(fragment_key, html, settings.TRACKER_FRAGMENT_CACHE_TIMEOUT)
@@ -0,0 +1,37 @@
+"""
+Bookkeeping that must follow every change to a user's expenses.
+
+Views, the admin and bulk paths call expenses_changed() after they have
+written (and updated the rollups for) a user's Expense rows,
+income_changed() after saving their Income and budgets_changed() after
+adding or removing a Budget.
+"""
+from django.conf import settings
+
+from . import anomaly_cache, forecast_cache, routers
+
+
+def _append_snapshot(user_id):
+    from . import snapshots  # NumPy; only imported once snapshots are configured
+
+    try:
+        snapshots.append(user_id)
+    except OSError as e:
+        # load() still catches up from the database; the next append or compaction repairs it.
+        print(f"Snapshot append error for user {user_id}: {e}")
+
+
+def expenses_changed(user_id):
+    if settings.TRACKER_SNAPSHOT_DIR:
+        _append_snapshot(user_id)
+    anomaly_cache.invalidate(user_id)
+    forecast_cache.invalidate(user_id)
+    routers.pin_primary(user_id)
+
+
+def income_changed(user_id):
+    routers.pin_primary(user_id)
+
+
+def budgets_changed(user_id):
+    routers.pin_primary(user_id)
@@ -0,0 +1,194 @@
+"""
+Bulk import of bank exports (CSV and OFX).
+
+Files are parsed as a stream of rows and handled in fixed-size chunks: each
+chunk is validated, categorized with a single predict_many() call, and
+inserted with bulk_create inside its own transaction together with its
+rollup deltas. Memory use is bounded by the chunk size, not the file size.
+
+Only debits become expenses. OFX credits are skipped; in a CSV, amounts are
+spend (as exported by export_expenses), so a negative one is a refund or
+deposit and the row is rejected.
+"""
+import csv
+import datetime
+import io
+import re
+from dataclasses import dataclass, field
+from decimal import Decimal, InvalidOperation
+from itertools import islice
+
+from django.db import transaction
+
+from . import categorizer, rollups
+from .hooks import expenses_changed
+from .models import Expense
+
+BATCH_SIZE = 2000
+MAX_REPORTED_ERRORS = 20
+MAX_AMOUNT = Decimal('99999999.99')  # Expense.amount is max_digits=10, decimal_places=2
+
+NAME_COLUMNS = ('name', 'description', 'payee', 'narration', 'details', 'memo')
+AMOUNT_COLUMNS = ('amount', 'debit', 'withdrawal', 'withdrawal amount', 'debit amount')
+DATE_COLUMNS = ('date', 'transaction date', 'posted date', 'value date', 'txn date')
+CATEGORY_COLUMNS = ('category',)
+DATE_FORMATS = ('%Y-%m-%d', '%d/%m/%Y', '%d-%m-%Y', '%d.%m.%Y', '%m/%d/%Y', '%Y/%m/%d', '%Y%m%d')
+
+
+@dataclass
+class ImportResult:
+    created: int = 0
+    skipped: int = 0
+    errors: list = field(default_factory=list)
+
+    def add_error(self, line, message):
+        self.skipped += 1
+        if len(self.errors) < MAX_REPORTED_ERRORS:
+            self.errors.append(f"Row {line}: {message}")
+
+
+def _text_stream(fileobj):
+    if isinstance(fileobj, io.TextIOBase):
+        return fileobj
+    return io.TextIOWrapper(fileobj, encoding='utf-8-sig', errors='replace', newline='')
+
+
+def _pick(header, candidates):
+    for candidate in candidates:
+        if candidate in header:
+            return header.index(candidate)
+    return None
+
+
+def iter_csv(fileobj):
+    """Yield (line_number, name, amount, date, category) strings from a CSV export."""
+    reader = csv.reader(_text_stream(fileobj))
+    header = [column.strip().lower() for column in next(reader, [])]
+    name_i, amount_i = _pick(header, NAME_COLUMNS), _pick(header, AMOUNT_COLUMNS)
+    date_i, category_i = _pick(header, DATE_COLUMNS), _pick(header, CATEGORY_COLUMNS)
+    if None in (name_i, amount_i, date_i):
+        raise ValueError("CSV needs name/description, amount and date columns")
+
+    for line, row in enumerate(reader, start=2):
+        if not any(cell.strip() for cell in row):
+            continue
+        get = lambda i: row[i].strip() if i is not None and i < len(row) else ''
+        yield line, get(name_i), get(amount_i), get(date_i), get(category_i)
+
+
+_OFX_TAG = re.compile(r'<(/?)([A-Za-z0-9.]+)>([^<\r\n]*)')
+
+
+def iter_ofx(fileobj):
+    """
+    Yield (transaction_number, name, amount, date, '') for debit <STMTTRN>
+    entries of an OFX/QFX file. Handles both SGML (unclosed) and XML tags.
+    """
+    current = None
+    number = 0
+    for text in _text_stream(fileobj):
+        for closing, tag, value in _OFX_TAG.findall(text):
+            tag = tag.upper()
+            if tag == 'STMTTRN':
+                if closing and current is not None:
+                    number += 1
+                    amount = current.get('TRNAMT', '')
+                    # Bank exports sign debits negative; credits are not expenses.
+                    if amount.startswith('-'):
+                        name = current.get('NAME') or current.get('MEMO') or current.get('PAYEE', '')
+                        yield number, name, amount[1:], current.get('DTPOSTED', '')[:8], ''
+                    current = None
+                elif not closing:
+                    current = {}
+            elif current is not None and not closing and value.strip():
+                current[tag] = value.strip()
+
+
+def parse_date(value):
+    try:
+        return datetime.date.fromisoformat(value)  # fast path for the common ISO exports
+    except ValueError:
+        pass
+    for fmt in DATE_FORMATS:
+        try:
+            return datetime.datetime.strptime(value, fmt).date()
+        except ValueError:
+            continue
+    return None
+
+
+def clean_row(name, amount, date, category):
+    """(name, Decimal amount, date, category or None) or raise ValueError with the reason."""
+    name = name[:255]
+    if not name:
+        raise ValueError("missing name")
+    try:
+        amount = Decimal(amount.replace(',', '').replace('₹', '').strip()).quantize(Decimal('0.01'))
+    except InvalidOperation:
+        raise ValueError(f"bad amount {amount!r}")
+    if amount < 0:
+        raise ValueError(f"credit of {-amount}, not an expense")
+    if not amount or amount > MAX_AMOUNT:
+        raise ValueError(f"amount out of range {amount}")
+    parsed = parse_date(date)
+    if parsed is None:
+        raise ValueError(f"bad date {date!r}")
+    return name, amount, parsed, (category[:100] or None)
+
+
+def _chunks(iterable, size):
+    iterator = iter(iterable)
+    while True:
+        chunk = list(islice(iterator, size))
+        if not chunk:
+            return
+        yield chunk
+
+
+def import_rows(user, rows, batch_size=BATCH_SIZE, categorize=True):
+    """Validate, categorize and insert parsed rows in chunks. Returns an ImportResult."""
+    result = ImportResult()
+    try:
+        _import_chunks(user, rows, batch_size, categorize, result)
+    finally:
+        # Chunks commit one by one, so rows from before a failure are already in.
+        if result.created:
+            expenses_changed(user.id)
+    return result
+
+
+def _import_chunks(user, rows, batch_size, categorize, result):
+    for chunk in _chunks(rows, batch_size):
+        valid = []
+        for line, *values in chunk:
+            try:
+                valid.append(clean_row(*values))
+            except ValueError as e:
+                result.add_error(line, e)
+        if not valid:
+            continue
+
+        uncategorized = [name for name, _, _, category in valid if not category]
+        if categorize and uncategorized:
+            predicted = iter(categorizer.predict_many(uncategorized))
+        else:
+            predicted = iter([categorizer.DEFAULT_CATEGORY] * len(uncategorized))
+
+        expenses = [
+            Expense(user_id=user.id, name=name, amount=amount, date=date,
+                    category=category or next(predicted))
+            for name, amount, date, category in valid
+        ]
+        with transaction.atomic():
+            Expense.objects.bulk_create(expenses, batch_size=batch_size)
+            rollups.record_expenses(expenses)
+        result.created += len(expenses)
+
+
+def detect_format(filename):
+    return 'ofx' if filename.lower().endswith(('.ofx', '.qfx')) else 'csv'
+
+
+def import_file(user, fileobj, fmt='csv', **kwargs):
+    rows = iter_ofx(fileobj) if fmt == 'ofx' else iter_csv(fileobj)
+    return import_rows(user, rows, **kwargs)
@@ -0,0 +1,52 @@
+import datetime
+import time
+
+from django.conf import settings
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand, CommandError
+from django.utils.dateparse import parse_date
+
+from tracker import archive, snapshots
+from tracker.hooks import expenses_changed
+from tracker.models import Expense
+
+
+class Command(BaseCommand):
+    help = ("Move expenses older than TRACKER_ARCHIVE_AFTER_DAYS (rounded down to the start of that month) "
+            "out of the Expense table into the archive, leaving monthly summaries behind. Run it from cron.")
+
+    def add_arguments(self, parser):
+        parser.add_argument('usernames', nargs='*', help="Only archive these users (default: everyone).")
+        parser.add_argument('--before', help="YYYY-MM-DD; archive expenses before the start of this month instead.")
+        parser.add_argument('--batch-size', type=int, default=archive.BATCH_SIZE,
+                            help="Expenses moved per transaction.")
+
+    def handle(self, *args, **options):
+        if options['before']:
+            day = parse_date(options['before'])
+            if day is None:
+                raise CommandError("--before must be a YYYY-MM-DD date")
+        else:
+            day = datetime.date.today() - datetime.timedelta(days=settings.TRACKER_ARCHIVE_AFTER_DAYS)
+        before = archive.month_start(day)
+
+        old = Expense.objects.filter(date__lt=before)
+        if options['usernames']:
+            users = User.objects.filter(username__in=options['usernames'])
+            missing = set(options['usernames']) - set(users.values_list('username', flat=True))
+            if missing:
+                raise CommandError(f"Unknown user(s): {', '.join(sorted(missing))}")
+            old = old.filter(user__in=users)
+        user_ids = list(old.order_by('user_id').values_list('user_id', flat=True).distinct())
+
+        started = time.perf_counter()
+        moved = 0
+        for user_id in user_ids:
+            moved += archive.archive_user(user_id, before, max(options['batch_size'], 1))
+            expenses_changed(user_id)
+            if snapshots.enabled():
+                snapshots.compact(user_id)  # archived rows leave no tombstones for a delta to drop
+        self.stdout.write(self.style.SUCCESS(
+            f"Archived {moved} expenses from {len(user_ids)} users dated before {before} "
+            f"in {time.perf_counter() - started:.2f}s."
+        ))
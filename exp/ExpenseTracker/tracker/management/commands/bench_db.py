@@ -0,0 +1,180 @@
+import datetime
+import json
+import shutil
+import sqlite3
+import statistics
+import tempfile
+import threading
+import time
+from collections import defaultdict
+from contextlib import contextmanager
+from decimal import Decimal
+from pathlib import Path
+
+from django.conf import settings
+from django.contrib.auth.models import User
+from django.core.management import call_command
+from django.core.management.base import BaseCommand
+from django.db import OperationalError, connections, transaction
+from django.db.models import F, Sum
+
+from tracker import synthetic
+from tracker.models import DailyCategoryTotal, Expense
+from tracker.pagination import ORDERING, PAGE_SIZE
+
+# Journal settings compared, with the database the dashboard readers use.
+MODES = {
+    'rollback-journal': {'options': {}, 'replica': False},
+    'wal': {'options': settings.SQLITE_OPTIONS, 'replica': False},
+    'wal+replica': {'options': settings.SQLITE_OPTIONS, 'replica': True},
+}
+
+
+@contextmanager
+def _alias(alias, path, options):
+    """A temporary DATABASES entry for a SQLite file."""
+    connections.settings[alias] = {
+        **connections['default'].settings_dict, 'NAME': str(path), 'OPTIONS': options, 'TEST': {},
+    }
+    try:
+        yield alias
+    finally:
+        connections[alias].close()
+        del connections[alias]
+        del connections.settings[alias]
+
+
+class Command(BaseCommand):
+    help = ("Load-test SQLite under concurrent dashboard readers and add-expense writers, once per "
+            "journal mode (and with reads on a replica copy), and write throughput as JSON.")
+
+    def add_arguments(self, parser):
+        parser.add_argument('--readers', type=int, default=8)
+        parser.add_argument('--writers', type=int, default=2)
+        parser.add_argument('--seconds', type=float, default=5.0, help="Duration of each mode's run.")
+        parser.add_argument('--rows', type=int, default=20000, help="Expenses in the test database.")
+        parser.add_argument('--modes', default=','.join(MODES), help="Comma-separated subset of the modes.")
+        parser.add_argument('--out', help="Write JSON here instead of stdout.")
+
+    def handle(self, *args, **options):
+        report = {
+            'started': datetime.datetime.now(datetime.timezone.utc).isoformat(timespec='seconds'),
+            'sqlite': sqlite3.sqlite_version,
+            'readers': options['readers'],
+            'writers': options['writers'],
+            'seconds': options['seconds'],
+            'rows': options['rows'],
+            'results': {},
+        }
+        for mode in options['modes'].split(','):
+            report['results'][mode] = self.bench_mode(mode, options)
+            self.stderr.write(f"{mode} done")
+
+        baseline = report['results'].get('rollback-journal')
+        if baseline:
+            for result in report['results'].values():
+                for kind in ('reads', 'writes'):
+                    if baseline[f'{kind}_per_s']:
+                        result[f'{kind[:-1]}_gain'] = round(result[f'{kind}_per_s'] / baseline[f'{kind}_per_s'], 2)
+
+        output = json.dumps(report, indent=2)
+        if options['out']:
+            with open(options['out'], 'w') as f:
+                f.write(output + '\n')
+            self.stdout.write(self.style.SUCCESS(f"Wrote {options['out']}"))
+        else:
+            self.stdout.write(output)
+
+    def bench_mode(self, mode, options):
+        spec = MODES[mode]
+        workdir = Path(tempfile.mkdtemp(prefix='bench-db-'))
+        try:
+            with _alias('bench_primary', workdir / 'primary.sqlite3', spec['options']) as primary:
+                call_command('migrate', database=primary, verbosity=0)
+                user_id = self.populate(primary, options['rows'])
+                journal = connections[primary].cursor().execute('PRAGMA journal_mode').fetchone()[0]
+                connections[primary].close()
+
+                if not spec['replica']:
+                    return self.run(primary, primary, user_id, journal, options)
+                replica_path = workdir / 'replica.sqlite3'
+                shutil.copyfile(workdir / 'primary.sqlite3', replica_path)
+                with _alias('bench_replica', replica_path, spec['options']) as replica:
+                    return self.run(primary, replica, user_id, journal, options)
+        finally:
+            shutil.rmtree(workdir, ignore_errors=True)
+
+    def populate(self, alias, rows):
+        user = User.objects.db_manager(alias).create_user(f"bench-db-{time.time_ns()}", password=None)
+        expenses = list(synthetic.iter_expenses(user.id, rows))
+        totals = defaultdict(Decimal)
+        for expense in expenses:
+            totals[(expense.date, expense.category)] += expense.amount
+        with transaction.atomic(using=alias):
+            Expense.objects.using(alias).bulk_create(expenses, batch_size=5000)
+            DailyCategoryTotal.objects.using(alias).bulk_create([
+                DailyCategoryTotal(user_id=user.id, date=day, category=category, total=total)
+                for (day, category), total in totals.items()
+            ], batch_size=5000)
+        return user.id
+
+    def run(self, primary, reader_db, user_id, journal, options):
+        deadline = None
+        ready = threading.Barrier(options['readers'] + options['writers'] + 1)
+        lock = threading.Lock()
+        stats = {'read_ms': [], 'writes': 0, 'errors': 0}
+
+        def dashboard_read():
+            list(Expense.objects.using(reader_db).filter(user_id=user_id).order_by(*ORDERING)[:PAGE_SIZE])
+            DailyCategoryTotal.objects.using(reader_db).filter(user_id=user_id).aggregate(total=Sum('total'))
+
+        def add_expense():
+            today = datetime.date.today()
+            with transaction.atomic(using=primary):
+                Expense.objects.using(primary).create(
+                    user_id=user_id, name="Bench lunch", amount=Decimal('120.00'), category='Food', date=today)
+                updated = DailyCategoryTotal.objects.using(primary).filter(
+                    user_id=user_id, date=today, category='Food').update(total=F('total') + Decimal('120.00'))
+                if not updated:
+                    DailyCategoryTotal.objects.using(primary).create(
+                        user_id=user_id, date=today, category='Food', total=Decimal('120.00'))
+
+        def worker(op, timed):
+            timings, done, errors = [], 0, 0
+            try:
+                ready.wait()
+                while time.perf_counter() < deadline:
+                    started = time.perf_counter()
+                    try:
+                        op()
+                    except OperationalError:  # "database is locked" once the busy timeout runs out
+                        errors += 1
+                        continue
+                    done += 1
+                    if timed:
+                        timings.append((time.perf_counter() - started) * 1000)
+            finally:
+                connections.close_all()  # only this thread's connections
+            with lock:
+                stats['read_ms'].extend(timings)
+                stats['writes'] += 0 if timed else done
+                stats['errors'] += errors
+
+        threads = [threading.Thread(target=worker, args=(dashboard_read, True)) for _ in range(options['readers'])]
+        threads += [threading.Thread(target=worker, args=(add_expense, False)) for _ in range(options['writers'])]
+        for thread in threads:
+            thread.start()
+        deadline = time.perf_counter() + options['seconds']
+        ready.wait()
+        for thread in threads:
+            thread.join()
+
+        reads = stats['read_ms']
+        return {
+            'journal_mode': journal,
+            'reads_per_s': round(len(reads) / options['seconds'], 1),
+            'writes_per_s': round(stats['writes'] / options['seconds'], 1),
+            'read_p50_ms': round(statistics.median(reads), 2) if reads else None,
+            'read_p95_ms': round(statistics.quantiles(reads, n=20)[-1], 2) if len(reads) > 1 else None,
+            'errors': stats['errors'],
+        }
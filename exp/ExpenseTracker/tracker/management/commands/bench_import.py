@@ -0,0 +1,74 @@
+import csv
+import datetime
+import os
+import random
+import tempfile
+import time
+import tracemalloc
+
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from django.test.utils import override_settings
+
+from tracker import categorizer, importer
+
+NAMES = ['Swiggy order', 'Uber ride', 'Electricity bill', 'Netflix', 'Amazon purchase',
+         'Pharmacy', 'Metro card', 'Groceries', 'Movie tickets', 'Internet bill']
+
+
+class _Rollback(Exception):
+    pass
+
+
+class Command(BaseCommand):
+    help = ("Benchmark the bulk import pipeline on a synthetic CSV. Runs inside a transaction "
+            "that is rolled back, with the offline keyword categorizer.")
+
+    def add_arguments(self, parser):
+        parser.add_argument('--rows', type=int, default=100_000)
+        parser.add_argument('--batch-size', type=int, default=importer.BATCH_SIZE)
+        parser.add_argument('--trace-memory', action='store_true',
+                            help="Report peak Python heap use (tracemalloc slows the run down).")
+
+    def write_csv(self, path, rows):
+        rng = random.Random(42)
+        start = datetime.date(2020, 1, 1)
+        with open(path, 'w', newline='') as f:
+            writer = csv.writer(f)
+            writer.writerow(['Date', 'Description', 'Amount'])
+            for i in range(rows):
+                day = start + datetime.timedelta(days=rng.randrange(5 * 365))
+                writer.writerow([day.isoformat(), f"{rng.choice(NAMES)} {i % 97}", f"{rng.uniform(10, 5000):.2f}"])
+
+    def handle(self, *args, **options):
+        fd, path = tempfile.mkstemp(suffix='.csv')
+        os.close(fd)
+        try:
+            self.write_csv(path, options['rows'])
+            size_mb = os.path.getsize(path) / 1e6
+            categorizer.clear_cache()
+
+            if options['trace_memory']:
+                tracemalloc.start()
+            started = time.perf_counter()
+            try:
+                with transaction.atomic(), \
+                        override_settings(TRACKER_CATEGORY_BACKEND='tracker.categorizer.KeywordBackend'):
+                    user = User.objects.create_user(f"bench-import-{time.time_ns()}")
+                    with open(path, 'rb') as fileobj:
+                        result = importer.import_file(user, fileobj, 'csv', batch_size=options['batch_size'])
+                    elapsed = time.perf_counter() - started
+                    raise _Rollback
+            except _Rollback:
+                pass
+            peak = tracemalloc.get_traced_memory()[1] / 1e6 if options['trace_memory'] else None
+            tracemalloc.stop()
+        finally:
+            os.remove(path)
+
+        self.stdout.write(
+            f"rows={result.created} skipped={result.skipped} file={size_mb:.1f}MB "
+            f"time={elapsed:.2f}s rate={result.created / elapsed:,.0f} rows/s"
+            + (f" peak_heap={peak:.1f}MB" if peak is not None else "")
+        )
@@ -0,0 +1,137 @@
+import datetime
+import json
+import logging
+import platform
+import statistics
+import tempfile
+import time
+
+import django
+from django.contrib.auth.models import User
+from django.core.cache import cache
+from django.core.management.base import BaseCommand
+from django.db import connection, transaction
+from django.test import Client
+from django.test.utils import CaptureQueriesContext, override_settings
+from django.urls import reverse
+
+from tracker import anomaly, anomaly_cache, categorizer, classifier, snapshots, synthetic
+from tracker.columns import load_columns
+
+
+class _Rollback(Exception):
+    pass
+
+
+BENCH_SETTINGS = dict(
+    ALLOWED_HOSTS=['testserver'],
+    TRACKER_CATEGORY_BACKEND='tracker.categorizer.KeywordBackend',
+    TRACKER_CATEGORY_MODEL_PATH='',  # no local classifier: every prediction hits the stub
+    TRACKER_CATEGORY_ASYNC=False,
+    TRACKER_ANOMALY_ASYNC=False,
+)
+
+
+class Command(BaseCommand):
+    help = ("Time dashboard, add_expense, anomaly detection and chart data at several data sizes "
+            "and write the results as JSON. Each size runs in a transaction that is rolled back.")
+
+    def add_arguments(self, parser):
+        parser.add_argument('--sizes', default='1000,10000,100000', help="Comma-separated expense counts.")
+        parser.add_argument('--profile', choices=list(synthetic.PROFILES), default='normal')
+        parser.add_argument('--repeat', type=int, default=5)
+        parser.add_argument('--out', help="Write JSON here instead of stdout.")
+
+    def handle(self, *args, **options):
+        sizes = [int(size) for size in options['sizes'].split(',')]
+        report = {
+            'started': datetime.datetime.now(datetime.timezone.utc).isoformat(timespec='seconds'),
+            'python': platform.python_version(),
+            'django': django.get_version(),
+            'database': connection.vendor,
+            'profile': options['profile'],
+            'repeat': options['repeat'],
+            'results': {},
+        }
+        perf_logger = logging.getLogger('tracker.perf')
+        level = perf_logger.level
+        perf_logger.setLevel(logging.ERROR)  # the per-request lines would drown the report
+        with override_settings(**BENCH_SETTINGS):
+            classifier.reset()
+            for size in sizes:
+                report['results'][str(size)] = self.bench_size(size, options['profile'], options['repeat'])
+                self.stderr.write(f"{size} rows done")
+        classifier.reset()
+        perf_logger.setLevel(level)
+
+        output = json.dumps(report, indent=2)
+        if options['out']:
+            with open(options['out'], 'w') as f:
+                f.write(output + '\n')
+            self.stdout.write(self.style.SUCCESS(f"Wrote {options['out']}"))
+        else:
+            self.stdout.write(output)
+
+    def bench_size(self, size, profile, repeat):
+        results = {}
+        try:
+            with transaction.atomic():
+                user = synthetic.create_user(f"bench-views-{time.time_ns()}", size, profile)
+                client = Client()
+                client.force_login(user)
+
+                def dashboard_cold():
+                    cache.clear()
+                    return client.get(reverse('dashboard'))
+
+                results['dashboard_cold'] = self.measure(dashboard_cold, repeat)
+                results['dashboard_warm'] = self.measure(lambda: client.get(reverse('dashboard')), repeat)
+                results['chart_data'] = self.measure(lambda: client.get(reverse('chart_data')), repeat)
+
+                columns = load_columns(user)
+                results['load_columns'] = self.measure(lambda: load_columns(user), repeat)
+                with tempfile.TemporaryDirectory() as snapshot_dir, \
+                        override_settings(TRACKER_SNAPSHOT_DIR=snapshot_dir, TRACKER_SNAPSHOT_SLACK_SECONDS=0):
+                    # No slack: the rows were all written seconds ago and would otherwise be re-read.
+                    snapshots.compact(user.id)
+                    results['snapshot_load'] = self.measure(lambda: snapshots.load(user.id), repeat)
+                results['anomaly_detect'] = self.measure(
+                    lambda: anomaly.detect(columns, limit=anomaly.MAX_ALERTS), repeat)
+                results['anomaly_compute'] = self.measure(lambda: anomaly_cache.compute(user.id), repeat)
+
+                counter = iter(range(repeat))
+
+                def add_expense():
+                    categorizer.clear_cache()
+                    response = client.post(reverse('add_expense'), {
+                        'name': f"Uber ride {next(counter)}", 'amount': '250.00',
+                        'date': datetime.date.today().isoformat(),
+                    })
+                    if response.status_code != 302:
+                        raise RuntimeError("add_expense rejected the benchmark form")
+                    return response
+
+                results['add_expense'] = self.measure(add_expense, repeat)
+                raise _Rollback
+        except _Rollback:
+            pass
+        cache.clear()
+        return results
+
+    def measure(self, fn, repeat):
+        timings, queries = [], []
+        for _ in range(repeat):
+            with CaptureQueriesContext(connection) as captured:
+                started = time.perf_counter()
+                response = fn()
+                timings.append((time.perf_counter() - started) * 1000)
+            queries.append(len(captured))
+            status = getattr(response, 'status_code', 200)
+            if status >= 400:
+                raise RuntimeError(f"benchmark request failed with status {status}")
+        return {
+            'median_ms': round(statistics.median(timings), 2),
+            'min_ms': round(min(timings), 2),
+            'max_ms': round(max(timings), 2),
+            'queries': max(queries),
+        }
@@ -0,0 +1,30 @@
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand, CommandError
+
+from tracker import snapshots
+
+
+class Command(BaseCommand):
+    help = ("Rewrite per-user analytics snapshots (TRACKER_SNAPSHOT_DIR) from the database, folding in "
+            "their deltas. Run it periodically from cron or the platform scheduler.")
+
+    def add_arguments(self, parser):
+        parser.add_argument('usernames', nargs='*', help="Only these users (default: users with a snapshot).")
+        parser.add_argument('--all', action='store_true', help="Build snapshots for every user.")
+
+    def handle(self, *args, **options):
+        if not snapshots.enabled():
+            raise CommandError("TRACKER_SNAPSHOT_DIR is not set")
+        if options['usernames']:
+            users = User.objects.filter(username__in=options['usernames'])
+            missing = set(options['usernames']) - set(users.values_list('username', flat=True))
+            if missing:
+                raise CommandError(f"Unknown user(s): {', '.join(sorted(missing))}")
+            user_ids = list(users.values_list('id', flat=True))
+        elif options['all']:
+            user_ids = list(User.objects.values_list('id', flat=True))
+        else:
+            user_ids = snapshots.user_ids()
+
+        rows = sum(len(snapshots.compact(user_id)) for user_id in user_ids)
+        self.stdout.write(self.style.SUCCESS(f"Compacted {len(user_ids)} snapshot(s), {rows} rows."))
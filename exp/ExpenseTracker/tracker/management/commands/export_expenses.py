@@ -0,0 +1,84 @@
+import os
+import time
+from concurrent.futures import ThreadPoolExecutor, as_completed
+
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connections
+from django.utils.dateparse import parse_date
+
+from tracker import exporter
+
+
+def export_user(user, out_dir, fmt, start, end, category):
+    _, extension = exporter.FORMATS[fmt]
+    path = os.path.join(out_dir, f"{user.username}.{extension}")
+    rows = exporter.export_rows(user, start, end, category)
+    with open(path, 'w', newline='', encoding='utf-8') as f:
+        f.writelines(exporter.encode(rows, fmt))
+    return path
+
+
+def _export_in_worker(*args):
+    try:
+        return export_user(*args)
+    finally:
+        connections.close_all()  # this worker thread's connections only
+
+
+class Command(BaseCommand):
+    help = "Export every user's expenses (or the given users') to one file per user, in parallel."
+
+    def add_arguments(self, parser):
+        parser.add_argument('out_dir')
+        parser.add_argument('usernames', nargs='*')
+        parser.add_argument('--format', choices=list(exporter.FORMATS), default='csv')
+        parser.add_argument('--workers', type=int, default=4)
+        parser.add_argument('--start', help="YYYY-MM-DD")
+        parser.add_argument('--end', help="YYYY-MM-DD")
+        parser.add_argument('--category')
+
+    def handle(self, *args, **options):
+        start = parse_date(options['start']) if options['start'] else None
+        end = parse_date(options['end']) if options['end'] else None
+        if (options['start'] and start is None) or (options['end'] and end is None):
+            raise CommandError("--start/--end must be YYYY-MM-DD dates")
+        os.makedirs(options['out_dir'], exist_ok=True)
+
+        users = User.objects.order_by('id')
+        if options['usernames']:
+            users = users.filter(username__in=options['usernames'])
+
+        job = (options['out_dir'], options['format'], start, end, options['category'])
+        started = time.perf_counter()
+        exported = failures = 0
+        for user, path, error in self._run(list(users), job, options['workers']):
+            if error is None:
+                exported += 1
+                self.stdout.write(path)
+            else:
+                failures += 1
+                self.stderr.write(f"{user.username}: {error}")
+
+        self.stdout.write(self.style.SUCCESS(
+            f"Exported {exported} users in {time.perf_counter() - started:.2f}s."
+        ))
+        if failures:
+            raise CommandError(f"{failures} export(s) failed")
+
+    def _run(self, users, job, workers):
+        """Yield (user, path, error) per user; one worker runs in this thread."""
+        if workers <= 1:
+            for user in users:
+                try:
+                    yield user, export_user(user, *job), None
+                except Exception as e:
+                    yield user, None, e
+            return
+        with ThreadPoolExecutor(max_workers=workers) as pool:
+            futures = {pool.submit(_export_in_worker, user, *job): user for user in users}
+            for future in as_completed(futures):
+                try:
+                    yield futures[future], future.result(), None
+                except Exception as e:
+                    yield futures[future], None, e
@@ -0,0 +1,30 @@
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand, CommandError
+
+from tracker import synthetic
+
+
+class Command(BaseCommand):
+    help = "Create synthetic users with generated expenses (for benchmarks and load tests)."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--users', type=int, default=1)
+        parser.add_argument('--rows', type=int, default=1000, help="Expenses per user.")
+        parser.add_argument('--profile', choices=list(synthetic.PROFILES), default='normal')
+        parser.add_argument('--days', type=int, default=365, help="Spread expenses over this many days up to today.")
+        parser.add_argument('--prefix', default='synthetic')
+        parser.add_argument('--seed', type=int, default=0)
+
+    def handle(self, *args, **options):
+        names = [f"{options['prefix']}-{options['profile']}-{i}" for i in range(options['users'])]
+        taken = set(User.objects.filter(username__in=names).values_list('username', flat=True))
+        if taken:
+            raise CommandError(f"User(s) already exist: {', '.join(sorted(taken))}")
+
+        for i, username in enumerate(names):
+            synthetic.create_user(username, options['rows'], options['profile'],
+                                  days=options['days'], seed=options['seed'] + i)
+            self.stdout.write(username)
+        self.stdout.write(self.style.SUCCESS(
+            f"Created {len(names)} users with {options['rows']} {options['profile']} expenses each."
+        ))
@@ -0,0 +1,113 @@
+import json
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+import django
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connections
+from django.utils import timezone
+from django.utils.dateparse import parse_date
+
+from tracker import reports
+from tracker.models import Report, ReportRun
+
+
+def report_shard(run_id, user_ids, start, end):
+    """Write a Report per user; returns (reported, [(user_id, error), ...])."""
+    reported, failures = 0, []
+    for user_id in user_ids:
+        try:
+            Report.objects.create(run_id=run_id, user_id=user_id, **reports.build(user_id, start, end))
+            reported += 1
+        except Exception as e:
+            failures.append((user_id, str(e)))
+    return reported, failures
+
+
+def _init_worker():
+    django.setup()  # no-op after fork; needed where workers are spawned
+    connections.close_all()
+
+
+class Command(BaseCommand):
+    help = ("Write monthly statements (spend per month and category plus anomaly alerts) for every user, "
+            "or the given users, sharded across a process pool, then an all-users summary. Statements "
+            "already written by an interrupted run are kept: --resume carries on from them.")
+
+    def add_arguments(self, parser):
+        parser.add_argument('usernames', nargs='*')
+        parser.add_argument('--workers', type=int, default=os.cpu_count() or 1)
+        parser.add_argument('--shard-size', type=int, default=50, help="Users per task handed to a worker.")
+        parser.add_argument('--start', help="YYYY-MM-DD")
+        parser.add_argument('--end', help="YYYY-MM-DD")
+        parser.add_argument('--resume', nargs='?', const='latest', metavar='RUN_ID',
+                            help="Finish an unfinished run (default: the latest one).")
+        parser.add_argument('--out', help="Also write the all-users summary here as JSON.")
+
+    def handle(self, *args, **options):
+        run = self._resumed_run(options['resume']) if options['resume'] else self._new_run(options)
+        done = set(run.reports.values_list('user_id', flat=True))
+        users = User.objects.order_by('id')
+        if run.usernames:
+            users = users.filter(username__in=run.usernames)
+        pending = [user_id for user_id in users.values_list('id', flat=True) if user_id not in done]
+        size = max(options['shard_size'], 1)
+        shards = [pending[i:i + size] for i in range(0, len(pending), size)]
+
+        self.stderr.write(f"Run {run.pk}: {len(pending)} users in {len(shards)} shards ({len(done)} already done)")
+        started = time.perf_counter()
+        reported, failures = 0, []
+        for shard_reported, shard_failures in self._run(run, shards, options['workers']):
+            reported += shard_reported
+            failures += shard_failures
+            self.stderr.write(f"{reported + len(failures)}/{len(pending)} users")
+        for user_id, error in failures:
+            self.stderr.write(f"user {user_id}: {error}")
+        if failures:
+            raise CommandError(f"{len(failures)} report(s) failed; rerun with --resume {run.pk}")
+
+        run.summary = reports.summarize(run)
+        run.finished_at = timezone.now()
+        run.save(update_fields=['summary', 'finished_at'])
+        if options['out']:
+            with open(options['out'], 'w') as f:
+                f.write(json.dumps(run.summary, indent=2) + '\n')
+        self.stdout.write(self.style.SUCCESS(
+            f"Run {run.pk}: reported {reported} users in {time.perf_counter() - started:.2f}s "
+            f"with {options['workers']} worker(s)."
+        ))
+
+    def _new_run(self, options):
+        start = parse_date(options['start']) if options['start'] else None
+        end = parse_date(options['end']) if options['end'] else None
+        if (options['start'] and start is None) or (options['end'] and end is None):
+            raise CommandError("--start/--end must be YYYY-MM-DD dates")
+        if options['usernames']:
+            known = set(User.objects.filter(username__in=options['usernames']).values_list('username', flat=True))
+            missing = set(options['usernames']) - known
+            if missing:
+                raise CommandError(f"Unknown user(s): {', '.join(sorted(missing))}")
+        return ReportRun.objects.create(start=start, end=end, usernames=options['usernames'])
+
+    def _resumed_run(self, run_id):
+        runs = ReportRun.objects.filter(finished_at__isnull=True).order_by('-pk')
+        if run_id != 'latest' and not run_id.isdigit():
+            raise CommandError("--resume takes a run id")
+        run = runs.first() if run_id == 'latest' else runs.filter(pk=run_id).first()
+        if run is None:
+            raise CommandError("no unfinished report run to resume")
+        return run
+
+    def _run(self, run, shards, workers):
+        """Yield (reported, failures) per shard; one worker runs in this process."""
+        if workers <= 1:
+            for shard in shards:
+                yield report_shard(run.pk, shard, run.start, run.end)
+            return
+        connections.close_all()  # forked workers must not share this process's connections
+        with ProcessPoolExecutor(max_workers=workers, initializer=_init_worker) as pool:
+            futures = [pool.submit(report_shard, run.pk, shard, run.start, run.end) for shard in shards]
+            for future in as_completed(futures):
+                yield future.result()
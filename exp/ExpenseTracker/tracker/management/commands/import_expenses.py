@@ -0,0 +1,45 @@
+import csv
+import time
+
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand, CommandError
+
+from tracker import importer
+
+
+class Command(BaseCommand):
+    help = "Import expenses for a user from a CSV or OFX/QFX bank export."
+
+    def add_arguments(self, parser):
+        parser.add_argument('username')
+        parser.add_argument('path')
+        parser.add_argument('--format', choices=['csv', 'ofx'], default=None,
+                            help="File format (default: detect from the extension).")
+        parser.add_argument('--batch-size', type=int, default=importer.BATCH_SIZE)
+        parser.add_argument('--no-categorize', action='store_true',
+                            help="Store rows without a category column as Other instead of predicting one.")
+
+    def handle(self, *args, **options):
+        try:
+            user = User.objects.get(username=options['username'])
+        except User.DoesNotExist:
+            raise CommandError(f"Unknown user {options['username']}")
+        fmt = options['format'] or importer.detect_format(options['path'])
+
+        started = time.perf_counter()
+        try:
+            with open(options['path'], 'rb') as fileobj:
+                result = importer.import_file(
+                    user, fileobj, fmt,
+                    batch_size=options['batch_size'],
+                    categorize=not options['no_categorize'],
+                )
+        except (OSError, ValueError, csv.Error) as e:
+            raise CommandError(str(e))
+        elapsed = time.perf_counter() - started
+
+        for error in result.errors:
+            self.stderr.write(error)
+        self.stdout.write(self.style.SUCCESS(
+            f"Imported {result.created} expenses ({result.skipped} skipped) in {elapsed:.2f}s."
+        ))
@@ -0,0 +1,21 @@
+from django.core.management.base import BaseCommand, CommandError
+from django.utils.dateparse import parse_date
+
+from tracker import recurring
+
+
+class Command(BaseCommand):
+    help = "Add every due occurrence of all users' recurring expenses. Run daily (cron or scheduler)."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--date', help="Treat this YYYY-MM-DD as today (default: today).")
+        parser.add_argument('--batch-size', type=int, default=recurring.BATCH_SIZE)
+
+    def handle(self, *args, **options):
+        today = None
+        if options['date']:
+            today = parse_date(options['date'])
+            if today is None:
+                raise CommandError("--date must be YYYY-MM-DD")
+        created = recurring.materialize(today, batch_size=options['batch_size'])
+        self.stdout.write(self.style.SUCCESS(f"Added {created} recurring expenses."))
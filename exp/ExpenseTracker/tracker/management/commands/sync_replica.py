@@ -0,0 +1,29 @@
+import sqlite3
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connections
+
+from tracker import routers
+
+
+class Command(BaseCommand):
+    help = ("Refresh the SQLite stand-in replica (TRACKER_DB_REPLICA) from the primary with an online "
+            "backup; safe while the app is serving. Run it from cron as often as the lag you accept.")
+
+    def handle(self, *args, **options):
+        if not routers.replica_configured():
+            raise CommandError("TRACKER_DB_REPLICA is not set")
+        primary, replica = connections['default'], connections[routers.REPLICA]
+        if primary.vendor != 'sqlite' or replica.vendor != 'sqlite':
+            raise CommandError("only SQLite replicas are copied; a Postgres replica follows its primary "
+                               "through streaming replication")
+
+        source = sqlite3.connect(primary.settings_dict['NAME'])
+        target = sqlite3.connect(replica.settings_dict['NAME'])
+        try:
+            source.backup(target)
+            pages = target.execute('PRAGMA page_count').fetchone()[0]
+        finally:
+            target.close()
+            source.close()
+        self.stdout.write(self.style.SUCCESS(f"Copied {pages} pages to {replica.settings_dict['NAME']}"))
@@ -0,0 +1,39 @@
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+
+from tracker import classifier
+from tracker.categorizer import DEFAULT_CATEGORY
+from tracker.models import Expense
+
+
+class Command(BaseCommand):
+    help = "Train the local category classifier from users' already categorized expenses."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--output', default=None,
+                            help="Where to write the model (default: settings.TRACKER_CATEGORY_MODEL_PATH).")
+        parser.add_argument('--limit', type=int, default=None,
+                            help="Train on at most this many of the most recent expenses.")
+
+    def handle(self, *args, **options):
+        rows = (
+            Expense.objects.exclude(category=DEFAULT_CATEGORY).exclude(category='')
+            .order_by('-id').values_list('name', 'category')
+        )
+        if options['limit']:
+            rows = rows[:options['limit']]
+        names, categories = [], []
+        for name, category in rows.iterator(chunk_size=5000):
+            names.append(name)
+            categories.append(category)
+
+        try:
+            model = classifier.train(names, categories)
+        except ValueError as e:
+            raise CommandError(str(e))
+
+        output = options['output'] or settings.TRACKER_CATEGORY_MODEL_PATH
+        classifier.save(model, output)
+        self.stdout.write(self.style.SUCCESS(
+            f"Trained on {len(names)} expenses across {len(model.classes_)} categories; saved to {output}."
+        ))
@@ -0,0 +1,47 @@
+# Generated by Django 5.2.4 on 2026-10-18 17:00
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+from django.db.models import Count, Sum
+
+
+def populate_totals(apps, schema_editor):
+    Expense = apps.get_model('tracker', 'Expense')
+    DailyCategoryTotal = apps.get_model('tracker', 'DailyCategoryTotal')
+    db = schema_editor.connection.alias
+    grouped = (
+        Expense.objects.using(db).values('user_id', 'date', 'category')
+        .annotate(total=Sum('amount'), count=Count('id'))
+        .order_by()
+    )
+    DailyCategoryTotal.objects.using(db).bulk_create(
+        [DailyCategoryTotal(**row) for row in grouped.iterator()],
+        batch_size=1000,
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('tracker', '0005_alter_expense_date'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='DailyCategoryTotal',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('date', models.DateField()),
+                ('category', models.CharField(max_length=100)),
+                ('total', models.DecimalField(decimal_places=2, default=0, max_digits=14)),
+                ('count', models.PositiveIntegerField(default=0)),
+                ('user', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                'constraints': [models.UniqueConstraint(fields=('user', 'date', 'category'), name='daily_total_user_date_category')],
+            },
+        ),
+        migrations.RunPython(populate_totals, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,33 @@
+# Generated by Django 5.2.4 on 2026-10-18 17:32
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('tracker', '0008_budget'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='RecurringExpense',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('name', models.CharField(max_length=255)),
+                ('amount', models.DecimalField(decimal_places=2, max_digits=10)),
+                ('category', models.CharField(default='Other', max_length=100)),
+                ('cadence', models.CharField(choices=[('week', 'Weekly'), ('month', 'Monthly')], max_length=10)),
+                ('anchor_day', models.PositiveSmallIntegerField(help_text='Day of month that monthly occurrences fall on')),
+                ('next_date', models.DateField()),
+                ('active', models.BooleanField(default=True)),
+                ('user', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                'indexes': [models.Index(fields=['active', 'next_date'], name='recurring_due_idx')],
+            },
+        ),
+    ]
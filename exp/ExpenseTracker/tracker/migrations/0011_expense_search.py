@@ -0,0 +1,73 @@
+# Full-text index over expense names and categories (see tracker/search.py).
+
+from django.db import migrations
+
+SQLITE_FORWARD = [
+    # External-content FTS5 table: the text lives in tracker_expense, the index here.
+    """
+    CREATE VIRTUAL TABLE tracker_expense_fts USING fts5(
+        name, category,
+        content='tracker_expense', content_rowid='id',
+        tokenize='unicode61 remove_diacritics 2', prefix='2 3'
+    )
+    """,
+    """
+    CREATE TRIGGER tracker_expense_fts_insert AFTER INSERT ON tracker_expense BEGIN
+        INSERT INTO tracker_expense_fts(rowid, name, category)
+        VALUES (new.id, new.name, new.category);
+    END
+    """,
+    """
+    CREATE TRIGGER tracker_expense_fts_delete AFTER DELETE ON tracker_expense BEGIN
+        INSERT INTO tracker_expense_fts(tracker_expense_fts, rowid, name, category)
+        VALUES ('delete', old.id, old.name, old.category);
+    END
+    """,
+    """
+    CREATE TRIGGER tracker_expense_fts_update AFTER UPDATE OF name, category ON tracker_expense BEGIN
+        INSERT INTO tracker_expense_fts(tracker_expense_fts, rowid, name, category)
+        VALUES ('delete', old.id, old.name, old.category);
+        INSERT INTO tracker_expense_fts(rowid, name, category)
+        VALUES (new.id, new.name, new.category);
+    END
+    """,
+    "INSERT INTO tracker_expense_fts(tracker_expense_fts) VALUES ('rebuild')",
+]
+
+SQLITE_BACKWARD = [
+    "DROP TRIGGER IF EXISTS tracker_expense_fts_update",
+    "DROP TRIGGER IF EXISTS tracker_expense_fts_delete",
+    "DROP TRIGGER IF EXISTS tracker_expense_fts_insert",
+    "DROP TABLE IF EXISTS tracker_expense_fts",
+]
+
+# Postgres keeps a GIN index on the same expression tracker.search queries with.
+POSTGRES_FORWARD = [
+    """
+    CREATE INDEX expense_search_idx ON tracker_expense
+    USING GIN (to_tsvector('simple', name || ' ' || category))
+    """,
+]
+
+POSTGRES_BACKWARD = ["DROP INDEX IF EXISTS expense_search_idx"]
+
+
+def _run(statements):
+    def run(apps, schema_editor):
+        for sql in statements.get(schema_editor.connection.vendor, []):
+            schema_editor.execute(sql)
+    return run
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('tracker', '0010_sync_timestamps'),
+    ]
+
+    operations = [
+        migrations.RunPython(
+            _run({'sqlite': SQLITE_FORWARD, 'postgresql': POSTGRES_FORWARD}),
+            _run({'sqlite': SQLITE_BACKWARD, 'postgresql': POSTGRES_BACKWARD}),
+        ),
+    ]
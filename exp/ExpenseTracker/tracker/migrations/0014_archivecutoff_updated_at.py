@@ -0,0 +1,20 @@
+# Generated by Django 5.2.4 on 2026-10-18 21:05
+
+import django.utils.timezone
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('tracker', '0013_expense_archive'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='archivecutoff',
+            name='updated_at',
+            field=models.DateTimeField(auto_now=True, default=django.utils.timezone.now),
+            preserve_default=False,
+        ),
+    ]
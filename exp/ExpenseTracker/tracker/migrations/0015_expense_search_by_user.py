@@ -0,0 +1,59 @@
+# Scope the SQLite full-text index to each user (see tracker/search.py).
+
+from importlib import import_module
+
+from django.db import migrations
+
+previous = import_module('tracker.migrations.0011_expense_search')
+
+SQLITE_FORWARD = previous.SQLITE_BACKWARD + [
+    # Contentless FTS5 table: `owner` holds the token u<user_id>, which tracker_expense
+    # has no column for, so the triggers supply every value (deletes included).
+    """
+    CREATE VIRTUAL TABLE tracker_expense_fts USING fts5(
+        name, category, owner,
+        content='',
+        tokenize='unicode61 remove_diacritics 2', prefix='2 3'
+    )
+    """,
+    """
+    CREATE TRIGGER tracker_expense_fts_insert AFTER INSERT ON tracker_expense BEGIN
+        INSERT INTO tracker_expense_fts(rowid, name, category, owner)
+        VALUES (new.id, new.name, new.category, 'u' || new.user_id);
+    END
+    """,
+    """
+    CREATE TRIGGER tracker_expense_fts_delete AFTER DELETE ON tracker_expense BEGIN
+        INSERT INTO tracker_expense_fts(tracker_expense_fts, rowid, name, category, owner)
+        VALUES ('delete', old.id, old.name, old.category, 'u' || old.user_id);
+    END
+    """,
+    """
+    CREATE TRIGGER tracker_expense_fts_update AFTER UPDATE OF name, category, user_id ON tracker_expense BEGIN
+        INSERT INTO tracker_expense_fts(tracker_expense_fts, rowid, name, category, owner)
+        VALUES ('delete', old.id, old.name, old.category, 'u' || old.user_id);
+        INSERT INTO tracker_expense_fts(rowid, name, category, owner)
+        VALUES (new.id, new.name, new.category, 'u' || new.user_id);
+    END
+    """,
+    """
+    INSERT INTO tracker_expense_fts(rowid, name, category, owner)
+    SELECT id, name, category, 'u' || user_id FROM tracker_expense
+    """,
+]
+
+SQLITE_BACKWARD = previous.SQLITE_BACKWARD + previous.SQLITE_FORWARD
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('tracker', '0014_archivecutoff_updated_at'),
+    ]
+
+    operations = [
+        migrations.RunPython(
+            previous._run({'sqlite': SQLITE_FORWARD}),
+            previous._run({'sqlite': SQLITE_BACKWARD}),
+        ),
+    ]
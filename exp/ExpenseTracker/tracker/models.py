@@ -9,15 +9,189 @@ class Expense(models.Model):
     amount = models.DecimalField(max_digits=10, decimal_places=2)
     date = models.DateField()
     category = models.CharField(max_length=100, default='Other')
+    updated_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        indexes = [
+            # Dashboard listing: filter by user, newest/largest first
+            models.Index(fields=['user', '-date', '-amount'], name='expense_user_date_amount_idx'),
+            # Category filters and per-category date ranges / weekly grouping
+            models.Index(fields=['user', 'category', 'date'], name='expense_user_cat_date_idx'),
+            # Change feed and data-version lookups
+            models.Index(fields=['user', 'updated_at', 'id'], name='expense_user_updated_idx'),
+        ]
 
     def __str__(self):
         return self.name
 class Income(models.Model):
     user = models.OneToOneField(User, on_delete=models.CASCADE)
     amount = models.DecimalField(max_digits=10, decimal_places=2)
+    updated_at = models.DateTimeField(auto_now=True)
 
     def __str__(self):
         return f"{self.user.username}'s Income: {self.amount}"
 
 
+class Tombstone(models.Model):
+    """Marks a deleted Expense, Income or Budget so sync clients (and ETags) see the removal."""
+    KINDS = [('expense', 'Expense'), ('income', 'Income'), ('budget', 'Budget')]
+
+    user = models.ForeignKey(User, on_delete=models.CASCADE)
+    kind = models.CharField(max_length=10, choices=KINDS)
+    object_id = models.BigIntegerField()
+    deleted_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['user', 'deleted_at', 'id'], name='tombstone_user_deleted_idx'),
+        ]
+
+    def __str__(self):
+        return f"{self.kind} {self.object_id} deleted {self.deleted_at}"
+
+
+class DailyCategoryTotal(models.Model):
+    """Running per-user, per-day, per-category spend kept current by the expense write paths."""
+    user = models.ForeignKey(User, on_delete=models.CASCADE)
+    date = models.DateField()
+    category = models.CharField(max_length=100)
+    total = models.DecimalField(max_digits=14, decimal_places=2, default=0)
+    count = models.PositiveIntegerField(default=0)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['user', 'date', 'category'], name='daily_total_user_date_category'),
+        ]
+
+    def __str__(self):
+        return f"{self.user_id} {self.date} {self.category}: {self.total}"
+
+
+class Budget(models.Model):
+    """Spending limit per week or month, for one category or (blank category) for everything."""
+    PERIODS = [('week', 'Weekly'), ('month', 'Monthly')]
+
+    user = models.ForeignKey(User, on_delete=models.CASCADE)
+    category = models.CharField(max_length=100, blank=True, default='')
+    period = models.CharField(max_length=10, choices=PERIODS, default='month')
+    limit = models.DecimalField(max_digits=12, decimal_places=2)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['user', 'category', 'period'], name='budget_user_category_period'),
+        ]
+
+    def __str__(self):
+        return f"{self.user_id} {self.category or 'All'} {self.period}: {self.limit}"
+
+
+class RecurringExpense(models.Model):
+    """A repeating expense; the materialize_recurring command adds each occurrence once it is due."""
+    CADENCES = [('week', 'Weekly'), ('month', 'Monthly')]
+
+    user = models.ForeignKey(User, on_delete=models.CASCADE)
+    name = models.CharField(max_length=255)
+    amount = models.DecimalField(max_digits=10, decimal_places=2)
+    category = models.CharField(max_length=100, default='Other')
+    cadence = models.CharField(max_length=10, choices=CADENCES)
+    anchor_day = models.PositiveSmallIntegerField(help_text="Day of month that monthly occurrences fall on")
+    next_date = models.DateField()
+    active = models.BooleanField(default=True)
+
+    class Meta:
+        indexes = [
+            # Scheduler: due series across all users
+            models.Index(fields=['active', 'next_date'], name='recurring_due_idx'),
+        ]
+
+    def __str__(self):
+        return f"{self.name} ({self.cadence}) next {self.next_date}"
+
+
+class ReportRun(models.Model):
+    """One generate_reports run. Its Report rows are the checkpoint a resumed run skips."""
+    started_at = models.DateTimeField(auto_now_add=True)
+    finished_at = models.DateTimeField(null=True, blank=True)
+    start = models.DateField(null=True, blank=True)
+    end = models.DateField(null=True, blank=True)
+    usernames = models.JSONField(default=list, blank=True, help_text="Users covered; empty means everyone")
+    summary = models.JSONField(default=dict, blank=True, help_text="All users' spend per month and category")
+
+    def __str__(self):
+        return f"Report run {self.pk} started {self.started_at:%Y-%m-%d %H:%M}"
+
+
+class Report(models.Model):
+    """A user's statement from one run: spend per month and category, plus their anomaly alerts."""
+    run = models.ForeignKey(ReportRun, on_delete=models.CASCADE, related_name='reports')
+    user = models.ForeignKey(User, on_delete=models.CASCADE)
+    total = models.DecimalField(max_digits=14, decimal_places=2)
+    expense_count = models.PositiveIntegerField()
+    months = models.JSONField(default=dict)
+    alerts = models.JSONField(default=list)
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['run', 'user'], name='report_run_user'),
+        ]
+
+    def __str__(self):
+        return f"Run {self.run_id} report for {self.user_id}: {self.total}"
+
+
+
+class ArchivedExpense(models.Model):
+    """
+    An expense older than its user's ArchiveCutoff, moved out of the Expense
+    table by archive_expenses with its id kept. Read-only from then on.
+    """
+    archived = True
+
+    id = models.BigIntegerField(primary_key=True)
+    user = models.ForeignKey(User, on_delete=models.CASCADE)
+    name = models.CharField(max_length=255)
+    amount = models.DecimalField(max_digits=10, decimal_places=2)
+    date = models.DateField()
+    category = models.CharField(max_length=100, default='Other')
+    updated_at = models.DateTimeField()
+    archived_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['user', '-date', '-amount'], name='archived_user_date_amount_idx'),
+        ]
+
+    def __str__(self):
+        return self.name
+
+
+class MonthlyCategoryTotal(models.Model):
+    """Per-user, per-month, per-category spend of archived expenses; replaces their daily rollups."""
+    user = models.ForeignKey(User, on_delete=models.CASCADE)
+    month = models.DateField(help_text="First day of the month")
+    category = models.CharField(max_length=100)
+    total = models.DecimalField(max_digits=14, decimal_places=2, default=0)
+    count = models.PositiveIntegerField(default=0)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['user', 'month', 'category'], name='monthly_total_user_month_category'),
+        ]
+
+    def __str__(self):
+        return f"{self.user_id} {self.month:%Y-%m} {self.category}: {self.total}"
+
+
+class ArchiveCutoff(models.Model):
+    """Expenses dated before `before` live in ArchivedExpense and MonthlyCategoryTotal."""
+    user = models.OneToOneField(User, on_delete=models.CASCADE)
+    before = models.DateField()
+    updated_at = models.DateTimeField(auto_now=True)  # every archive run; part of sync.data_version()
+
+    def __str__(self):
+        return f"{self.user_id} archived before {self.before}"
+
+
 # Create your models here.
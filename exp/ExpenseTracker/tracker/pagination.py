@@ -0,0 +1,49 @@
+"""
+Keyset (seek) pagination over a user's expenses.
+
+Pages follow the dashboard order (date, amount, id) descending. The cursor
+is the sort key of the last row shown, so fetching page N costs the same
+index seek as page 1 however deep the history goes.
+"""
+import datetime
+from decimal import Decimal, InvalidOperation
+
+from django.db.models import Q
+
+PAGE_SIZE = 50
+ORDERING = ('-date', '-amount', '-id')
+
+
+def encode_cursor(expense):
+    return f"{expense.date.isoformat()}_{expense.amount}_{expense.id}"
+
+
+def decode_cursor(cursor):
+    """(date, amount, id) from a cursor string, or None if it is malformed."""
+    try:
+        day, amount, pk = cursor.split('_')
+        return datetime.date.fromisoformat(day), Decimal(amount), int(pk)
+    except (AttributeError, ValueError, InvalidOperation):
+        return None
+
+
+def after(queryset, cursor):
+    """Rows strictly after `cursor` in ORDERING."""
+    key = decode_cursor(cursor) if cursor else None
+    if key is None:
+        return queryset
+    day, amount, pk = key
+    return queryset.filter(
+        Q(date__lt=day)
+        | Q(date=day, amount__lt=amount)
+        | Q(date=day, amount=amount, id__lt=pk)
+    )
+
+
+def paginate(queryset, cursor=None, size=PAGE_SIZE):
+    """Return (rows, next_cursor); next_cursor is None on the last page."""
+    rows = list(after(queryset.order_by(*ORDERING), cursor)[:size + 1])
+    if len(rows) > size:
+        rows = rows[:size]
+        return rows, encode_cursor(rows[-1])
+    return rows, None
@@ -0,0 +1,197 @@
+"""
+Per-request performance instrumentation.
+
+PerfMiddleware times each request, counts and times its database queries and
+collects named spans (anomaly detection, chart prep, category prediction...)
+recorded with `span()` anywhere below the view. The result is sent back as a
+Server-Timing header and logged as one JSON line on the `tracker.perf`
+logger. A fraction of requests (TRACKER_PERF_PROFILE_RATE) also run under a
+stack-sampling profiler whose hottest stacks are logged if they turn out slow.
+"""
+import json
+import logging
+import random
+import sys
+import threading
+import time
+from collections import Counter, defaultdict
+from contextlib import ExitStack, contextmanager
+from contextvars import ContextVar
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction, sync_to_async
+
+from django.conf import settings
+from django.db import connections
+from django.utils.decorators import sync_and_async_middleware
+from django.utils.module_loading import import_string
+
+logger = logging.getLogger('tracker.perf')
+
+_current = ContextVar('tracker_perf_stats', default=None)
+
+
+class RequestStats:
+    def __init__(self):
+        self.started = time.perf_counter()
+        self.queries = 0
+        self.db_time = 0.0
+        self.spans = defaultdict(float)
+        self.counts = Counter()
+
+    def elapsed(self):
+        return time.perf_counter() - self.started
+
+    def query_wrapper(self, execute, sql, params, many, context):
+        started = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            self.db_time += time.perf_counter() - started
+            self.queries += 1
+
+    def server_timing(self, total):
+        parts = [f'total;dur={total * 1000:.1f}',
+                 f'db;dur={self.db_time * 1000:.1f};desc="{self.queries} queries"']
+        parts += [f'{name};dur={seconds * 1000:.1f}' for name, seconds in self.spans.items()]
+        return ', '.join(parts)
+
+    def as_dict(self, total):
+        return {
+            'ms': round(total * 1000, 1),
+            'queries': self.queries,
+            'db_ms': round(self.db_time * 1000, 1),
+            'spans': {name: round(seconds * 1000, 1) for name, seconds in self.spans.items()},
+            'counts': dict(self.counts),
+        }
+
+
+def current():
+    """Stats of the request being handled on this thread, or None."""
+    return _current.get()
+
+
+@contextmanager
+def span(name):
+    """Add the time spent in the block to the current request's `name` span."""
+    stats = _current.get()
+    if stats is None:
+        yield
+        return
+    started = time.perf_counter()
+    try:
+        yield
+    finally:
+        stats.spans[name] += time.perf_counter() - started
+
+
+def count(name, n=1):
+    """Bump a per-request counter (cache hits, backend calls...)."""
+    stats = _current.get()
+    if stats is not None:
+        stats.counts[name] += n
+
+
+class StackSampler(threading.Thread):
+    """Samples another thread's Python stack every `interval` seconds."""
+
+    def __init__(self, thread_id, interval=0.005):
+        super().__init__(daemon=True, name='perf-sampler')
+        self.thread_id = thread_id
+        self.interval = interval
+        self.stacks = Counter()
+        self._stop_event = threading.Event()
+
+    def run(self):
+        while not self._stop_event.wait(self.interval):
+            frame = sys._current_frames().get(self.thread_id)
+            stack = []
+            while frame is not None:
+                code = frame.f_code
+                stack.append(f"{code.co_filename.rsplit('/', 1)[-1]}:{code.co_name}:{frame.f_lineno}")
+                frame = frame.f_back
+            if stack:
+                self.stacks[';'.join(reversed(stack))] += 1
+
+    def stop(self):
+        self._stop_event.set()
+        self.join()
+        return self.stacks
+
+
+def log_profile(request, stats, stacks):
+    """Default TRACKER_PERF_PROFILE_HOOK: log the most sampled stacks."""
+    for stack, samples in stacks.most_common(10):
+        logger.warning("profile %s %s samples=%d %s", request.method, request.path, samples, stack)
+
+
+@sync_and_async_middleware
+class PerfMiddleware:
+    """
+    Works in front of sync and async views. Under ASGI the query wrappers are
+    installed from the request's thread-sensitive executor, the thread that
+    runs its ORM calls.
+    """
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        self.async_mode = iscoroutinefunction(get_response)
+        if self.async_mode:
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if self.async_mode:
+            return self.__acall__(request)
+        if not settings.TRACKER_PERF:
+            return self.get_response(request)
+
+        stats, token, sampler = self._start()
+        try:
+            with ExitStack() as stack:
+                self._wrap_queries(stack, stats)
+                response = self.get_response(request)
+        finally:
+            _current.reset(token)
+            stacks = sampler.stop() if sampler else None
+        return self._finish(request, response, stats, stacks)
+
+    async def __acall__(self, request):
+        if not settings.TRACKER_PERF:
+            return await self.get_response(request)
+
+        stats, token, sampler = self._start()
+        stack = ExitStack()
+        try:
+            await sync_to_async(self._wrap_queries)(stack, stats)
+            try:
+                response = await self.get_response(request)
+            finally:
+                await sync_to_async(stack.close)()
+        finally:
+            _current.reset(token)
+            stacks = sampler.stop() if sampler else None
+        return self._finish(request, response, stats, stacks)
+
+    def _start(self):
+        stats = RequestStats()
+        token = _current.set(stats)
+        sampler = None
+        if random.random() < settings.TRACKER_PERF_PROFILE_RATE:
+            sampler = StackSampler(threading.get_ident())
+            sampler.start()
+        return stats, token, sampler
+
+    def _wrap_queries(self, stack, stats):
+        for alias in connections:
+            stack.enter_context(connections[alias].execute_wrapper(stats.query_wrapper))
+
+    def _finish(self, request, response, stats, stacks):
+        total = stats.elapsed()
+        response['Server-Timing'] = stats.server_timing(total)
+
+        record = {'method': request.method, 'path': request.path,
+                  'status': response.status_code, **stats.as_dict(total)}
+        slow = total * 1000 >= settings.TRACKER_PERF_SLOW_MS
+        logger.log(logging.WARNING if slow else logging.INFO, json.dumps(record))
+        if stacks and slow:
+            import_string(settings.TRACKER_PERF_PROFILE_HOOK)(request, stats, stacks)
+        return response
@@ -0,0 +1,147 @@
+"""
+Recurring expenses: detection and scheduled materialization.
+
+detect() reads a user's history once, in date order, and buckets it by
+(normalized name, amount) in a dict, so finding weekly/monthly series is a
+single linear pass plus a look at each bucket's gaps. Series whose next
+occurrence is overdue by more than a cadence are taken as stopped and not
+offered, and schedule() starts a series at its first occurrence from today,
+so scheduling never back-fills missed periods. materialize() adds every
+due occurrence for all users with one bulk_create per batch of series.
+"""
+import calendar
+import datetime
+from collections import defaultdict
+from dataclasses import dataclass
+from decimal import Decimal
+
+from django.db import transaction
+
+from . import rollups
+from .categorizer import normalize_name
+from .hooks import expenses_changed
+from .models import Expense, RecurringExpense
+
+MIN_OCCURRENCES = 3
+# Allowed gap in days between consecutive occurrences of each cadence.
+GAP_RANGES = {'week': (6, 8), 'month': (28, 31)}
+MIN_MATCHING_GAPS = 0.75  # share of gaps that must fit the cadence (tolerates a skipped entry)
+MAX_CATCH_UP = 60  # occurrences one series may add in a single run after downtime
+BATCH_SIZE = 500
+
+
+def advance(day, cadence, anchor_day):
+    """The occurrence after `day`; monthly series stay on `anchor_day` (clamped to month end)."""
+    if cadence == 'week':
+        return day + datetime.timedelta(days=7)
+    year, month = (day.year + 1, 1) if day.month == 12 else (day.year, day.month + 1)
+    return datetime.date(year, month, min(anchor_day, calendar.monthrange(year, month)[1]))
+
+
+@dataclass
+class Candidate:
+    name: str
+    amount: Decimal
+    category: str
+    cadence: str
+    occurrences: int
+    last_date: datetime.date
+    anchor_day: int
+
+    @property
+    def next_date(self):
+        return advance(self.last_date, self.cadence, self.anchor_day)
+
+
+def _cadence(dates):
+    gaps = [(b - a).days for a, b in zip(dates, dates[1:])]
+    for cadence, (low, high) in GAP_RANGES.items():
+        matching = sum(low <= gap <= high for gap in gaps)
+        if matching >= MIN_MATCHING_GAPS * len(gaps) and matching >= MIN_OCCURRENCES - 1:
+            return cadence
+    return None
+
+
+def _stale(candidate, today):
+    # The expected next occurrence is more than a whole cadence overdue: the user stopped paying.
+    return (today - candidate.next_date).days > GAP_RANGES[candidate.cadence][1]
+
+
+def detect(user, min_occurrences=MIN_OCCURRENCES, today=None):
+    """Candidates for weekly/monthly series in the user's history not yet scheduled and still running."""
+    today = today or datetime.date.today()
+    series = defaultdict(list)
+    rows = Expense.objects.filter(user=user).order_by('date').values_list('name', 'amount', 'date', 'category')
+    for name, amount, day, category in rows.iterator(chunk_size=2000):
+        dates = series[(normalize_name(name), amount)]
+        if not dates or dates[-1][0] != day:
+            dates.append((day, name, category))
+
+    scheduled = {
+        (normalize_name(name), amount, cadence)
+        for name, amount, cadence in RecurringExpense.objects.filter(user=user, active=True)
+        .values_list('name', 'amount', 'cadence')
+    }
+    candidates = []
+    for (key, amount), entries in series.items():
+        if len(entries) < min_occurrences:
+            continue
+        cadence = _cadence([day for day, _, _ in entries])
+        if cadence is None or (key, amount, cadence) in scheduled:
+            continue
+        last_date, name, category = entries[-1]
+        # Monthly bills on the 29th-31st land earlier in short months; take the latest recent day.
+        anchor_day = max(day.day for day, _, _ in entries[-3:])
+        candidate = Candidate(name, amount, category, cadence, len(entries), last_date, anchor_day)
+        if not _stale(candidate, today):
+            candidates.append(candidate)
+    candidates.sort(key=lambda c: (c.next_date, c.name))
+    return candidates
+
+
+def schedule(user, candidate, today=None):
+    """Start `candidate` at its first occurrence on or after `today`; earlier ones are already in the history."""
+    today = today or datetime.date.today()
+    next_date = candidate.next_date
+    while next_date < today:
+        next_date = advance(next_date, candidate.cadence, candidate.anchor_day)
+    return RecurringExpense.objects.create(
+        user=user, name=candidate.name, amount=candidate.amount, category=candidate.category,
+        cadence=candidate.cadence, anchor_day=candidate.anchor_day, next_date=next_date,
+    )
+
+
+def materialize(today=None, batch_size=BATCH_SIZE):
+    """Create every occurrence due on or before `today` for all users. Returns the count."""
+    today = today or datetime.date.today()
+    created = 0
+    changed_users = set()
+    while True:
+        with transaction.atomic():
+            due = list(
+                RecurringExpense.objects.select_for_update(skip_locked=True)
+                .filter(active=True, next_date__lte=today)
+                .order_by('next_date', 'id')[:batch_size]
+            )
+            if not due:
+                break
+            expenses = []
+            for series in due:
+                for _ in range(MAX_CATCH_UP):
+                    if series.next_date > today:
+                        break
+                    expenses.append(Expense(user_id=series.user_id, name=series.name, amount=series.amount,
+                                            category=series.category, date=series.next_date))
+                    series.next_date = advance(series.next_date, series.cadence, series.anchor_day)
+                # Too far behind: skip the rest of the backlog rather than flooding the account.
+                while series.next_date <= today:
+                    series.next_date = advance(series.next_date, series.cadence, series.anchor_day)
+            Expense.objects.bulk_create(expenses, batch_size=2000)
+            rollups.record_expenses(expenses)
+            RecurringExpense.objects.bulk_update(due, ['next_date'])
+        created += len(expenses)
+        changed_users.update(series.user_id for series in due)
+
+    for user_id in changed_users:
+        expenses_changed(user_id)
+    return created
@@ -0,0 +1,150 @@
+"""
+Monthly statements and the admin-wide spending report (generate_reports).
+
+build() streams one user's expenses with .iterator() into totals per month
+and category, so memory stays flat however many rows the user has. Archived
+months come from their monthly summaries when the range covers them whole.
+The statement's anomaly alerts are detected on the live rows in its range:
+while they stream past, only their ids, amounts, days and category codes
+are kept, in compact arrays, and the names of the few large expenses are
+looked up afterwards. summarize() folds a run's statements into totals
+across all users. Amounts are summed as Decimal and stored as strings in
+the JSON fields.
+"""
+import dataclasses
+import datetime
+from array import array
+from collections import defaultdict
+from decimal import Decimal
+
+from django.db.models import Sum
+
+from . import archive, pagination
+from .models import Expense
+
+CHUNK_SIZE = 2000
+
+_EPOCH_ORDINAL = datetime.date(1970, 1, 1).toordinal()
+
+
+def _month():
+    return {'total': Decimal('0'), 'count': 0, 'categories': defaultdict(Decimal)}
+
+
+def _jsonable(months):
+    return {
+        key: {
+            'total': str(month['total']),
+            'count': month['count'],
+            'categories': {category: str(amount) for category, amount in sorted(month['categories'].items())},
+        }
+        for key, month in sorted(months.items())
+    }
+
+
+def _in_range(expenses, start, end):
+    if start:
+        expenses = expenses.filter(date__gte=start)
+    if end:
+        expenses = expenses.filter(date__lte=end)
+    return expenses
+
+
+def _dated(expenses, start, end):
+    return _in_range(expenses, start, end).order_by().values_list('date', 'category', 'amount').iterator(
+        chunk_size=CHUNK_SIZE)
+
+
+class _AlertRows:
+    """What anomaly detection needs of the streamed rows, newest/largest first."""
+
+    def __init__(self):
+        self.ids, self.amounts = array('q'), array('d')
+        self.days, self.codes = array('q'), array('q')
+        self.labels = {}
+
+    def add(self, pk, day, category, amount):
+        self.ids.append(pk)
+        self.amounts.append(float(amount))
+        self.days.append(day.toordinal() - _EPOCH_ORDINAL)
+        self.codes.append(self.labels.setdefault(category, len(self.labels)))
+
+    def alerts(self):
+        import numpy as np
+
+        from . import anomaly
+        from .columns import ExpenseColumns
+
+        labels = np.array(list(self.labels), dtype=object)
+        order = np.argsort(labels)
+        rank = np.empty(len(order), dtype=np.intp)
+        rank[order] = np.arange(len(order))
+        ids = np.frombuffer(self.ids, dtype=np.int64)
+        columns = ExpenseColumns(
+            ids=ids,
+            names=ids,  # ids stand in for names; the large expenses get theirs below
+            amounts=np.frombuffer(self.amounts, dtype=np.float64),
+            dates=np.frombuffer(self.days, dtype=np.int64).astype('datetime64[D]'),
+            category_codes=rank[np.frombuffer(self.codes, dtype=np.int64)],
+            categories=labels[order],
+        )
+        alerts = anomaly.detect(columns, limit=anomaly.MAX_ALERTS)
+        large = [int(alert.name) for alert in alerts if alert.kind == 'large']
+        names = dict(Expense.objects.filter(id__in=large).values_list('id', 'name'))
+        return [
+            dataclasses.replace(alert, name=names.get(int(alert.name), '')) if alert.kind == 'large' else alert
+            for alert in alerts
+        ]
+
+
+def build(user_id, start=None, end=None):
+    """Fields for a user's Report: total, expense_count, months and alerts."""
+    months = defaultdict(_month)
+
+    def add(day, category, amount, count=1):
+        month = months[day.strftime('%Y-%m')]
+        month['total'] += amount
+        month['count'] += count
+        month['categories'][category or 'Other'] += amount
+
+    alert_rows = _AlertRows()
+    live = (_in_range(Expense.objects.filter(user_id=user_id), start, end).order_by(*pagination.ORDERING)
+            .values_list('id', 'date', 'category', 'amount').iterator(chunk_size=CHUNK_SIZE))
+    for pk, day, category, amount in live:
+        add(day, category, amount)
+        alert_rows.add(pk, day, category, amount)
+    before = archive.cutoff(user_id)
+    if archive.needs_archive(before, start):
+        if archive.whole_months(before, start, end):
+            summaries = archive.monthly_totals(user_id, start, end).values_list('month', 'category', 'total', 'count')
+            for month, category, total, count in summaries:
+                add(month, category, total, count)
+        else:
+            for day, category, amount in _dated(archive.expenses(user_id), start, end):
+                add(day, category, amount)
+
+    alerts = alert_rows.alerts()
+    return {
+        'total': sum((month['total'] for month in months.values()), Decimal('0')),
+        'expense_count': sum(month['count'] for month in months.values()),
+        'months': _jsonable(months),
+        'alerts': [alert.as_dict() for alert in alerts],
+    }
+
+
+def summarize(run):
+    """Spend per month and category across every Report in the run."""
+    months = defaultdict(_month)
+    for statement in run.reports.values_list('months', flat=True).iterator(chunk_size=CHUNK_SIZE):
+        for key, month in statement.items():
+            merged = months[key]
+            merged['total'] += Decimal(month['total'])
+            merged['count'] += month['count']
+            for category, amount in month['categories'].items():
+                merged['categories'][category] += Decimal(amount)
+    totals = run.reports.aggregate(total=Sum('total'))
+    return {
+        'users': run.reports.count(),
+        'total': str((totals['total'] or Decimal('0')).quantize(Decimal('0.01'))),
+        'months': _jsonable(months),
+    }
@@ -0,0 +1,286 @@
+"""
+Per-user daily/category spend rollups.
+
+Every write path that creates, changes or removes an Expense pushes a delta
+here, so dashboard totals and chart series come from a handful of indexed
+DailyCategoryTotal rows instead of re-summing a user's whole history.
+"""
+import datetime
+from collections import defaultdict
+from decimal import Decimal
+
+from django.contrib.auth.models import User
+from django.db import IntegrityError, connection, transaction
+from django.db.models import Count, DecimalField, F, Max, Min, OuterRef, Subquery, Sum
+from django.db.models.functions import TruncMonth, TruncWeek
+
+from . import archive
+from .models import ArchiveCutoff, DailyCategoryTotal, Expense, MonthlyCategoryTotal
+
+
+def _key(expense):
+    return (expense.user_id, expense.date, expense.category or 'Other')
+
+
+BULK_THRESHOLD = 20
+
+
+def apply_deltas(deltas):
+    """
+    Apply {(user_id, date, category): (amount, count)} deltas to the rollup table.
+    Rows whose count drops to zero are removed.
+    """
+    deltas = {key: delta for key, delta in deltas.items() if delta[0] or delta[1]}
+    if len(deltas) > BULK_THRESHOLD:
+        try:
+            with transaction.atomic():
+                _apply_bulk(deltas)
+            return
+        except IntegrityError:
+            pass  # a concurrent writer created one of our rows; fall back to row-by-row
+    with transaction.atomic():
+        for (user_id, day, category), (amount, count) in deltas.items():
+            lookup = dict(user_id=user_id, date=day, category=category)
+            updated = DailyCategoryTotal.objects.filter(**lookup).update(
+                total=F('total') + amount, count=F('count') + count
+            )
+            if not updated and count > 0:
+                try:
+                    with transaction.atomic():
+                        DailyCategoryTotal.objects.create(total=amount, count=count, **lookup)
+                except IntegrityError:
+                    # Another worker created the row between our update and insert.
+                    DailyCategoryTotal.objects.filter(**lookup).update(
+                        total=F('total') + amount, count=F('count') + count
+                    )
+            elif count < 0:
+                DailyCategoryTotal.objects.filter(count__lte=0, **lookup).delete()
+
+
+def _apply_bulk(deltas):
+    """Large delta sets (imports, batch APIs) as set-based writes instead of per-key queries."""
+    if connection.vendor in ('sqlite', 'postgresql'):
+        _upsert(deltas)
+        return
+
+    by_user = defaultdict(dict)
+    for (user_id, day, category), delta in deltas.items():
+        by_user[user_id][(day, category)] = delta
+
+    for user_id, user_deltas in by_user.items():
+        days = [day for day, _ in user_deltas]
+        existing = {
+            (day, category): pk
+            for pk, day, category in DailyCategoryTotal.objects.select_for_update().filter(
+                user_id=user_id, date__range=(min(days), max(days))
+            ).values_list('id', 'date', 'category')
+        }
+        to_create = []
+        for (day, category), (amount, count) in user_deltas.items():
+            pk = existing.get((day, category))
+            if pk is None:
+                to_create.append(DailyCategoryTotal(
+                    user_id=user_id, date=day, category=category, total=amount, count=count
+                ))
+            else:
+                DailyCategoryTotal.objects.filter(pk=pk).update(
+                    total=F('total') + amount, count=F('count') + count
+                )
+        DailyCategoryTotal.objects.bulk_create(to_create, batch_size=1000)
+    _delete_empty(deltas)
+
+
+def _upsert(deltas):
+    """
+    Set-based writes for SQLite and PostgreSQL: keys that gain rows are
+    upserted with INSERT .. ON CONFLICT DO UPDATE, keys that only change or
+    lose rows (and so must already exist) are plain increments; each group is
+    a single executemany.
+    """
+    ops = connection.ops
+    table = ops.quote_name(DailyCategoryTotal._meta.db_table)
+    inserts, updates = [], []
+    for (user_id, day, category), (amount, count) in deltas.items():
+        amount = ops.adapt_decimalfield_value(Decimal(amount), 14, 2)
+        day = ops.adapt_datefield_value(day)
+        if count > 0:
+            inserts.append((user_id, day, category, amount, count))
+        else:
+            updates.append((amount, count, user_id, day, category))
+
+    with connection.cursor() as cursor:
+        if inserts:
+            cursor.executemany(
+                f'INSERT INTO {table} ("user_id", "date", "category", "total", "count") '
+                f'VALUES (%s, %s, %s, %s, %s) '
+                f'ON CONFLICT ("user_id", "date", "category") DO UPDATE SET '
+                f'"total" = {table}."total" + excluded."total", "count" = {table}."count" + excluded."count"',
+                inserts,
+            )
+        if updates:
+            cursor.executemany(
+                f'UPDATE {table} SET "total" = "total" + %s, "count" = "count" + %s '
+                f'WHERE "user_id" = %s AND "date" = %s AND "category" = %s',
+                updates,
+            )
+    _delete_empty(deltas)
+
+
+def _delete_empty(deltas):
+    removed = [key for key, (_, count) in deltas.items() if count < 0]
+    by_user = defaultdict(set)
+    for user_id, day, _ in removed:
+        by_user[user_id].add(day)
+    for user_id, days in by_user.items():
+        DailyCategoryTotal.objects.filter(user_id=user_id, date__in=days, count__lte=0).delete()
+
+
+def record_expenses(expenses):
+    """Add newly saved expenses (single or bulk_create'd) to the rollups."""
+    deltas = defaultdict(lambda: [Decimal('0'), 0])
+    for expense in expenses:
+        delta = deltas[_key(expense)]
+        delta[0] += Decimal(expense.amount)
+        delta[1] += 1
+    apply_deltas(deltas)
+
+
+def forget_expenses(expenses):
+    """Remove expenses that are about to be (or were) deleted from the rollups."""
+    deltas = defaultdict(lambda: [Decimal('0'), 0])
+    for expense in expenses:
+        delta = deltas[_key(expense)]
+        delta[0] -= Decimal(expense.amount)
+        delta[1] -= 1
+    apply_deltas(deltas)
+
+
+def record_expense(expense):
+    record_expenses([expense])
+
+
+def forget_expense(expense):
+    forget_expenses([expense])
+
+
+def snapshot(expense):
+    """Capture the rollup-relevant fields of an expense before it is edited."""
+    return Expense(user_id=expense.user_id, date=expense.date,
+                   category=expense.category, amount=expense.amount)
+
+
+def move_expenses(pairs):
+    """Re-file edited expenses given (before, after) pairs; `before` is a snapshot() taken prior to the edit."""
+    deltas = defaultdict(lambda: [Decimal('0'), 0])
+    for before, after in pairs:
+        old, new = deltas[_key(before)], deltas[_key(after)]
+        old[0] -= Decimal(before.amount)
+        old[1] -= 1
+        new[0] += Decimal(after.amount)
+        new[1] += 1
+    apply_deltas(deltas)
+
+
+def move_expense(before, after):
+    move_expenses([(before, after)])
+
+
+def rebuild(user_ids=None):
+    """Recompute the rollups from the Expense table, optionally for some users only."""
+    expenses = Expense.objects.all()
+    totals = DailyCategoryTotal.objects.all()
+    if user_ids is not None:
+        expenses = expenses.filter(user_id__in=user_ids)
+        totals = totals.filter(user_id__in=user_ids)
+
+    grouped = (
+        expenses.values('user_id', 'date', 'category')
+        .annotate(total=Sum('amount'), count=Count('id'))
+        .order_by()
+    )
+    with transaction.atomic():
+        totals.delete()
+        rows = DailyCategoryTotal.objects.bulk_create(
+            (DailyCategoryTotal(**row) for row in grouped.iterator()),
+            batch_size=1000,
+        )
+    return len(rows)
+
+
+def _user_sum(model):
+    return Subquery(
+        model.objects.filter(user_id=OuterRef('pk')).order_by().values('user_id')
+        .annotate(sum=Sum('total')).values('sum'),
+        output_field=DecimalField(max_digits=14, decimal_places=2),
+    )
+
+
+def spend(user):
+    """(all-time spend including archived months, archive cutoff or None), in one query."""
+    daily, monthly, before = User.objects.filter(pk=user.pk).annotate(
+        daily=_user_sum(DailyCategoryTotal),
+        monthly=_user_sum(MonthlyCategoryTotal),
+        before=Subquery(ArchiveCutoff.objects.filter(user_id=OuterRef('pk')).values('before')),
+    ).values_list('daily', 'monthly', 'before').get()
+    return (daily or Decimal('0')) + (monthly or Decimal('0')), before
+
+
+def total_spent(user):
+    return spend(user)[0]
+
+
+BUCKETS = ('day', 'week', 'month')
+MAX_POINTS = 180
+
+
+def pick_bucket(start, end):
+    """Smallest bucket that keeps a start..end chart under MAX_POINTS points."""
+    days = (end - start).days + 1
+    if days <= MAX_POINTS:
+        return 'day'
+    if days <= MAX_POINTS * 7:
+        return 'week'
+    return 'month'
+
+
+def bucketed_series(user, bucket=None, start=None, end=None):
+    """
+    (bucket, [(period_start, total)]) for the user's spend between start and
+    end (inclusive, either may be None), summed per day, week or month.
+    Archived spend is added when the range starts before the archive cutoff.
+    """
+    rows = DailyCategoryTotal.objects.filter(user=user)
+    if start:
+        rows = rows.filter(date__gte=start)
+    if end:
+        rows = rows.filter(date__lte=end)
+    before = archive.cutoff(user.id)
+    archived = archive.needs_archive(before, start)
+    if bucket is None:
+        if start is None or end is None:
+            bounds = rows.aggregate(first=Min('date'), last=Max('date'))
+            if archived and start is None:
+                first_month = archive.monthly_totals(user.id, end=end).aggregate(first=Min('month'))['first']
+                if first_month and (bounds['first'] is None or first_month < bounds['first']):
+                    bounds['first'] = first_month
+                    bounds['last'] = bounds['last'] or before - datetime.timedelta(days=1)
+            if bounds['first'] is None:
+                return 'day', []
+            start, end = start or bounds['first'], end or bounds['last']
+        bucket = pick_bucket(start, end)
+
+    period = {'day': F('date'), 'week': TruncWeek('date'), 'month': TruncMonth('date')}[bucket]
+    series = (
+        rows.annotate(period=period)
+        .values('period')
+        .annotate(amount=Sum('total'))
+        .order_by('period')
+        .values_list('period', 'amount')
+    )
+    if not archived:
+        return bucket, list(series)
+    totals = defaultdict(Decimal, series)
+    for period_start, amount in archive.series(user.id, bucket, start, end, before).items():
+        totals[period_start] += amount
+    return bucket, sorted(totals.items())
+
@@ -0,0 +1,125 @@
+"""
+Read/write routing between the primary database and an optional replica.
+
+Writes always go to 'default'. Reads of tracker tables go to the 'replica'
+alias (configured by TRACKER_DB_REPLICA) only inside reading_from_replica(),
+which the dashboard and report views enter through @replica_reads. Auth and
+session rows stay on the primary.
+
+A replica lags its primary, so after a write (hooks call pin_primary()) the
+pin records the user's data version on the primary, and their reads stay
+there until the replica has caught up to it (checked with one query per
+request while pinned). Cached fragments and ETags are therefore never built
+from data older than the user's own last change, however rarely the
+replica is refreshed. Pins expire after TRACKER_DB_REPLICA_PIN_SECONDS. The
+pin lives in the default cache, which every worker process must share (the
+file-based default does); a system check rejects a per-process cache while a
+replica is configured.
+"""
+from contextlib import contextmanager
+from contextvars import ContextVar
+from functools import wraps
+
+from asgiref.sync import iscoroutinefunction, sync_to_async
+from django.conf import settings
+from django.core import checks
+from django.core.cache import cache
+from django.db import DEFAULT_DB_ALIAS
+
+REPLICA = 'replica'
+
+PROCESS_LOCAL_CACHES = (
+    'django.core.cache.backends.locmem.LocMemCache',
+    'django.core.cache.backends.dummy.DummyCache',
+)
+
+_use_replica = ContextVar('tracker_use_replica', default=False)
+
+
+def replica_configured():
+    return REPLICA in settings.DATABASES
+
+
+@checks.register(checks.Tags.caches)
+def check_shared_cache(app_configs, **kwargs):
+    if replica_configured() and settings.CACHES['default']['BACKEND'] in PROCESS_LOCAL_CACHES:
+        return [checks.Error(
+            "TRACKER_DB_REPLICA needs a cache shared by all worker processes",
+            hint="Read-your-writes pins are kept in the default cache; use the file-based or another shared backend.",
+            id='tracker.E001',
+        )]
+    return []
+
+
+def _pin_key(user_id):
+    return f"tracker:primary-pin:{user_id}"
+
+
+def pin_primary(user_id):
+    """Called after a user's data changes."""
+    from . import sync
+
+    if replica_configured():
+        cache.set(_pin_key(user_id), sync.data_version(user_id), settings.TRACKER_DB_REPLICA_PIN_SECONDS)
+
+
+def pinned(user_id):
+    """Whether the replica is still behind the user's last write."""
+    from . import sync
+
+    pin = cache.get(_pin_key(user_id))
+    if pin is None:
+        return False
+    replica_version = sync.data_version(user_id, using=REPLICA)
+    return replica_version is None or replica_version < pin
+
+
+@contextmanager
+def reading_from_replica():
+    token = _use_replica.set(True)
+    try:
+        yield
+    finally:
+        _use_replica.reset(token)
+
+
+class ReplicaRouter:
+    def db_for_read(self, model, **hints):
+        if model._meta.app_label == 'tracker' and _use_replica.get() and replica_configured():
+            return REPLICA
+        return DEFAULT_DB_ALIAS
+
+    def db_for_write(self, model, **hints):
+        return DEFAULT_DB_ALIAS
+
+    def allow_relation(self, obj1, obj2, **hints):
+        return True  # both aliases hold the same data
+
+    def allow_migrate(self, db, app_label, **hints):
+        return db != REPLICA  # the replica gets its schema from the primary
+
+
+def replica_reads(view):
+    """Serve GET/HEAD requests from the replica unless the user wrote recently."""
+    def use_replica(request, user):
+        return (request.method in ('GET', 'HEAD') and replica_configured()
+                and not (user.is_authenticated and pinned(user.id)))
+
+    if iscoroutinefunction(view):
+        @wraps(view)
+        async def async_wrapper(request, *args, **kwargs):
+            if not await sync_to_async(use_replica)(request, await request.auser()):
+                return await view(request, *args, **kwargs)
+            with reading_from_replica():
+                return await view(request, *args, **kwargs)
+
+        return async_wrapper
+
+    @wraps(view)
+    def wrapper(request, *args, **kwargs):
+        if not use_replica(request, request.user):
+            return view(request, *args, **kwargs)
+        with reading_from_replica():
+            return view(request, *args, **kwargs)
+
+    return wrapper
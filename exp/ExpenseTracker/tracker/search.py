@@ -0,0 +1,94 @@
+"""
+Full-text search over expense names and categories.
+
+On SQLite the text is indexed by the tracker_expense_fts FTS5 table, which
+triggers keep in step with every insert, update and delete (bulk paths
+included). Each entry also holds its owner as a u<user_id> token that every
+MATCH requires, so a search only touches the caller's rows however common
+its words are among other users. On Postgres a GIN index covers
+to_tsvector(name || ' ' || category). The index comes from migrations 0011
+and 0015; any later migration that makes SQLite rebuild tracker_expense
+must recreate the triggers.
+
+Each word of the query matches as a prefix ("ub ri" finds "Uber ride").
+Filters and keyset paging (tracker.pagination) apply on top. On SQLite the
+matching ids are counted first (up to FEW_MATCHES): rare words are looked
+up by id and sorted, common ones are met while walking the user's date
+index, so either way a page costs milliseconds however many rows the user
+has.
+"""
+import re
+
+from django.db import connections
+from django.db.models import BooleanField, F, Func, IntegerField, Q
+from django.db.models.expressions import RawSQL
+
+from .models import Expense
+from .pagination import PAGE_SIZE, paginate
+
+MAX_TERMS = 8
+FEW_MATCHES = 2000
+
+FTS_MATCH = "SELECT rowid FROM tracker_expense_fts WHERE tracker_expense_fts MATCH %s"
+
+
+def terms(text):
+    """Lower-cased words of a query, at most MAX_TERMS of them."""
+    return re.findall(r'[^\W_]+', (text or '').lower())[:MAX_TERMS]
+
+
+def _match_sqlite(queryset, user_id, words):
+    text = ' AND '.join(f'"{word}"*' for word in words)
+    # The caller's owner token, then every word in the name or category.
+    expression = f'owner : u{int(user_id)} AND {{name category}} : ({text})'
+    with connections[queryset.db].cursor() as cursor:
+        cursor.execute(FTS_MATCH + " LIMIT %s", [expression, FEW_MATCHES + 1])
+        ids = [row[0] for row in cursor.fetchall()]
+    if len(ids) > FEW_MATCHES:
+        # Common words: walking the user's rows newest first meets a page of matches quickly.
+        return queryset.filter(user_id=user_id, id__in=RawSQL(FTS_MATCH, [expression]))
+    # Rare words: fetch the few matches by id. The unary + hides user_id from the
+    # planner, which would otherwise walk the user's whole history to find them.
+    return queryset.filter(id__in=ids).alias(
+        owner=Func(F('user_id'), template='+%(expressions)s', output_field=IntegerField()),
+    ).filter(owner=user_id)
+
+
+def _match_postgres(queryset, user_id, words):
+    tsquery = ' & '.join(f"{word}:*" for word in words)
+    return queryset.filter(user_id=user_id).alias(matched=RawSQL(
+        "to_tsvector('simple', tracker_expense.name || ' ' || tracker_expense.category) @@ to_tsquery('simple', %s)",
+        [tsquery], output_field=BooleanField(),
+    )).filter(matched=True)
+
+
+def _match_fallback(queryset, user_id, words):
+    queryset = queryset.filter(user_id=user_id)
+    for word in words:
+        queryset = queryset.filter(Q(name__icontains=word) | Q(category__icontains=word))
+    return queryset
+
+
+MATCHERS = {'sqlite': _match_sqlite, 'postgresql': _match_postgres}
+
+
+def search(user, query='', category=None, start=None, end=None, min_amount=None, max_amount=None,
+           cursor=None, size=PAGE_SIZE):
+    """One keyset page of the user's matching expenses: (rows, next_cursor)."""
+    queryset = Expense.objects.all()
+    if category:
+        queryset = queryset.filter(category=category)
+    if start:
+        queryset = queryset.filter(date__gte=start)
+    if end:
+        queryset = queryset.filter(date__lte=end)
+    if min_amount is not None:
+        queryset = queryset.filter(amount__gte=min_amount)
+    if max_amount is not None:
+        queryset = queryset.filter(amount__lte=max_amount)
+
+    words = terms(query)
+    if not words:
+        return paginate(queryset.filter(user=user), cursor, size)
+    match = MATCHERS.get(connections[queryset.db].vendor, _match_fallback)
+    return paginate(match(queryset, user.id, words), cursor, size)
@@ -0,0 +1,367 @@
+"""
+Per-user columnar snapshots of expenses for analytics.
+
+load() hands anomaly detection an ExpenseColumns whose arrays are .npy
+files memory-mapped from TRACKER_SNAPSHOT_DIR, rather than fetching and
+converting every row on each computation. Each user's directory holds
+immutable segments:
+
+* base-<ns>   every expense as of the base's watermark, newest/largest
+              first, one .npy file per column (written by compact()).
+              Names are UTF-8 bytes in one blob plus offsets into it
+              (PackedNames), not a fixed-width array as wide as the
+              longest name;
+* delta-<ns>  rows changed and ids deleted since that base (written by
+              append() after every expense write). Deltas are cumulative,
+              so only the newest one is read.
+
+Segments are built in a temporary directory and renamed into place, so
+readers never lock. load() also applies whatever changed after the newest
+segment's watermark, so a snapshot is never staler than the database. The
+(small) changes are laid over the mapped base as an OverlayColumns rather
+than merged into copies of it: a numeric column is only built when
+detection uses it, and names are looked up one at a time. Once a delta
+outgrows TRACKER_SNAPSHOT_COMPACT_ROWS the next append rewrites the base;
+the compact_snapshots command does the same for everyone.
+
+Without TRACKER_SNAPSHOT_DIR, load() reads the database like load_columns().
+"""
+import dataclasses
+import datetime
+import json
+import os
+import secrets
+import shutil
+import tempfile
+import time
+from functools import cached_property
+from pathlib import Path
+
+import numpy as np
+from django.conf import settings
+from django.db import DEFAULT_DB_ALIAS
+from django.utils import timezone
+
+from .columns import ExpenseColumns, load_columns, query_columns
+from .models import Expense, Tombstone
+
+FIELDS = ('ids', 'amounts', 'dates', 'category_codes', 'categories')  # plus the packed names
+
+STALE_TEMP_SECONDS = 600
+
+
+def enabled():
+    return bool(settings.TRACKER_SNAPSHOT_DIR)
+
+
+def _user_dir(user_id):
+    return Path(settings.TRACKER_SNAPSHOT_DIR) / str(user_id)
+
+
+def _storable(values):
+    # Object arrays cannot be memory-mapped; fixed-width unicode can.
+    return values.astype(str) if values.dtype == object else values
+
+
+class PackedNames:
+    """A names column kept as UTF-8 `blob` bytes cut at `offsets` (one more than there are names)."""
+
+    def __init__(self, blob, offsets):
+        self.blob = blob
+        self.offsets = offsets
+
+    @classmethod
+    def pack(cls, names):
+        encoded = [str(name).encode() for name in names]
+        offsets = np.zeros(len(encoded) + 1, dtype=np.int64)
+        np.cumsum([len(name) for name in encoded], out=offsets[1:])
+        return cls(np.frombuffer(b''.join(encoded), dtype=np.uint8), offsets)
+
+    def __len__(self):
+        return len(self.offsets) - 1
+
+    def __getitem__(self, i):
+        i = int(i) + (len(self) if i < 0 else 0)
+        return bytes(self.blob[self.offsets[i]:self.offsets[i + 1]]).decode()
+
+    def __iter__(self):
+        return (self[i] for i in range(len(self)))
+
+
+def _write_segment(user_dir, kind, columns, meta, deleted=None):
+    user_dir.mkdir(parents=True, exist_ok=True)
+    temp = Path(tempfile.mkdtemp(prefix='.tmp-', dir=user_dir))
+    for field in FIELDS:
+        np.save(temp / f'{field}.npy', _storable(getattr(columns, field)))
+    names = columns.names if isinstance(columns.names, PackedNames) else PackedNames.pack(columns.names)
+    np.save(temp / 'name_blob.npy', names.blob)
+    np.save(temp / 'name_offsets.npy', names.offsets)
+    if deleted is not None:
+        np.save(temp / 'deleted.npy', deleted)
+    (temp / 'meta.json').write_text(json.dumps(meta))
+    path = user_dir / f"{kind}-{time.time_ns():020d}-{secrets.token_hex(4)}"
+    os.rename(temp, path)
+    return path
+
+
+def _read_meta(path):
+    return json.loads((path / 'meta.json').read_text())
+
+
+def _read_columns(path):
+    names = PackedNames(np.load(path / 'name_blob.npy', mmap_mode='r'),
+                        np.load(path / 'name_offsets.npy', mmap_mode='r'))
+    return ExpenseColumns(names=names, **{field: np.load(path / f'{field}.npy', mmap_mode='r') for field in FIELDS})
+
+
+def _in_memory(columns):
+    """A (small) segment as plain arrays, for apply_changes()."""
+    return dataclasses.replace(columns, names=np.array(list(columns.names), dtype=object))
+
+
+def _segments(user_dir, kind):
+    return sorted(user_dir.glob(f'{kind}-*')) if user_dir.is_dir() else []
+
+
+def _newest_delta(user_dir, base):
+    deltas = []
+    for path in _segments(user_dir, 'delta'):
+        meta = _read_meta(path)
+        if meta['base'] == base.name:
+            deltas.append((meta['watermark'], path.name, path))
+    return max(deltas)[2] if deltas else None
+
+
+def _changes_since(user_id, watermark, using=None):
+    """Rows updated and expense ids deleted from `watermark` on, less the slack."""
+    since = datetime.datetime.fromisoformat(watermark) - datetime.timedelta(
+        seconds=settings.TRACKER_SNAPSHOT_SLACK_SECONDS)
+    manager = Expense.objects.db_manager(using) if using else Expense.objects
+    changed = query_columns(manager.filter(user_id=user_id, updated_at__gte=since))
+    tombstones = Tombstone.objects.db_manager(using) if using else Tombstone.objects
+    deleted = np.array(list(
+        tombstones.filter(user_id=user_id, kind='expense', deleted_at__gte=since)
+        .values_list('object_id', flat=True)
+    ), dtype=np.int64)
+    return changed, deleted
+
+
+def _positions(columns, rows):
+    """Where each of `rows` (itself sorted) goes in `columns`, both newest/largest first."""
+    # Search the reversed (ascending) views, which copies nothing of a mapped column.
+    days, row_days = columns.dates.view(np.int64)[::-1], rows.dates.view(np.int64)
+    firsts = len(columns) - np.searchsorted(days, row_days, 'right')
+    lasts = len(columns) - np.searchsorted(days, row_days, 'left')
+    return np.array([
+        last - np.searchsorted(columns.amounts[first:last][::-1], amount, 'right')
+        for first, last, amount in zip(firsts, lasts, rows.amounts)
+    ], dtype=np.intp)
+
+
+def _insert(values, positions, new_values):
+    return np.insert(values.astype(np.result_type(values, new_values), copy=False), positions, new_values)
+
+
+def apply_changes(columns, changed, deleted):
+    """`columns` with `changed` rows upserted and `deleted` ids removed, still newest/largest first."""
+    if not len(changed) and not len(deleted):
+        return columns
+    keep = ~np.isin(columns.ids, np.concatenate([changed.ids, deleted]))
+    fresh = ~np.isin(changed.ids, deleted)
+    # Merge the small label sets and remap codes rather than re-deriving labels row by row.
+    labels = np.union1d(_storable(columns.categories), _storable(changed.categories))
+    kept = ExpenseColumns(
+        ids=columns.ids[keep], names=columns.names[keep], amounts=columns.amounts[keep],
+        dates=columns.dates[keep], categories=labels,
+        category_codes=np.searchsorted(labels, _storable(columns.categories))[columns.category_codes[keep]],
+    )
+    # Both sides are already sorted, so inserting beats re-sorting the whole user.
+    positions = _positions(kept, ExpenseColumns(
+        ids=changed.ids[fresh], names=changed.names[fresh], amounts=changed.amounts[fresh],
+        dates=changed.dates[fresh], category_codes=changed.category_codes[fresh], categories=changed.categories,
+    ))
+    return ExpenseColumns(
+        ids=_insert(kept.ids, positions, changed.ids[fresh]),
+        names=_insert(kept.names, positions, _storable(changed.names)[fresh]),
+        amounts=_insert(kept.amounts, positions, changed.amounts[fresh]),
+        dates=_insert(kept.dates, positions, changed.dates[fresh]),
+        category_codes=_insert(
+            kept.category_codes, positions,
+            np.searchsorted(labels, _storable(changed.categories))[changed.category_codes[fresh]],
+        ),
+        categories=labels,
+    )
+
+
+class OverlayNames:
+    """The names of an OverlayColumns, each read from the added rows or the base as asked for."""
+
+    def __init__(self, columns):
+        self.columns = columns
+
+    def __len__(self):
+        return len(self.columns)
+
+    def __getitem__(self, i):
+        columns = self.columns
+        i = int(i) + (len(self) if i < 0 else 0)
+        before = int(np.searchsorted(columns.inserted, i, 'left'))  # added rows ahead of row i
+        if before < len(columns.inserted) and columns.inserted[before] == i:
+            return str(columns.added.names[before])
+        kept = i - before
+        return columns.base.names[kept + int(np.searchsorted(columns.removed_shifted, kept, 'right'))]
+
+    def __iter__(self):
+        return (self[i] for i in range(len(self)))
+
+
+class OverlayColumns:
+    """
+    ExpenseColumns-alike: `base` (memory-mapped) without the rows at the
+    sorted indices `removed`, and with the in-memory `added` rows inserted
+    in order. Nothing is copied from the base until a numeric column is
+    used, and names are read from it one at a time.
+    """
+
+    def __init__(self, base, removed, added):
+        self.base, self.removed, self.added = base, removed, added
+        self.categories = np.union1d(_storable(base.categories), _storable(added.categories))
+        # Where each added row lands among the kept base rows, then in the result.
+        at = _positions(base, added)
+        self.kept_positions = at - np.searchsorted(removed, at, 'left')
+        self.inserted = self.kept_positions + np.arange(len(added))
+        # Removed base rows shifted down by those before them, to map kept rows back to the base.
+        self.removed_shifted = removed - np.arange(len(removed))
+
+    def __len__(self):
+        return len(self.base) - len(self.removed) + len(self.added)
+
+    def _column(self, base_values, added_values):
+        return np.insert(np.delete(base_values, self.removed), self.kept_positions, added_values)
+
+    @cached_property
+    def ids(self):
+        return self._column(self.base.ids, self.added.ids)
+
+    @cached_property
+    def amounts(self):
+        return self._column(self.base.amounts, self.added.amounts)
+
+    @cached_property
+    def dates(self):
+        return self._column(self.base.dates, self.added.dates)
+
+    @cached_property
+    def category_codes(self):
+        remap = lambda columns: np.searchsorted(self.categories, _storable(columns.categories))
+        return self._column(remap(self.base)[self.base.category_codes], remap(self.added)[self.added.category_codes])
+
+    @cached_property
+    def names(self):
+        return OverlayNames(self)
+
+    @property
+    def category_labels(self):
+        return self.categories[self.category_codes]
+
+    def total(self):
+        return float(self.amounts.sum()) if len(self) else 0.0
+
+
+def overlay(columns, changed, deleted):
+    """`columns` with `changed` rows upserted and `deleted` ids removed, as an OverlayColumns when anything moved."""
+    removed = np.flatnonzero(np.isin(columns.ids, np.concatenate([changed.ids, deleted])))
+    fresh = ~np.isin(changed.ids, deleted)
+    if not len(removed) and not fresh.any():
+        return columns
+    added = ExpenseColumns(
+        ids=changed.ids[fresh], names=changed.names[fresh], amounts=changed.amounts[fresh],
+        dates=changed.dates[fresh], category_codes=changed.category_codes[fresh], categories=changed.categories,
+    )
+    return OverlayColumns(columns, removed, added)
+
+
+def _prune(user_dir, base, keep_delta=None):
+    """Remove segments superseded by `base`/`keep_delta` and abandoned temporary directories."""
+    keep_watermark = _read_meta(keep_delta)['watermark'] if keep_delta else None
+    for path in user_dir.iterdir():
+        if path.name.startswith('.tmp-'):
+            if time.time() - path.stat().st_mtime > STALE_TEMP_SECONDS:
+                shutil.rmtree(path, ignore_errors=True)
+        elif path.name.startswith('base-'):
+            if path.name < base.name:
+                shutil.rmtree(path, ignore_errors=True)
+        elif path.name.startswith('delta-') and path != keep_delta:
+            try:
+                meta = _read_meta(path)
+            except FileNotFoundError:
+                continue
+            if meta['base'] != base.name or (keep_watermark and meta['watermark'] <= keep_watermark):
+                shutil.rmtree(path, ignore_errors=True)
+
+
+def user_ids():
+    """Users that have a snapshot directory."""
+    root = Path(settings.TRACKER_SNAPSHOT_DIR)
+    return sorted(int(path.name) for path in root.iterdir() if path.name.isdigit()) if root.is_dir() else []
+
+
+def compact(user_id):
+    """Rewrite the user's base from the primary database and drop older segments."""
+    user_dir = _user_dir(user_id)
+    watermark = timezone.now().isoformat()
+    columns = query_columns(Expense.objects.db_manager(DEFAULT_DB_ALIAS).filter(user_id=user_id))
+    base = _write_segment(user_dir, 'base', columns, {'watermark': watermark, 'rows': len(columns)})
+    _prune(user_dir, base)
+    return columns
+
+
+def append(user_id):
+    """Record the user's changes since their base in a new delta; called after expense writes."""
+    if not enabled():
+        return
+    user_dir = _user_dir(user_id)
+    bases = _segments(user_dir, 'base')
+    if not bases:
+        return  # built on first load()
+    base = bases[-1]
+    watermark = timezone.now().isoformat()
+    changed, deleted = _changes_since(user_id, _read_meta(base)['watermark'], using=DEFAULT_DB_ALIAS)
+    if len(changed) + len(deleted) > settings.TRACKER_SNAPSHOT_COMPACT_ROWS:
+        compact(user_id)
+        return
+    delta = _write_segment(user_dir, 'delta', changed, {'base': base.name, 'watermark': watermark}, deleted)
+    _prune(user_dir, base, delta)
+
+
+def _load_segments(user_id):
+    """(base columns, changed rows, deleted ids, watermark) from disk, or None without a base."""
+    user_dir = _user_dir(user_id)
+    bases = _segments(user_dir, 'base')
+    if not bases:
+        return None
+    base = bases[-1]
+    delta = _newest_delta(user_dir, base)
+    if delta is None:
+        return _read_columns(base), ExpenseColumns.empty(), np.empty(0, dtype=np.int64), _read_meta(base)['watermark']
+    return _read_columns(base), _read_columns(delta), np.load(delta / 'deleted.npy'), _read_meta(delta)['watermark']
+
+
+def load(user_id):
+    """The user's expenses as ExpenseColumns (or an OverlayColumns of recent changes over them), newest/largest first."""
+    if not enabled():
+        return load_columns(user_id)
+    segments = None
+    for _ in range(3):
+        try:
+            segments = _load_segments(user_id)
+            break
+        except FileNotFoundError:  # a concurrent compaction pruned a segment mid-read
+            continue
+    if segments is None:
+        return compact(user_id)
+    columns, changed, deleted, watermark = segments
+    # Fold the database's latest changes into the (small) delta, then lay it over the base.
+    recent, recently_deleted = _changes_since(user_id, watermark)
+    changed = apply_changes(_in_memory(changed), recent, recently_deleted)
+    return overlay(columns, changed, np.union1d(deleted, recently_deleted))
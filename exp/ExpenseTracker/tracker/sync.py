@@ -0,0 +1,200 @@
+"""
+Incremental sync and conditional GET.
+
+Every Expense/Income/Budget row carries updated_at and expense deletions
+leave a Tombstone, which makes two things cheap:
+
+* changes(): rows modified since a client's cursor. The cursor holds a
+  keyset position (timestamp, id) per stream, so pages never skip or repeat
+  rows that share a timestamp. A transaction can commit after a client read
+  past the timestamps it wrote, so each sync starts TRACKER_SYNC_SLACK_SECONDS
+  before the cursor (only follow-up pages continue strictly from it).
+  Clients therefore see some changes twice and must apply them by id.
+* data_version(): the newest change of any kind for a user, including
+  archive runs, in one query.
+  conditional_on_data() turns it into an ETag and answers 304 before the
+  view (and its analytics) runs. There is no Last-Modified: a timestamp
+  alone cannot tell apart URLs, days or writes within one second.
+"""
+import base64
+import datetime
+import hashlib
+import json
+from functools import wraps
+
+from asgiref.sync import iscoroutinefunction, sync_to_async
+
+from django.conf import settings
+from django.contrib.auth.models import User
+from django.db.models import OuterRef, Q, Subquery
+from django.utils.cache import get_conditional_response
+
+from .models import ArchiveCutoff, Budget, Expense, Income, Tombstone
+
+PAGE_SIZE = 500
+
+# conditional_on_data() leaves the version it read on the request for tracker.fragments.
+VERSION_ATTR = 'tracker_data_version'
+
+
+def record_deletions(expenses):
+    """Leave tombstones for expenses that are being deleted."""
+    Tombstone.objects.bulk_create([
+        Tombstone(user_id=expense.user_id, kind='expense', object_id=expense.id) for expense in expenses
+    ])
+
+
+def encode_cursor(position):
+    return base64.urlsafe_b64encode(json.dumps(position).encode()).decode().rstrip('=')
+
+
+def decode_cursor(cursor):
+    """{'expense': [iso, id], 'tombstone': [iso, id], 'income': iso, 'paging': bool} (any may be missing), or None."""
+    try:
+        position = json.loads(base64.urlsafe_b64decode(cursor + '=' * (-len(cursor) % 4)))
+        for stream in ('expense', 'tombstone'):
+            if stream in position:
+                stamp, pk = position[stream]
+                datetime.datetime.fromisoformat(stamp)
+                int(pk)
+        if 'income' in position:
+            datetime.datetime.fromisoformat(position['income'])
+        if not isinstance(position.get('paging', False), bool):
+            return None
+        return position
+    except (TypeError, ValueError, AttributeError):
+        return None
+
+
+def _after(queryset, field, position, slack):
+    if not position:
+        return queryset
+    stamp, pk = datetime.datetime.fromisoformat(position[0]), int(position[1])
+    if slack:
+        return queryset.filter(**{f'{field}__gte': stamp - slack})
+    return queryset.filter(Q(**{f'{field}__gt': stamp}) | Q(**{field: stamp, 'id__gt': pk}))
+
+
+def changes(user, cursor=None, size=PAGE_SIZE):
+    """
+    Changes after `cursor` (everything if None) as a dict: 'expenses' (rows),
+    'deleted' (tombstones), 'income' (row or None if unchanged), 'cursor' for
+    the next call and 'more' if another page is waiting. Raises ValueError
+    for a malformed cursor.
+
+    Unless the cursor is mid-way through pages, the slack window before it is
+    read again, so rows the client already has may come back.
+    """
+    position = decode_cursor(cursor) if cursor else {}
+    if position is None:
+        raise ValueError("invalid cursor")
+    slack = None if position.get('paging') else datetime.timedelta(seconds=settings.TRACKER_SYNC_SLACK_SECONDS)
+
+    updated = list(
+        _after(Expense.objects.filter(user=user), 'updated_at', position.get('expense'), slack)
+        .order_by('updated_at', 'id')[:size + 1]
+    )
+    deleted = list(
+        _after(Tombstone.objects.filter(user=user), 'deleted_at', position.get('tombstone'), slack)
+        .order_by('deleted_at', 'id')[:size + 1]
+    )
+    more = len(updated) > size or len(deleted) > size
+    updated, deleted = updated[:size], deleted[:size]
+
+    income = Income.objects.filter(user=user).first()
+    if income is not None:
+        seen = position.get('income')
+        if seen is not None and income.updated_at <= datetime.datetime.fromisoformat(seen) - (slack or datetime.timedelta()):
+            income = None
+        else:
+            position['income'] = income.updated_at.isoformat()
+
+    if updated:
+        position['expense'] = [updated[-1].updated_at.isoformat(), updated[-1].id]
+    if deleted:
+        position['tombstone'] = [deleted[-1].deleted_at.isoformat(), deleted[-1].id]
+    position['paging'] = more
+    return {
+        'expenses': updated,
+        'deleted': deleted,
+        'income': income,
+        'cursor': encode_cursor(position),
+        'more': more,
+    }
+
+
+def _newest(model, field):
+    return Subquery(model.objects.filter(user_id=OuterRef('id')).order_by(f'-{field}').values(field)[:1])
+
+
+def data_version(user_id, using=None):
+    """Timestamp of the user's most recent write (None if there is nothing yet)."""
+    stamps = User.objects.using(using).filter(id=user_id).values_list(
+        _newest(Expense, 'updated_at'),
+        _newest(Tombstone, 'deleted_at'),
+        _newest(Income, 'updated_at'),
+        _newest(Budget, 'updated_at'),
+        _newest(ArchiveCutoff, 'updated_at'),
+    ).first() or ()
+    return max((stamp for stamp in stamps if stamp is not None), default=None)
+
+
+def _etag(request, user_id, version):
+    """The ETag for this user's data version and request."""
+    tag = hashlib.blake2b(
+        '|'.join([
+            str(user_id),
+            version.isoformat() if version else '-',
+            datetime.date.today().isoformat(),  # budgets and forecasts move with the date
+            request.get_full_path(),
+            request.META.get('CSRF_COOKIE', ''),  # pages embed a token for this secret
+        ]).encode(),
+        digest_size=12,
+    ).hexdigest()
+    return f'"{tag}"'
+
+
+def _tag(response, etag):
+    if response.status_code in (200, 304):
+        response.headers.setdefault('ETag', etag)
+        response.headers.setdefault('Cache-Control', 'private, no-cache')
+    return response
+
+
+def conditional_on_data(view):
+    """
+    ETag for GET views whose output depends only on the user's
+    data, the URL and the day. Unchanged requests get a 304 without running
+    the view. Works on sync and async views.
+    """
+    if iscoroutinefunction(view):
+        @wraps(view)
+        async def async_wrapper(request, *args, **kwargs):
+            user = await request.auser()
+            if request.method not in ('GET', 'HEAD') or not user.is_authenticated:
+                return await view(request, *args, **kwargs)
+
+            version = await sync_to_async(data_version)(user.id)
+            setattr(request, VERSION_ATTR, version)
+            etag = _etag(request, user.id, version)
+            response = get_conditional_response(request, etag=etag)
+            if response is None:
+                response = await view(request, *args, **kwargs)
+            return _tag(response, etag)
+
+        return async_wrapper
+
+    @wraps(view)
+    def wrapper(request, *args, **kwargs):
+        if request.method not in ('GET', 'HEAD') or not request.user.is_authenticated:
+            return view(request, *args, **kwargs)
+
+        version = data_version(request.user.id)
+        setattr(request, VERSION_ATTR, version)
+        etag = _etag(request, request.user.id, version)
+        response = get_conditional_response(request, etag=etag)
+        if response is None:
+            response = view(request, *args, **kwargs)
+        return _tag(response, etag)
+
+    return wrapper
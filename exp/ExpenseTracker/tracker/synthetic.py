@@ -0,0 +1,92 @@
+"""
+Synthetic expense data for benchmarks and load tests.
+
+A profile fixes the mix of categories, the typical amount of each (amounts
+are log-normal around it) and the share of outliers. 'bills' piles up utility
+and rent payments so weekly bill clusters fire; 'outliers' scatters very large
+expenses so the large-expense and category IQR detectors do.
+"""
+import datetime
+import random
+from decimal import Decimal
+
+from django.contrib.auth.models import User
+from django.db import transaction
+
+from . import rollups
+from .hooks import expenses_changed
+from .models import Expense
+
+NAMES = {
+    'Food': ['Swiggy order', 'Zomato dinner', 'Groceries', 'Cafe coffee', 'Lunch'],
+    'Transport': ['Uber ride', 'Metro card', 'Petrol', 'Ola cab', 'Parking'],
+    'Entertainment': ['Netflix', 'Movie tickets', 'Spotify', 'Concert'],
+    'Shopping': ['Amazon purchase', 'Flipkart order', 'Shoes', 'Clothes'],
+    'Bills': ['Electricity bill', 'Internet bill', 'Water bill', 'Rent', 'Phone recharge'],
+    'Health': ['Pharmacy', 'Doctor visit', 'Gym membership'],
+    'Other': ['Gift', 'Donation', 'Misc'],
+}
+
+# category: (weight, typical amount)
+PROFILES = {
+    'normal': {
+        'mix': {'Food': (40, 250), 'Transport': (20, 150), 'Entertainment': (10, 400),
+                'Shopping': (12, 1200), 'Bills': (8, 1500), 'Health': (5, 600), 'Other': (5, 300)},
+        'outlier_rate': 0.002,
+    },
+    'bills': {
+        'mix': {'Food': (25, 250), 'Transport': (10, 150), 'Entertainment': (5, 400),
+                'Shopping': (5, 1200), 'Bills': (45, 1800), 'Health': (5, 600), 'Other': (5, 300)},
+        'outlier_rate': 0.002,
+    },
+    'outliers': {
+        'mix': {'Food': (40, 250), 'Transport': (20, 150), 'Entertainment': (10, 400),
+                'Shopping': (12, 1200), 'Bills': (8, 1500), 'Health': (5, 600), 'Other': (5, 300)},
+        'outlier_rate': 0.05,
+    },
+}
+
+OUTLIER_FACTOR = (10, 40)  # outliers cost this many times the typical amount
+MAX_AMOUNT = 99_999_999
+
+
+def iter_expenses(user_id, count, profile='normal', days=365, end=None, seed=0):
+    """Yield `count` unsaved Expense rows spread over the `days` days up to `end`."""
+    spec = PROFILES[profile]
+    rng = random.Random(seed)
+    end = end or datetime.date.today()
+    categories = list(spec['mix'])
+    weights = [spec['mix'][category][0] for category in categories]
+    for _ in range(count):
+        category = rng.choices(categories, weights)[0]
+        typical = spec['mix'][category][1]
+        amount = rng.lognormvariate(0, 0.5) * typical
+        if rng.random() < spec['outlier_rate']:
+            amount *= rng.uniform(*OUTLIER_FACTOR)
+        yield Expense(
+            user_id=user_id,
+            name=rng.choice(NAMES[category]),
+            amount=Decimal(f"{min(max(amount, 1), MAX_AMOUNT):.2f}"),
+            category=category,
+            date=end - datetime.timedelta(days=rng.randrange(days)),
+        )
+
+
+def populate(user, count, profile='normal', days=365, end=None, seed=0, batch_size=5000):
+    """Insert synthetic expenses for `user` (keeping rollups in sync); returns the count."""
+    rows = iter_expenses(user.id, count, profile, days, end, seed)
+    created = 0
+    while created < count:
+        batch = [expense for _, expense in zip(range(batch_size), rows)]
+        with transaction.atomic():
+            Expense.objects.bulk_create(batch, batch_size=batch_size)
+            rollups.record_expenses(batch)
+        created += len(batch)
+    expenses_changed(user.id)
+    return created
+
+
+def create_user(username, count, profile='normal', **kwargs):
+    user = User.objects.create_user(username, password=None)
+    populate(user, count, profile, **kwargs)
+    return user
@@ -0,0 +1,45 @@
+"""
+{% usercache "name" [vary_on ...] %}...{% endusercache %}
+
+Like Django's {% cache %}, but the key is scoped to the logged-in user and
+their data version (see tracker.fragments), so no timeout or explicit
+invalidation is needed to keep it fresh. Anonymous requests render normally.
+"""
+from django import template
+
+from .. import fragments
+
+register = template.Library()
+
+
+class UserCacheNode(template.Node):
+    def __init__(self, nodelist, name, vary_on):
+        self.nodelist = nodelist
+        self.name = name
+        self.vary_on = vary_on
+
+    def render(self, context):
+        request = context.get('request')
+        user = getattr(request, 'user', None)
+        if user is None or not user.is_authenticated:
+            return self.nodelist.render(context)
+
+        # The version is read once per request, and a fragment the view already looked up is not read again.
+        fragment_key, html = fragments.lookup(
+            request, self.name.resolve(context), [var.resolve(context) for var in self.vary_on],
+        )
+        if html is None:
+            html = self.nodelist.render(context)
+            fragments.store(fragment_key, html)
+        return html
+
+
+@register.tag
+def usercache(parser, token):
+    bits = token.split_contents()
+    if len(bits) < 2:
+        raise template.TemplateSyntaxError(f"'{bits[0]}' tag requires a fragment name")
+    nodelist = parser.parse(('endusercache',))
+    parser.delete_first_token()
+    return UserCacheNode(nodelist, parser.compile_filter(bits[1]),
+                         [parser.compile_filter(bit) for bit in bits[2:]])
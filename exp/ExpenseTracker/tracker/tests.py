@@ -1,3 +1,1439 @@
-from django.test import TestCase
+import asyncio
+import contextlib
+import csv
+import datetime
+import json
+import logging
+import os
+import re
+import subprocess
+import sys
+import tempfile
+import time
+from io import BytesIO, StringIO
+from unittest import mock
+from decimal import Decimal
 
-# Create your tests here.
+import numpy as np
+
+from django.conf import settings
+from django.contrib.auth.models import User
+from django.core.cache import cache
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.core.management import call_command
+from django.core.management.base import CommandError
+from django.db import connection
+from django.db.models import Count, Sum
+from django.test import RequestFactory, SimpleTestCase, TestCase, TransactionTestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from django.utils.http import http_date
+
+from . import (anomaly, anomaly_cache, archive, budgets, categorizer, classifier, exporter, forecast, forecast_cache,
+               hooks, importer, pagination, recurring, reports, rollups, routers, search, snapshots, sync, synthetic)
+from .columns import ExpenseColumns, load_columns
+from .models import (Budget, DailyCategoryTotal, Expense, Income, MonthlyCategoryTotal, RecurringExpense, ReportRun,
+                     Tombstone)
+from .pagination import PAGE_SIZE
+
+logging.getLogger('tracker.perf').setLevel(logging.WARNING)  # one line per request is too chatty here
+
+
+def make_expenses(user, count, start=datetime.date(2025, 1, 1)):
+    expenses = Expense.objects.bulk_create([
+        Expense(
+            user=user,
+            name=f"Expense {i}",
+            amount=Decimal(100 + (i % 7) * 25),
+            date=start + datetime.timedelta(days=i % 60),
+            category=['Food', 'Bills', 'Transport'][i % 3],
+        )
+        for i in range(count)
+    ])
+    rollups.record_expenses(expenses)
+    return expenses
+
+
+class DashboardQueryCountTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.user = User.objects.create_user('alice', password='not-a-real-pw-123')
+        Income.objects.create(user=self.user, amount=Decimal('50000'))
+        self.client.force_login(self.user)
+
+    def test_query_count_does_not_grow_with_history(self):
+        # session + user, data version, expense page, rollup total, income, budgets
+        # (alerts come from the cache)
+        make_expenses(self.user, 10)
+        self.client.get(reverse('dashboard'))
+        make_expenses(self.user, 1)  # a new data version, so the fragments miss
+        with self.assertNumQueries(7):
+            small = self.client.get(reverse('dashboard'))
+
+        make_expenses(self.user, 500)
+        with self.assertNumQueries(7):
+            large = self.client.get(reverse('dashboard'))
+
+        self.assertIsNone(small.context['error'])
+        self.assertIsNone(large.context['error'])
+        self.assertEqual(len(large.context['expenses']), PAGE_SIZE)
+
+    def test_cached_fragments_skip_their_queries(self):
+        make_expenses(self.user, PAGE_SIZE + 10)
+        first = self.client.get(reverse('dashboard'))
+        # session + user, data version, budgets: no totals, income or expense page
+        with self.assertNumQueries(4):
+            cached = self.client.get(reverse('dashboard'))
+        self.assertIsNone(cached.context['error'])
+        self.assertContains(cached, 'Remaining Income')
+        self.assertContains(cached, first.context['expenses'][0].name)
+        self.assertContains(cached, 'Older &rarr;')
+
+    def test_totals_match_expenses(self):
+        expenses = make_expenses(self.user, 30)
+        response = self.client.get(reverse('dashboard'))
+        expected = float(sum(e.amount for e in expenses))
+        self.assertAlmostEqual(response.context['total_expense'], expected)
+        self.assertAlmostEqual(response.context['remaining_income'], 50000 - expected)
+
+
+class RollupTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.user = User.objects.create_user('ana', password='not-a-real-pw-123')
+        self.client.force_login(self.user)
+        self.expenses = make_expenses(self.user, 6)
+
+    def assert_rollups_match_expenses(self):
+        rollup = {(r.date, r.category): (r.total, r.count) for r in DailyCategoryTotal.objects.filter(user=self.user)}
+        expected = {
+            (row['date'], row['category']): (row['total'], row['count'])
+            for row in Expense.objects.filter(user=self.user).values('date', 'category')
+            .annotate(total=Sum('amount'), count=Count('id'))
+        }
+        self.assertEqual(rollup, expected)
+
+    def test_edits_and_deletes_move_the_rollups(self):
+        edited = self.expenses[0]
+        self.client.post(reverse('update_expense', args=[edited.id]),
+                         {'name': 'Edited', 'amount': '12.50', 'date': '2025-04-01', 'category': 'Travel'})
+        self.assertEqual(Expense.objects.get(id=edited.id).amount, Decimal('12.50'))
+        self.assertFalse(DailyCategoryTotal.objects.filter(user=self.user, date=edited.date).exists())
+        self.assert_rollups_match_expenses()
+
+        self.client.post(reverse('delete_expense', args=[self.expenses[1].id]))
+        self.assert_rollups_match_expenses()
+
+    def test_a_failed_rollup_update_rolls_back_the_write(self):
+        edited = self.expenses[0]
+        with mock.patch('tracker.rollups.move_expense', side_effect=RuntimeError('disk full')):
+            with self.assertRaises(RuntimeError):
+                self.client.post(reverse('update_expense', args=[edited.id]),
+                                 {'name': 'Edited', 'amount': '12.50', 'date': '2025-04-01'})
+        with mock.patch('tracker.rollups.forget_expense', side_effect=RuntimeError('disk full')):
+            with self.assertRaises(RuntimeError):
+                self.client.post(reverse('delete_expense', args=[self.expenses[1].id]))
+        self.assertEqual(Expense.objects.get(id=edited.id).amount, edited.amount)
+        self.assertTrue(Expense.objects.filter(id=self.expenses[1].id).exists())
+        self.assert_rollups_match_expenses()
+
+    def test_rebuild_rollups_repairs_drift(self):
+        DailyCategoryTotal.objects.filter(user=self.user).update(total=Decimal('0'))
+        Expense.objects.create(user=self.user, name='Unrecorded', amount=Decimal('9'),
+                               date=datetime.date(2025, 5, 1), category='Food')
+        out = StringIO()
+        call_command('rebuild_rollups', 'ana', stdout=out)
+        self.assertIn('Rebuilt', out.getvalue())
+        self.assert_rollups_match_expenses()
+        with self.assertRaises(CommandError):
+            call_command('rebuild_rollups', 'nobody', stdout=StringIO())
+
+
+class AnomalyEngineTests(TestCase):
+    def columns(self, rows):
+        rows = sorted(rows, key=lambda r: (r[4], r[3]), reverse=True)
+        return ExpenseColumns.from_rows(rows)
+
+    def test_detectors_return_structured_alerts_in_order(self):
+        monday = datetime.date(2025, 3, 3)
+        cols = self.columns([
+            (1, 'Laptop', 'Shopping', 60000.0, monday),
+            (2, 'Power', 'Bills', 900.0, monday),
+            (3, 'Water', 'Bills', 300.0, monday + datetime.timedelta(days=2)),
+            (4, 'Lunch', 'Food', 100.0, monday),
+            (5, 'Lunch', 'Food', 110.0, monday),
+            (6, 'Lunch', 'Food', 105.0, monday),
+            (7, 'Banquet', 'Food', 1500.0, monday),
+        ])
+        alerts = anomaly.detect(cols)
+        self.assertEqual([a.kind for a in alerts], ['large', 'bill_cluster', 'category'])
+        self.assertEqual(alerts[0].name, 'Laptop')
+        self.assertEqual((alerts[1].count, alerts[1].amount, alerts[1].week), (2, 1200.0, monday))
+        self.assertEqual((alerts[2].category, alerts[2].amount), ('Food', 1500.0))
+
+    def test_stops_at_limit(self):
+        cols = self.columns([
+            (i, f'Big {i}', 'Shopping', 10000.0 + i, datetime.date(2025, 1, 1)) for i in range(20)
+        ] + [(100 + i, 'Tea', 'Food', 20.0, datetime.date(2025, 1, 1)) for i in range(40)])
+        alerts = anomaly.detect(cols, limit=5)
+        self.assertEqual(len(alerts), 5)
+        self.assertTrue(all(a.kind == 'large' for a in alerts))
+
+
+class AnomalyCacheTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.user = User.objects.create_user('bob', password='not-a-real-pw-123')
+        self.client.force_login(self.user)
+
+    def test_dashboard_serves_cached_alerts_until_a_write(self):
+        make_expenses(self.user, 20)
+        self.client.get(reverse('dashboard'))
+        cached = anomaly_cache.get_alerts(self.user.id)
+        self.assertFalse(any(alert.kind == 'large' for alert in cached))
+
+        with mock.patch('tracker.views.apredict_category', return_value='Shopping'):
+            self.client.post(reverse('add_expense'), {'name': 'Laptop', 'amount': '90000', 'date': '2025-01-05'})
+        response = self.client.get(reverse('dashboard'))
+        self.assertIn('Laptop', response.context['anomaly_alerts'])
+
+    def test_alerts_computed_before_a_write_are_not_served_after_it(self):
+        make_expenses(self.user, 20)
+        version = anomaly_cache._version(self.user.id)
+        anomaly_cache.invalidate(self.user.id)
+        anomaly_cache.compute(self.user.id, version=version)  # a read that started before the write
+        with mock.patch('tracker.anomaly.detect', return_value=[]) as detect:
+            anomaly_cache.get_alerts(self.user.id)
+        detect.assert_called_once()
+
+
+@override_settings(TRACKER_SNAPSHOT_SLACK_SECONDS=0)
+class SnapshotTests(TestCase):
+    def setUp(self):
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        override = override_settings(TRACKER_SNAPSHOT_DIR=directory.name)
+        override.enable()
+        self.addCleanup(override.disable)
+        self.directory = directory.name
+        self.user = User.objects.create_user('noor', password='not-a-real-pw-123')
+        self.client.force_login(self.user)
+
+    def assert_matches_database(self, columns):
+        expected = load_columns(self.user)
+        rows = lambda cols: {int(i): (str(n), float(a), d, str(c)) for i, n, a, d, c in zip(
+            cols.ids, cols.names, cols.amounts, cols.dates, cols.category_labels)}
+        self.assertEqual(rows(columns), rows(expected))
+        order = list(zip(columns.dates, columns.amounts))
+        self.assertEqual(order, sorted(order, reverse=True))
+
+    def segments(self):
+        return sorted(name.split('-')[0] for name in os.listdir(os.path.join(self.directory, str(self.user.id)))
+                      if not name.startswith('.'))
+
+    def test_load_is_memory_mapped_and_follows_writes(self):
+        expenses = make_expenses(self.user, 30)
+        self.assert_matches_database(snapshots.load(self.user.id))  # builds the base
+        self.assertIsInstance(snapshots.load(self.user.id).amounts, np.memmap)
+
+        with mock.patch('tracker.views.apredict_category', return_value='Shopping'):
+            self.client.post(reverse('add_expense'), {'name': 'Laptop', 'amount': '90000', 'date': '2025-01-05'})
+        self.client.post(reverse('update_expense', args=[expenses[0].id]),
+                         {'name': 'Tea', 'amount': '25', 'date': '2025-03-30'})
+        self.client.get(reverse('delete_expense', args=[expenses[1].id]))
+        self.assertEqual(self.segments(), ['base', 'delta'])
+        columns = snapshots.load(self.user.id)
+        # The changes are laid over the still-mapped base rather than merged into copies of it.
+        self.assertIsInstance(columns, snapshots.OverlayColumns)
+        self.assertIsInstance(columns.base.amounts, np.memmap)
+        self.assertIsInstance(columns.base.names.blob, np.memmap)
+        self.assert_matches_database(columns)
+        self.assertIn('Laptop', columns.names)
+
+        alerts = anomaly_cache.compute(self.user.id)
+        self.assertTrue(any(alert.name == 'Laptop' for alert in alerts))
+
+    def test_catches_up_with_writes_that_skipped_the_hooks(self):
+        make_expenses(self.user, 10)
+        snapshots.compact(self.user.id)
+        Expense.objects.create(user=self.user, name='Cash', amount=Decimal('40'), date=datetime.date(2025, 2, 1),
+                               category='Other')
+        self.assert_matches_database(snapshots.load(self.user.id))
+
+    def test_overlay_keeps_rows_in_order_around_ties_and_deletes(self):
+        expenses = make_expenses(self.user, 60, start=datetime.date(2025, 1, 1))
+        snapshots.compact(self.user.id)
+        sync.record_deletions(expenses[::7])
+        Expense.objects.filter(id__in=[e.id for e in expenses[::7]]).delete()
+        for expense in expenses[4::11]:
+            expense.amount, expense.name = Decimal('125'), 'Édité'
+            expense.save()
+        for day in (1, 5, 30):
+            Expense.objects.create(user=self.user, name=f'Tie {day}', amount=Decimal('150'),
+                                   date=datetime.date(2025, 1, day), category='Gifts')
+        columns = snapshots.load(self.user.id)
+        self.assert_matches_database(columns)
+        self.assertEqual(columns.names[-1], str(load_columns(self.user).names[-1]))
+
+    @override_settings(TRACKER_SNAPSHOT_COMPACT_ROWS=5)
+    def test_large_deltas_are_compacted(self):
+        snapshots.compact(self.user.id)
+        make_expenses(self.user, 10)
+        hooks.expenses_changed(self.user.id)
+        self.assertEqual(self.segments(), ['base'])
+        self.assert_matches_database(snapshots.load(self.user.id))
+
+        make_expenses(self.user, 2)
+        hooks.expenses_changed(self.user.id)
+        self.assertEqual(self.segments(), ['base', 'delta'])
+        out = StringIO()
+        call_command('compact_snapshots', stdout=out)
+        self.assertIn('Compacted 1 snapshot(s), 12 rows', out.getvalue())
+        self.assertEqual(self.segments(), ['base'])
+
+
+class FragmentCacheTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.user = User.objects.create_user('bea', password='not-a-real-pw-123')
+        self.client.force_login(self.user)
+        make_expenses(self.user, 5)
+        Income.objects.create(user=self.user, amount=Decimal('0'))
+
+    def get_dashboard(self):
+        with self.assertLogs('tracker.perf', level='INFO') as logs:
+            response = self.client.get(reverse('dashboard'))
+        counts = json.loads(logs.records[-1].getMessage())['counts']
+        return response, (counts.get('fragment_hit', 0), counts.get('fragment_miss', 0))
+
+    def test_fragments_are_reused_until_a_write(self):
+        self.assertEqual(self.get_dashboard()[1], (0, 2))
+        self.assertEqual(self.get_dashboard()[1], (2, 0))
+
+        with mock.patch('tracker.views.apredict_category', return_value='Food'):
+            self.client.post(reverse('add_expense'), {'name': 'Sushi', 'amount': '40', 'date': '2030-01-01'})
+        response, counts = self.get_dashboard()
+        self.assertEqual(counts, (0, 2))
+        self.assertContains(response, 'Sushi')
+
+        self.client.post(reverse('set_income'), {'amount': '1234'})
+        response, counts = self.get_dashboard()
+        self.assertEqual(counts, (0, 2))
+        self.assertContains(response, '1234')
+
+        # A write that no hook in this process saw, as when another worker handled it.
+        Expense.objects.create(user=self.user, name='Ramen', amount=Decimal('15'), date=datetime.date(2030, 1, 2),
+                               category='Food')
+        response, counts = self.get_dashboard()
+        self.assertEqual(counts, (0, 2))
+        self.assertContains(response, 'Ramen')
+
+        other = User.objects.create_user('cal', password='not-a-real-pw-123')
+        self.client.force_login(other)
+        self.assertNotContains(self.get_dashboard()[0], 'Sushi')
+
+
+class CountingBackend:
+    calls = []
+
+    def predict_batch(self, names):
+        CountingBackend.calls.append(list(names))
+        return [categorizer.KeywordBackend().predict_one(name) for name in names]
+
+
+@override_settings(TRACKER_CATEGORY_BACKEND='tracker.tests.CountingBackend', TRACKER_CATEGORY_BATCH_SIZE=3)
+class CategorizerTests(TestCase):
+    def setUp(self):
+        categorizer.clear_cache()
+        classifier.reset()
+        CountingBackend.calls = []
+        self.addCleanup(classifier.reset)
+
+    def test_misses_are_batched_and_memoized(self):
+        names = ['Pizza', 'Uber ride', 'PIZZA ', 'Netflix', 'Doctor visit', 'Pizza']
+        self.assertEqual(
+            categorizer.predict_many(names),
+            ['Food', 'Transport', 'Food', 'Entertainment', 'Health', 'Food'],
+        )
+        self.assertEqual(CountingBackend.calls, [['pizza', 'uber ride', 'netflix'], ['doctor visit']])
+
+        self.assertEqual(categorizer.predict('pizza'), 'Food')
+        self.assertEqual(len(CountingBackend.calls), 2)
+
+    def test_lru_evicts_least_recently_used(self):
+        memo = categorizer.LRUCache(2)
+        memo.set('a', 'Food')
+        memo.set('b', 'Bills')
+        memo.get('a')
+        memo.set('c', 'Health')
+        self.assertEqual((memo.get('a'), memo.get('b'), memo.get('c')), ('Food', None, 'Health'))
+
+    def test_gemini_response_parsing(self):
+        parsed = categorizer.GeminiBackend().parse_response("1. Food\n2) transporting\n4. Bills", 3)
+        self.assertEqual(parsed, ['Food', 'Transport', 'Other'])
+
+
+class FakeGemini:
+    """Stands in for the Gemini REST API: answers with keyword rules, tracks concurrency."""
+
+    def __init__(self):
+        self.in_flight = self.peak = 0
+
+    async def __call__(self, request):
+        import asyncio
+        import httpx
+
+        prompt = json.loads(request.content)['contents'][0]['parts'][0]['text']
+        names = re.findall(r'^\s*\d+\. "(.*)"$', prompt, re.M)
+        if 'stuck' in names:
+            raise httpx.ReadTimeout("timed out", request=request)
+        self.in_flight += 1
+        self.peak = max(self.peak, self.in_flight)
+        await asyncio.sleep(0.01)
+        self.in_flight -= 1
+        keyword = categorizer.KeywordBackend()
+        text = '\n'.join(f"{i}. {keyword.predict_one(name)}" for i, name in enumerate(names, 1))
+        return httpx.Response(200, json={'candidates': [{'content': {'parts': [{'text': text}]}}]})
+
+
+@override_settings(TRACKER_CATEGORY_BATCH_SIZE=1, TRACKER_CATEGORY_MAX_CONCURRENCY=2)
+class AsyncCategorizerTests(SimpleTestCase):
+    def setUp(self):
+        import httpx
+
+        categorizer.clear_cache()
+        classifier.reset()
+        self.addCleanup(classifier.reset)
+        self.fake = FakeGemini()
+        self.backend = backend = categorizer.GeminiBackend(transport=httpx.MockTransport(self.fake))
+        self.addCleanup(backend.close)
+        patcher = mock.patch('tracker.categorizer.get_backend', return_value=backend)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    async def test_batches_run_concurrently_within_the_limit(self):
+        names = ['Pizza', 'Uber ride', 'Netflix', 'Doctor visit', 'pizza']
+        self.assertEqual(await categorizer.apredict_many(names),
+                         ['Food', 'Transport', 'Entertainment', 'Health', 'Food'])
+        self.assertEqual(self.fake.peak, 2)
+
+    async def test_failed_batches_fall_back_and_are_retried(self):
+        self.assertEqual(await categorizer.apredict_many(['stuck', 'Pizza']), ['Other', 'Food'])
+        self.assertIsNone(categorizer.cached_category('stuck'))
+        self.assertEqual(categorizer.cached_category('pizza'), 'Food')
+
+    def test_views_on_fresh_event_loops_share_one_client(self):
+        # As under WSGI, where every async view gets its own event loop.
+        self.assertEqual(asyncio.run(self.backend.apredict_batch(['Pizza'])), ['Food'])
+        client = self.backend._client
+        self.assertEqual(asyncio.run(self.backend.apredict_batch(['Uber ride'])), ['Transport'])
+        self.assertIs(self.backend._client, client)
+
+        self.backend.close()
+        self.assertTrue(client.is_closed)
+
+
+@override_settings(TRACKER_CATEGORY_BACKEND='tracker.categorizer.KeywordBackend', TRACKER_CATEGORY_ASYNC=True)
+class BackgroundCategorizationTests(TransactionTestCase):
+    def setUp(self):
+        cache.clear()
+        categorizer.clear_cache()
+        self.user = User.objects.create_user('carol', password='not-a-real-pw-123')
+        self.client.force_login(self.user)
+
+    def test_expense_saved_first_and_categorized_later(self):
+        self.client.post(reverse('add_expense'), {'name': 'Electricity bill', 'amount': '1200', 'date': '2025-02-01'})
+        categorizer.prediction_queue.join()
+
+        expense = Expense.objects.get(user=self.user)
+        self.assertEqual(expense.category, 'Bills')
+        totals = list(self.user.dailycategorytotal_set.values_list('category', 'count'))
+        self.assertEqual(totals, [('Bills', 1)])
+
+
+class LocalClassifierTests(TestCase):
+    def setUp(self):
+        categorizer.clear_cache()
+        classifier.reset()
+        CountingBackend.calls = []
+        self.addCleanup(classifier.reset)
+        self.user = User.objects.create_user('dave', password='not-a-real-pw-123')
+        examples = {
+            'Food': ['pizza', 'burger king', 'lunch at cafe', 'coffee', 'dinner', 'groceries'],
+            'Transport': ['uber ride', 'metro card', 'bus ticket', 'taxi to airport', 'petrol', 'ola cab'],
+            'Bills': ['electricity bill', 'water bill', 'internet bill', 'rent', 'phone bill', 'gas bill'],
+        }
+        Expense.objects.bulk_create([
+            Expense(user=self.user, name=name, amount=10, date=datetime.date(2025, 1, 1), category=category)
+            for category, names in examples.items() for name in names * 3
+        ])
+
+    def test_trained_model_answers_before_the_backend(self):
+        path = os.path.join(tempfile.mkdtemp(), 'model.joblib')
+        call_command('train_category_model', output=path, stdout=StringIO())
+
+        with self.settings(TRACKER_CATEGORY_MODEL_PATH=path, TRACKER_CATEGORY_MIN_CONFIDENCE=0.5,
+                           TRACKER_CATEGORY_BACKEND='tracker.tests.CountingBackend'):
+            self.assertEqual(categorizer.predict_many(['Electricity bill', 'Uber ride']), ['Bills', 'Transport'])
+            self.assertEqual(CountingBackend.calls, [])
+
+            classifier.reset()
+            with self.settings(TRACKER_CATEGORY_MIN_CONFIDENCE=1.0):
+                categorizer.predict('Netflix subscription')
+            self.assertEqual(CountingBackend.calls, [['netflix subscription']])
+
+
+@contextlib.contextmanager
+def capture_statements():
+    """Collect (sql, params) for every statement run, so they can be EXPLAINed afterwards."""
+    statements = []
+
+    def wrapper(execute, sql, params, many, context):
+        statements.append((sql, params[0] if many else params))
+        return execute(sql, params, many, context)
+
+    with connection.execute_wrapper(wrapper):
+        yield statements
+
+
+class QueryPlanTests(TestCase):
+    """Every statement a view runs against tracker tables must be an index search, never a table scan."""
+
+    def setUp(self):
+        if connection.vendor != 'sqlite':
+            self.skipTest("EXPLAIN QUERY PLAN checks are SQLite specific")
+        cache.clear()
+        self.user = User.objects.create_user('erin', password='not-a-real-pw-123')
+        other = User.objects.create_user('frank', password='not-a-real-pw-123')
+        make_expenses(self.user, 200)
+        make_expenses(other, 200)
+        Income.objects.create(user=self.user, amount=Decimal('90000'))
+        self.expense = Expense.objects.filter(user=self.user).first()
+        self.client.force_login(self.user)
+
+    def assert_indexed(self, statements):
+        checked = 0
+        with connection.cursor() as cursor:
+            for sql, params in statements:
+                if not re.match(r'\s*(SELECT|UPDATE|DELETE)', sql, re.I) or 'tracker_' not in sql:
+                    continue
+                cursor.execute('EXPLAIN QUERY PLAN ' + sql, params)
+                plan = [row[-1] for row in cursor.fetchall()]
+                # An FTS5 MATCH shows up as "SCAN <table> VIRTUAL TABLE INDEX"; that is an index lookup.
+                scans = [step for step in plan if re.match(r'SCAN tracker_', step) and 'VIRTUAL TABLE' not in step]
+                self.assertEqual(scans, [], f"Full scan in plan for:\n{sql}\n{plan}")
+                checked += 1
+        self.assertGreater(checked, 0)
+
+    def test_dashboard(self):
+        with capture_statements() as statements:
+            first = self.client.get(reverse('dashboard'))
+            self.client.get(reverse('dashboard'), {'after': first.context['next_cursor']})
+        self.assert_indexed(statements)
+
+    def test_chart_data(self):
+        with capture_statements() as statements:
+            for bucket in ('', 'day', 'week', 'month'):
+                self.client.get(reverse('chart_data'), {'bucket': bucket, 'start': '2025-01-10'})
+        self.assert_indexed(statements)
+
+    def test_search(self):
+        with capture_statements() as statements:
+            self.client.get(reverse('search'), {'q': 'expense 1', 'min_amount': '100'})
+        self.assert_indexed(statements)
+
+    def test_change_feed(self):
+        with capture_statements() as statements:
+            first = self.client.get(reverse('api_changes')).json()
+            self.client.get(reverse('delete_expense', args=[self.expense.id]))
+            self.client.get(reverse('api_changes'), {'since': first['cursor']})
+        self.assert_indexed(statements)
+
+    def test_add_expense(self):
+        with capture_statements() as statements, \
+                mock.patch('tracker.views.apredict_category', return_value='Food'):
+            self.client.post(reverse('add_expense'), {'name': 'Tea', 'amount': '20', 'date': '2025-01-03'})
+        self.assert_indexed(statements)
+
+    def test_update_expense(self):
+        with capture_statements() as statements:
+            self.client.post(reverse('update_expense', args=[self.expense.id]),
+                             {'name': 'Tea', 'amount': '25', 'date': '2025-01-04'})
+        self.assert_indexed(statements)
+
+    def test_delete_expense(self):
+        with capture_statements() as statements:
+            self.client.get(reverse('delete_expense', args=[self.expense.id]))
+        self.assert_indexed(statements)
+
+    def test_set_income(self):
+        with capture_statements() as statements:
+            self.client.post(reverse('set_income'), {'amount': '1000'})
+        self.assert_indexed(statements)
+
+    def test_background_categorization(self):
+        with capture_statements() as statements:
+            categorizer.apply_categories({self.expense.id: 'Health'})
+        self.assert_indexed(statements)
+
+    def test_export(self):
+        with capture_statements() as statements:
+            for fmt in ('csv', 'ndjson'):
+                response = self.client.get(reverse('export_expenses', args=[fmt]),
+                                           {'start': '2025-01-10', 'category': 'Food'})
+                b''.join(response.streaming_content)
+        self.assert_indexed(statements)
+
+    def test_forecast_data(self):
+        with capture_statements() as statements:
+            self.client.get(reverse('forecast_data'))
+        self.assert_indexed(statements)
+
+    def test_budgets(self):
+        with capture_statements() as statements:
+            self.client.post(reverse('budgets'), {'category': 'Food', 'period': 'month', 'limit': '500'})
+            self.client.post(reverse('budgets'), {'category': '', 'period': 'week', 'limit': '5000'})
+            self.client.get(reverse('budgets'))
+        self.assertEqual(Budget.objects.filter(user=self.user).count(), 2)
+        self.assert_indexed(statements)
+
+    def test_recurring(self):
+        with capture_statements() as statements:
+            self.client.get(reverse('recurring'))
+        self.assert_indexed(statements)
+
+    def test_api_expenses(self):
+        url = reverse('api_expenses')
+        with capture_statements() as statements, \
+                mock.patch.object(categorizer, 'apredict_many', return_value=['Food']):
+            first = self.client.get(url).json()
+            self.client.get(url, {'after': first['next']})
+            self.client.post(url, json.dumps({
+                'create': [{'name': 'Tea', 'amount': '20', 'date': '2025-01-03'}],
+                'update': [{'id': self.expense.id, 'amount': '999.00'}],
+                'delete': [first['expenses'][-1]['id']],
+            }), content_type='application/json')
+        self.assertTrue(Expense.objects.filter(user=self.user, name='Tea').exists())
+        self.assert_indexed(statements)
+
+    def test_import(self):
+        rows = "Date,Description,Amount,Category\n" + "".join(
+            f"2025-02-{1 + i:02d},Lunch {i},{100 + i}.00,Food\n" for i in range(20))
+        with capture_statements() as statements:
+            self.client.post(reverse('import_expenses'),
+                             {'file': SimpleUploadedFile('statement.csv', rows.encode())})
+        self.assertEqual(Expense.objects.filter(user=self.user, name__startswith='Lunch').count(), 20)
+        self.assert_indexed(statements)
+
+
+class PaginationAndChartTests(TestCase):
+    def setUp(self):
+        self.user = User.objects.create_user('gina', password='not-a-real-pw-123')
+        self.client.force_login(self.user)
+
+    def test_keyset_pages_cover_every_row_once(self):
+        expenses = make_expenses(self.user, 130)  # plenty of (date, amount) ties
+        seen, cursor = [], None
+        while True:
+            response = self.client.get(reverse('dashboard'), {'after': cursor} if cursor else {})
+            seen.extend(e.id for e in response.context['expenses'])
+            cursor = response.context['next_cursor']
+            if cursor is None:
+                break
+        expected = sorted(expenses, key=lambda e: (e.date, e.amount, e.id), reverse=True)
+        self.assertEqual(seen, [e.id for e in expected])
+
+    def test_chart_data_is_bucketed(self):
+        make_expenses(self.user, 120)  # 60 distinct days from 2025-01-01
+        daily = self.client.get(reverse('chart_data')).json()
+        self.assertEqual((daily['bucket'], len(daily['labels'])), ('day', 60))
+
+        monthly = self.client.get(reverse('chart_data'), {'bucket': 'month'}).json()
+        self.assertEqual(monthly['labels'], ['2025-01-01', '2025-02-01', '2025-03-01'])
+        self.assertAlmostEqual(sum(monthly['amounts']), sum(daily['amounts']))
+
+        weekly = self.client.get(reverse('chart_data'), {'bucket': 'week', 'end': '2025-01-12'}).json()
+        self.assertEqual(weekly['labels'], ['2024-12-30', '2025-01-06'])
+
+        self.assertEqual(self.client.get(reverse('chart_data'), {'bucket': 'year'}).status_code, 400)
+        self.assertEqual(self.client.get(reverse('chart_data'), {'start': 'soon'}).status_code, 400)
+
+
+OFX_SAMPLE = b"""OFXHEADER:100
+DATA:OFXSGML
+<OFX><BANKMSGSRSV1><STMTTRNRS><STMTRS><BANKTRANLIST>
+<STMTTRN><TRNTYPE>DEBIT<DTPOSTED>20250105120000<TRNAMT>-450.00<NAME>Electricity bill
+</STMTTRN>
+<STMTTRN><TRNTYPE>CREDIT<DTPOSTED>20250106<TRNAMT>30000.00<NAME>Salary
+</STMTTRN>
+<STMTTRN>
+<TRNTYPE>DEBIT</TRNTYPE><DTPOSTED>20250107</DTPOSTED><TRNAMT>-120.50</TRNAMT><MEMO>Uber ride</MEMO>
+</STMTTRN>
+</BANKTRANLIST></STMTRS></STMTTRNRS></BANKMSGSRSV1></OFX>
+"""
+
+
+class SearchTests(TestCase):
+    def setUp(self):
+        self.user = User.objects.create_user('sam', password='not-a-real-pw-123')
+        other = User.objects.create_user('tia', password='not-a-real-pw-123')
+        day = datetime.date(2025, 3, 1)
+        Expense.objects.bulk_create([
+            Expense(user=self.user, name='Uber ride', amount=Decimal('250'), date=day, category='Transport'),
+            Expense(user=self.user, name='Uber Eats', amount=Decimal('600'), date=day, category='Food'),
+            Expense(user=self.user, name='Netflix', amount=Decimal('500'), date=day, category='Entertainment'),
+            Expense(user=other, name='Uber ride', amount=Decimal('250'), date=day, category='Transport'),
+        ])
+        self.client.force_login(self.user)
+
+    def names(self, *args, **kwargs):
+        rows, _ = search.search(self.user, *args, **kwargs)
+        return sorted(expense.name for expense in rows)
+
+    def test_prefix_words_and_filters(self):
+        self.assertEqual(self.names('ub'), ['Uber Eats', 'Uber ride'])
+        self.assertEqual(self.names('ub ri'), ['Uber ride'])
+        self.assertEqual(self.names('food'), ['Uber Eats'])
+        self.assertEqual(self.names('ub', min_amount=Decimal('300')), ['Uber Eats'])
+        self.assertEqual(self.names('', category='Entertainment'), ['Netflix'])
+        self.assertEqual(self.names('ub', end=datetime.date(2025, 2, 1)), [])
+
+    def test_common_words_walk_the_user_index(self):
+        with mock.patch('tracker.search.FEW_MATCHES', 1):
+            self.assertEqual(self.names('ub'), ['Uber Eats', 'Uber ride'])
+            self.assertEqual(self.names('ub', min_amount=Decimal('300')), ['Uber Eats'])
+
+    def test_other_users_matches_do_not_count(self):
+        other = User.objects.get(username='tia')
+        Expense.objects.bulk_create([
+            Expense(user=other, name='Netflix', amount=Decimal('500'), date=datetime.date(2025, 3, 1),
+                    category='Entertainment') for _ in range(5)
+        ])
+        with mock.patch('tracker.search.FEW_MATCHES', 1), CaptureQueriesContext(connection) as captured:
+            self.assertEqual(self.names('netflix'), ['Netflix'])
+        # One probe, then a lookup by id: the other user's rows did not make the word "common".
+        self.assertEqual(sum('MATCH' in query['sql'] for query in captured.captured_queries), 1)
+        self.assertEqual(self.names(f'u{other.id}'), [])
+
+        Expense.objects.filter(user=other).update(user=self.user)
+        self.assertEqual(len(self.names('netflix')), 6)
+
+    def test_index_follows_bulk_writes(self):
+        Expense.objects.filter(user=self.user, name='Netflix').update(name='Disney plus')
+        self.assertEqual(self.names('netflix'), [])
+        self.assertEqual(self.names('disney'), ['Disney plus'])
+        Expense.objects.filter(user=self.user, name='Uber ride').delete()
+        self.assertEqual(self.names('uber'), ['Uber Eats'])
+
+    def test_view_pages_through_matches(self):
+        make_expenses(self.user, 120)
+        seen, url = [], reverse('search') + '?q=expense&max_amount=200'
+        while url:
+            response = self.client.get(url)
+            seen.extend(expense.id for expense in response.context['expenses'])
+            next_query = response.context['next_query']
+            url = next_query and reverse('search') + '?' + next_query
+        expected = Expense.objects.filter(user=self.user, name__startswith='Expense', amount__lte=200)
+        self.assertEqual(sorted(seen), sorted(expected.values_list('id', flat=True)))
+
+        response = self.client.get(reverse('search'), {'start': '2025-02-01', 'end': '2025-01-01'})
+        self.assertEqual(list(response.context['expenses']), [])
+        self.assertContains(response, 'Start date must not be after the end date')
+
+
+@override_settings(TRACKER_CATEGORY_BACKEND='tracker.tests.CountingBackend')
+class ImportTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        categorizer.clear_cache()
+        CountingBackend.calls = []
+        self.user = User.objects.create_user('hank', password='not-a-real-pw-123')
+        self.client.force_login(self.user)
+
+    def test_csv_upload_is_validated_batched_and_rolled_up(self):
+        rows = ["Date,Description,Amount,Category"]
+        rows += [f"2025-01-{1 + i % 28:02d},Pizza {i},{100 + i}.00," for i in range(25)]
+        rows += ["05/02/2025,Rent,12000,Bills", "not a date,Lunch,50,", "2025-02-06,,10,", "2025-02-07,Tea,abc,"]
+        upload = SimpleUploadedFile('statement.csv', "\n".join(rows).encode())
+
+        with self.settings(TRACKER_CATEGORY_BATCH_SIZE=100):
+            response = self.client.post(reverse('import_expenses'), {'file': upload})
+        result = response.context['result']
+        self.assertEqual((result.created, result.skipped), (26, 3))
+        self.assertEqual(len(result.errors), 3)
+        # 25 "Pizza N" names normalize to one key and go out in a single call
+        self.assertEqual(CountingBackend.calls, [['pizza']])
+
+        self.assertEqual(Expense.objects.get(name='Rent').date, datetime.date(2025, 2, 5))
+        self.assertEqual(Expense.objects.filter(user=self.user, category='Food').count(), 25)
+        self.assertEqual(rollups.total_spent(self.user), sum(Decimal(100 + i) for i in range(25)) + 12000)
+
+    def test_csv_credits_and_malformed_files_are_rejected(self):
+        rows = "Date,Description,Amount,Category\n2025-01-02,Groceries,40,Food\n2025-01-03,Refund,-40,Food\n"
+        result = importer.import_file(self.user, BytesIO(rows.encode()), categorize=False)
+        self.assertEqual((result.created, result.skipped), (1, 1))
+        self.assertIn('credit of 40.00', result.errors[0])
+
+        huge = 'Date,Description,Amount\n2025-01-04,"' + 'x' * (csv.field_size_limit() + 1) + '",5\n'
+        upload = SimpleUploadedFile('statement.csv', huge.encode())
+        response = self.client.post(reverse('import_expenses'), {'file': upload})
+        self.assertEqual(response.status_code, 200)
+        self.assertIn('field larger than field limit', str(response.context['form'].errors))
+
+    def test_committed_chunks_are_announced_when_a_later_chunk_fails(self):
+        rows = [(2, 'Tea', '5', '2025-01-02', 'Food'), (3, 'Cake', '7', '2025-01-03', 'Food')]
+        with mock.patch('tracker.rollups.record_expenses', side_effect=[None, RuntimeError('disk full')]), \
+                mock.patch('tracker.importer.expenses_changed') as changed:
+            with self.assertRaises(RuntimeError):
+                importer.import_rows(self.user, rows, batch_size=1, categorize=False)
+        changed.assert_called_once_with(self.user.id)
+        self.assertEqual(list(Expense.objects.filter(user=self.user).values_list('name', flat=True)), ['Tea'])
+
+    def test_ofx_command_imports_debits_only(self):
+        path = os.path.join(tempfile.mkdtemp(), 'statement.ofx')
+        with open(path, 'wb') as f:
+            f.write(OFX_SAMPLE)
+        call_command('import_expenses', 'hank', path, '--batch-size', '1', stdout=StringIO())
+
+        imported = list(Expense.objects.filter(user=self.user).order_by('date').values_list('name', 'amount', 'category'))
+        self.assertEqual(imported, [('Electricity bill', Decimal('450.00'), 'Bills'),
+                                    ('Uber ride', Decimal('120.50'), 'Transport')])
+
+
+class ExportTests(TestCase):
+    def setUp(self):
+        self.user = User.objects.create_user('ivy', password='not-a-real-pw-123')
+        self.client.force_login(self.user)
+        make_expenses(self.user, 12)
+        make_expenses(User.objects.create_user('jack'), 5)
+
+    def test_csv_and_ndjson_streams_are_filtered(self):
+        response = self.client.get(reverse('export_expenses', args=['csv']),
+                                   {'start': '2025-01-03', 'category': 'Food'})
+        self.assertTrue(response.streaming)
+        lines = b''.join(response.streaming_content).decode().splitlines()
+        self.assertEqual(lines[0], 'date,name,category,amount')
+        expected = Expense.objects.filter(user=self.user, category='Food', date__gte='2025-01-03')
+        self.assertEqual(len(lines) - 1, expected.count())
+
+        response = self.client.get(reverse('export_expenses', args=['ndjson']))
+        records = [json.loads(line) for line in b''.join(response.streaming_content).splitlines()]
+        self.assertEqual(len(records), 12)
+        self.assertEqual(set(records[0]), {'date', 'name', 'category', 'amount'})
+
+        self.assertEqual(self.client.get(reverse('export_expenses', args=['xml'])).status_code, 400)
+
+    def test_command_writes_one_file_per_user(self):
+        out_dir = tempfile.mkdtemp()
+        # One worker runs inline: other threads can't see this test's uncommitted rows.
+        call_command('export_expenses', out_dir, '--workers', '1', stdout=StringIO())
+        self.assertEqual(sorted(os.listdir(out_dir)), ['ivy.csv', 'jack.csv'])
+        with open(os.path.join(out_dir, 'jack.csv')) as f:
+            self.assertEqual(len(f.read().splitlines()), 6)
+
+
+class ReportTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.users = [User.objects.create_user(name, password='not-a-real-pw-123') for name in ('ana', 'ben')]
+        for user in self.users:
+            make_expenses(user, 90)
+
+    def generate(self, *args):
+        out, err = StringIO(), StringIO()
+        call_command('generate_reports', '--workers', '1', '--shard-size', '1', *args, stdout=out, stderr=err)
+        return out.getvalue() + err.getvalue()
+
+    def test_monthly_statements_and_summary(self):
+        self.generate()
+        run = ReportRun.objects.get()
+        self.assertIsNotNone(run.finished_at)
+        report = run.reports.get(user=self.users[0])
+        january = Expense.objects.filter(user=self.users[0], date__month=1)
+        self.assertEqual(Decimal(report.months['2025-01']['total']), january.aggregate(total=Sum('amount'))['total'])
+        self.assertEqual(report.months['2025-01']['count'], january.count())
+        food = january.filter(category='Food').aggregate(total=Sum('amount'))['total']
+        self.assertEqual(Decimal(report.months['2025-01']['categories']['Food']), food)
+        self.assertEqual(report.expense_count, 90)
+        self.assertEqual(Decimal(run.summary['total']), Expense.objects.aggregate(total=Sum('amount'))['total'])
+        self.assertEqual(run.summary['months']['2025-01']['count'], 2 * january.count())
+
+    def test_alerts_come_from_the_report_range(self):
+        user = self.users[0]
+        Expense.objects.create(user=user, name='Laptop', amount=Decimal('90000'), date=datetime.date(2025, 2, 10),
+                               category='Shopping')
+        with mock.patch('tracker.anomaly_cache.get_alerts') as cached, mock.patch('tracker.columns.load_columns') as load:
+            february = reports.build(user.id, datetime.date(2025, 2, 1), datetime.date(2025, 2, 28))
+            january = reports.build(user.id, datetime.date(2025, 1, 1), datetime.date(2025, 1, 31))
+        cached.assert_not_called()
+        load.assert_not_called()
+        self.assertIn('Laptop', [alert['name'] for alert in february['alerts']])
+        self.assertNotIn('Laptop', [alert['name'] for alert in january['alerts']])
+
+        expected = anomaly.detect(load_columns(user), limit=anomaly.MAX_ALERTS)
+        self.assertEqual(reports.build(user.id)['alerts'], [alert.as_dict() for alert in expected])
+
+    def test_resume_skips_finished_users(self):
+        build = reports.build
+        failing = lambda user_id, *args: build(user_id, *args) if user_id == self.users[0].id else 1 / 0
+        with mock.patch('tracker.reports.build', side_effect=failing):
+            with self.assertRaisesMessage(CommandError, '1 report(s) failed'):
+                self.generate()
+        run = ReportRun.objects.get()
+        self.assertIsNone(run.finished_at)
+        self.assertEqual(list(run.reports.values_list('user', flat=True)), [self.users[0].id])
+
+        with mock.patch('tracker.reports.build', side_effect=build) as built:
+            output = self.generate('--resume')
+        self.assertEqual([call.args[0] for call in built.call_args_list], [self.users[1].id])
+        self.assertIn('(1 already done)', output)
+        run.refresh_from_db()
+        self.assertEqual(run.summary['users'], 2)
+        self.assertEqual(ReportRun.objects.count(), 1)
+
+
+class ArchiveTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.user = User.objects.create_user('ida', password='not-a-real-pw-123')
+        self.expenses = make_expenses(self.user, 120)  # 2025-01-01 .. 2025-03-01
+        self.client.force_login(self.user)
+
+    def archive(self):
+        out = StringIO()
+        call_command('archive_expenses', '--before', '2025-02-15', stdout=out)
+        return out.getvalue()
+
+    def page_through(self, name, key):
+        seen, after = [], None
+        while True:
+            response = self.client.get(reverse(name), {'after': after} if after else {})
+            page, after = key(response)
+            seen.extend(page)
+            if not after:
+                return seen
+
+    def test_old_expenses_move_to_the_archive_with_monthly_summaries(self):
+        total = rollups.total_spent(self.user)
+        self.assertIn('Archived 62 expenses from 1 users dated before 2025-02-01', self.archive())
+        self.assertFalse(Expense.objects.filter(date__lt=datetime.date(2025, 2, 1)).exists())
+        self.assertFalse(DailyCategoryTotal.objects.filter(date__lt=datetime.date(2025, 2, 1)).exists())
+        self.assertEqual(archive.cutoff(self.user.id), datetime.date(2025, 2, 1))
+        january = [e for e in self.expenses if e.date.month == 1 and e.category == 'Food']
+        summary = MonthlyCategoryTotal.objects.get(user=self.user, month=datetime.date(2025, 1, 1), category='Food')
+        self.assertEqual((summary.total, summary.count), (sum(e.amount for e in january), len(january)))
+        self.assertEqual(rollups.total_spent(self.user), total)
+
+    def test_pages_continue_into_the_archive(self):
+        self.archive()
+        late = Expense.objects.create(user=self.user, name='Late receipt', amount=Decimal('10'),
+                                      date=datetime.date(2025, 1, 10), category='Other')
+        expected = [e.id for e in self.expenses] + [late.id]
+
+        rows = self.page_through('dashboard', lambda r: (r.context['expenses'], r.context['next_cursor']))
+        self.assertEqual(sorted(e.id for e in rows), sorted(expected))
+        keys = [(e.date, e.amount, e.id) for e in rows]
+        self.assertEqual(keys, sorted(keys, reverse=True))
+        api = self.page_through('api_expenses', lambda r: ([e['id'] for e in r.json()['expenses']], r.json()['next']))
+        self.assertEqual(api, [e.id for e in rows])
+
+        response = self.client.get(reverse('dashboard'), {'after': pagination.encode_cursor(rows[-5])})
+        self.assertContains(response, 'Archived')
+
+    def test_series_exports_and_reports_read_the_archive_only_when_needed(self):
+        before = {
+            'months': rollups.bucketed_series(self.user, 'month'),
+            'january_days': rollups.bucketed_series(self.user, 'day', datetime.date(2025, 1, 5),
+                                                    datetime.date(2025, 2, 10)),
+            'export': list(exporter.export_rows(self.user)),
+            'report': reports.build(self.user.id)['months'],
+        }
+        self.archive()
+        after = {
+            'months': rollups.bucketed_series(self.user, 'month'),
+            'january_days': rollups.bucketed_series(self.user, 'day', datetime.date(2025, 1, 5),
+                                                    datetime.date(2025, 2, 10)),
+            'export': list(exporter.export_rows(self.user)),
+            'report': reports.build(self.user.id)['months'],
+        }
+        self.assertEqual(after, before)
+
+        with CaptureQueriesContext(connection) as captured:
+            rollups.bucketed_series(self.user, 'day', datetime.date(2025, 2, 1))
+            list(exporter.export_rows(self.user, datetime.date(2025, 2, 1)))
+        self.assertFalse(any('archived' in q['sql'] or 'monthly' in q['sql'] for q in captured.captured_queries))
+
+
+class ImportTimeTests(SimpleTestCase):
+    """Workers import the URLconf at boot; analytics/LLM libraries must load on first use."""
+    HEAVY = ('numpy', 'pandas', 'scipy', 'sklearn', 'joblib', 'google.generativeai')
+    BUDGET_US = 500_000  # cumulative -X importtime for tracker.urls; ~50ms today, ~900ms with pandas/scipy
+
+    def test_url_import_is_light(self):
+        script = (
+            "import sys, django; django.setup(); import tracker.urls; "
+            f"print(','.join(m for m in {self.HEAVY!r} if m in sys.modules))"
+        )
+        env = dict(os.environ, DJANGO_SETTINGS_MODULE='ExpenseTracker.settings')
+        proc = subprocess.run(
+            [sys.executable, '-X', 'importtime', '-c', script],
+            cwd=settings.BASE_DIR, env=env, capture_output=True, text=True, check=True,
+        )
+        self.assertEqual(proc.stdout.strip(), '', "heavy modules imported at startup")
+        cumulative = int(re.search(r'\|\s*(\d+) \| tracker\.urls$', proc.stderr, re.M).group(1))
+        self.assertLess(cumulative, self.BUDGET_US)
+
+
+profiled = []
+
+
+def record_profile(request, stats, stacks):
+    profiled.append((request.path, stacks))
+
+
+class PerfMiddlewareTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.user = User.objects.create_user('kim', password='not-a-real-pw-123')
+        self.client.force_login(self.user)
+        make_expenses(self.user, 10)
+
+    def test_server_timing_and_log_line(self):
+        with self.assertLogs('tracker.perf', level='INFO') as logs:
+            response = self.client.get(reverse('dashboard'))
+        timing = response['Server-Timing']
+        for name in ('total;dur=', 'db;dur=', 'anomaly;dur=', 'cache;dur=', 'render;dur='):
+            self.assertIn(name, timing)
+
+        record = json.loads(logs.records[-1].getMessage())
+        self.assertEqual(record['path'], reverse('dashboard'))
+        self.assertGreater(record['queries'], 0)
+        self.assertEqual(record['counts'], {'anomaly_cache_miss': 1, 'fragment_miss': 2})
+        self.assertIn('chart', self.client.get(reverse('chart_data'))['Server-Timing'])
+
+    @override_settings(TRACKER_PERF_PROFILE_RATE=1.0, TRACKER_PERF_SLOW_MS=0,
+                       TRACKER_PERF_PROFILE_HOOK='tracker.tests.record_profile')
+    def test_slow_sampled_requests_reach_profile_hook(self):
+        profiled.clear()
+        with self.assertLogs('tracker.perf', level='WARNING'):
+            self.client.get(reverse('dashboard'))
+        self.assertEqual([path for path, _ in profiled], [reverse('dashboard')])
+
+    @override_settings(TRACKER_PERF=False)
+    def test_disabled(self):
+        self.assertNotIn('Server-Timing', self.client.get(reverse('dashboard')))
+
+
+class BenchmarkCommandTests(TestCase):
+    def test_profiles_shape_the_data(self):
+        bills = synthetic.create_user('bills', 400, 'bills', seed=1)
+        outliers = synthetic.create_user('outliers', 400, 'outliers', seed=1)
+        bill_share = Expense.objects.filter(user=bills, category='Bills').count() / 400
+        self.assertGreater(bill_share, 0.3)
+        self.assertEqual(rollups.total_spent(outliers),
+                         Expense.objects.filter(user=outliers).aggregate(total=Sum('amount'))['total'])
+        kinds = {alert.kind for alert in anomaly_cache.compute(outliers.id)}
+        self.assertIn('large', kinds)
+
+    def test_bench_views_writes_json_and_rolls_back(self):
+        out = os.path.join(tempfile.mkdtemp(), 'bench.json')
+        call_command('bench_views', '--sizes', '30,60', '--repeat', '1', '--out', out,
+                     stdout=StringIO(), stderr=StringIO())
+        with open(out) as f:
+            report = json.load(f)
+        self.assertEqual(set(report['results']), {'30', '60'})
+        self.assertEqual(set(report['results']['60']), {
+            'dashboard_cold', 'dashboard_warm', 'chart_data', 'load_columns', 'snapshot_load',
+            'anomaly_detect', 'anomaly_compute', 'add_expense',
+        })
+        self.assertIn('median_ms', report['results']['30']['dashboard_cold'])
+        self.assertFalse(Expense.objects.exists())
+
+    def test_bench_db_compares_journal_modes(self):
+        out = StringIO()
+        # The command's temporary SQLite aliases only exist while it runs, so they can't be declared up front.
+        bench_aliases = mock.patch.object(type(self), 'databases', self.databases | {'bench_primary', 'bench_replica'})
+        with bench_aliases:
+            call_command('bench_db', '--readers', '2', '--writers', '1', '--seconds', '0.3', '--rows', '200',
+                         stdout=out, stderr=StringIO())
+        results = json.loads(out.getvalue())['results']
+        self.assertEqual([results[mode]['journal_mode'] for mode in ('rollback-journal', 'wal', 'wal+replica')],
+                         ['delete', 'wal', 'wal'])
+        self.assertTrue(all(result['reads_per_s'] > 0 and result['writes_per_s'] > 0
+                            for result in results.values()))
+        self.assertFalse(Expense.objects.exists())
+
+
+class ReplicaRoutingTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.user = User.objects.create_user('rae', password='not-a-real-pw-123')
+        self.router = routers.ReplicaRouter()
+        configured = mock.patch('tracker.routers.replica_configured', return_value=True)
+        configured.start()
+        self.addCleanup(configured.stop)
+
+    def test_only_tracker_reads_inside_replica_views_use_the_replica(self):
+        self.assertEqual(self.router.db_for_read(Expense), 'default')
+        with routers.reading_from_replica():
+            self.assertEqual(self.router.db_for_read(Expense), 'replica')
+            self.assertEqual(self.router.db_for_read(User), 'default')
+            self.assertEqual(self.router.db_for_write(Expense), 'default')
+        self.assertFalse(self.router.allow_migrate('replica', 'tracker'))
+
+    def test_writes_pin_the_user_to_the_primary_until_the_replica_catches_up(self):
+        seen = []
+        view = routers.replica_reads(lambda request: seen.append(self.router.db_for_read(Expense)))
+        request = RequestFactory().get('/')
+        request.user = self.user
+        make_expenses(self.user, 3)
+        replica_version = sync.data_version(self.user.id)  # the replica's copy, as of its last refresh
+        data_version = sync.data_version
+
+        def read(user_id, using=None):
+            return replica_version if using == routers.REPLICA else data_version(user_id, using)
+
+        with mock.patch('tracker.sync.data_version', side_effect=read):
+            view(request)
+            make_expenses(self.user, 1, start=datetime.date(2025, 6, 1))
+            hooks.expenses_changed(self.user.id)
+            view(request)
+            view(request)  # still behind, however long the refresh takes
+            replica_version = data_version(self.user.id)  # sync_replica ran
+            view(request)
+        self.assertEqual(seen, ['replica', 'default', 'default', 'replica'])
+
+    def test_a_replica_requires_a_shared_cache(self):
+        self.assertEqual(routers.check_shared_cache(None), [])
+        local = {'default': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache'}}
+        with override_settings(CACHES=local):
+            self.assertEqual([error.id for error in routers.check_shared_cache(None)], ['tracker.E001'])
+
+
+class BudgetTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.user = User.objects.create_user('lee', password='not-a-real-pw-123')
+        self.client.force_login(self.user)
+
+    def add(self, day, amount, category='Food'):
+        expense = Expense.objects.create(user=self.user, name='x', amount=Decimal(amount),
+                                         date=day, category=category)
+        rollups.record_expense(expense)
+
+    def test_burn_rate_projection(self):
+        today = datetime.date(2025, 6, 10)
+        for offset in range(14):  # 100/day of Food for two weeks, reaching into May
+            self.add(today - datetime.timedelta(days=offset), '100')
+        self.add(today, '50', 'Bills')
+        Budget.objects.create(user=self.user, category='Food', period='month', limit=Decimal('1600'))
+        Budget.objects.create(user=self.user, category='Bills', period='week', limit=Decimal('40'))
+        Budget.objects.create(user=self.user, period='month', limit=Decimal('100000'))
+
+        with self.assertNumQueries(3):
+            bills, food, total = budgets.status(self.user, today)  # most urgent first
+        self.assertEqual(food.spent, Decimal('1000'))  # June 1-10 only
+        self.assertEqual(food.burn_rate, Decimal('100'))
+        self.assertEqual(food.days_to_exceed, 6)
+        self.assertEqual(food.message, "Food will exceed its monthly budget in 6 days")
+        self.assertEqual(bills.message, "Bills is ₹10.00 over its weekly budget")
+        self.assertFalse(total.at_risk)
+        self.assertEqual(total.spent, Decimal('1050'))
+
+    def test_budget_page_and_dashboard(self):
+        self.add(datetime.date.today(), '900')
+        response = self.client.post(reverse('budgets'), {'category': 'Food', 'period': 'week', 'limit': '500'})
+        self.assertRedirects(response, reverse('budgets'))
+        self.client.post(reverse('budgets'), {'category': 'Food', 'period': 'week', 'limit': '800'})
+        self.assertEqual(Budget.objects.get(user=self.user).limit, Decimal('800'))
+
+        response = self.client.get(reverse('dashboard'))
+        self.assertContains(response, "Food is ₹100.00 over its weekly budget")
+
+        budget = Budget.objects.get(user=self.user)
+        self.client.post(reverse('delete_budget', args=[budget.id]))
+        self.assertFalse(Budget.objects.exists())
+
+
+class RecurringTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.user = User.objects.create_user('max', password='not-a-real-pw-123')
+        self.client.force_login(self.user)
+
+    def add(self, name, amount, day, category='Other'):
+        expense = Expense.objects.create(user=self.user, name=name, amount=Decimal(amount),
+                                         date=day, category=category)
+        rollups.record_expense(expense)
+
+    def test_detects_weekly_and_monthly_series(self):
+        for i in range(5):
+            self.add('Gym class', '300', datetime.date(2025, 1, 6) + datetime.timedelta(weeks=i), 'Health')
+        for month, day in [(1, 31), (2, 28), (3, 31), (4, 30)]:
+            self.add('Rent', '15000', datetime.date(2025, month, day), 'Bills')
+        for day in (1, 3, 20, 21):  # same name and amount, irregular
+            self.add('Coffee', '120', datetime.date(2025, 1, day))
+
+        today = datetime.date(2025, 2, 12)
+        found = {c.name: c for c in recurring.detect(self.user, today=today)}
+        self.assertEqual(set(found), {'Gym class', 'Rent'})
+        self.assertEqual(found['Gym class'].cadence, 'week')
+        self.assertEqual(found['Gym class'].next_date, datetime.date(2025, 2, 10))
+        self.assertEqual(found['Rent'].cadence, 'month')
+        self.assertEqual(found['Rent'].next_date, datetime.date(2025, 5, 31))
+
+        recurring.schedule(self.user, found['Rent'], today=today)
+        self.assertEqual([c.name for c in recurring.detect(self.user, today=today)], ['Gym class'])
+        # A week later the gym series has gone unpaid for more than a cadence: it was stopped.
+        self.assertEqual(recurring.detect(self.user, today=datetime.date(2025, 2, 19)), [])
+
+    def test_scheduling_a_stale_series_adds_no_back_dated_rows(self):
+        for i in range(3):
+            self.add('Netflix', '649', datetime.date(2025, 1 + i, 5), 'Entertainment')
+        candidate, = recurring.detect(self.user, today=datetime.date(2025, 4, 10))
+        self.assertEqual(candidate.next_date, datetime.date(2025, 4, 5))
+
+        today = datetime.date(2025, 6, 10)
+        self.assertEqual(recurring.detect(self.user, today=today), [])
+        series = recurring.schedule(self.user, candidate, today=today)
+        self.assertEqual(series.next_date, datetime.date(2025, 7, 5))
+        self.assertEqual(recurring.materialize(today), 0)
+        self.assertEqual(Expense.objects.filter(user=self.user).count(), 3)
+
+    def test_materialize_catches_up_once(self):
+        RecurringExpense.objects.create(user=self.user, name='Rent', amount=Decimal('15000'), category='Bills',
+                                        cadence='month', anchor_day=31, next_date=datetime.date(2025, 1, 31))
+        RecurringExpense.objects.create(user=self.user, name='Gym', amount=Decimal('300'), category='Health',
+                                        cadence='week', anchor_day=1, next_date=datetime.date(2025, 4, 1),
+                                        active=False)
+
+        out = StringIO()
+        call_command('materialize_recurring', '--date', '2025-04-15', stdout=out)
+        self.assertIn('Added 3', out.getvalue())
+        self.assertEqual(
+            list(Expense.objects.filter(user=self.user).order_by('date').values_list('date', flat=True)),
+            [datetime.date(2025, 1, 31), datetime.date(2025, 2, 28), datetime.date(2025, 3, 31)],
+        )
+        self.assertEqual(rollups.total_spent(self.user), Decimal('45000'))
+        self.assertEqual(RecurringExpense.objects.get(name='Rent').next_date, datetime.date(2025, 4, 30))
+        self.assertEqual(recurring.materialize(datetime.date(2025, 4, 15)), 0)
+
+    def test_page_schedules_and_stops(self):
+        today = datetime.date.today()
+        for weeks_ago in (3, 2, 1):
+            self.add('Netflix', '649', today - datetime.timedelta(weeks=weeks_ago), 'Entertainment')
+        response = self.client.get(reverse('recurring'))
+        self.assertContains(response, 'Add automatically')
+
+        self.client.post(reverse('recurring'), {'schedule': 'Netflix|649.00|week'})
+        series = RecurringExpense.objects.get(user=self.user)
+        self.assertEqual((series.next_date, series.category), (today, 'Entertainment'))
+
+        self.client.post(reverse('recurring'), {'stop': series.id})
+        self.assertFalse(RecurringExpense.objects.get(id=series.id).active)
+
+
+class ForecastTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.user = User.objects.create_user('nia', password='not-a-real-pw-123')
+        self.client.force_login(self.user)
+
+    def test_models_pick_the_better_fit_per_category(self):
+        today = datetime.date(2025, 6, 15)
+        first = today - datetime.timedelta(days=forecast.HISTORY_DAYS - 1)
+        expenses = []
+        for offset in range(forecast.HISTORY_DAYS):
+            day = first + datetime.timedelta(days=offset)
+            expenses.append(Expense(user=self.user, name='Lunch', amount=Decimal('100'), date=day, category='Food'))
+            if day.weekday() == 5:  # Saturdays only
+                expenses.append(Expense(user=self.user, name='Movie', amount=Decimal('700'), date=day,
+                                        category='Entertainment'))
+        Expense.objects.bulk_create(expenses)
+        rollups.record_expenses(expenses)
+
+        result = forecast.forecast(self.user, today)
+        rows = {row['category']: row for row in result['categories']}
+        self.assertEqual(result['month'], '2025-07')
+        self.assertAlmostEqual(rows['Food']['amount'], 3100, places=0)
+        self.assertEqual(rows['Entertainment']['method'], 'seasonal')
+        self.assertAlmostEqual(rows['Entertainment']['amount'], 700 * 4)  # four Saturdays in July 2025
+
+    def test_endpoint_is_cached_until_expenses_change(self):
+        make_expenses(self.user, 30, start=datetime.date.today() - datetime.timedelta(days=40))
+        with self.assertNumQueries(4):  # session, user, data version, rollups
+            first = self.client.get(reverse('forecast_data')).json()
+        with self.assertNumQueries(3):
+            self.assertEqual(self.client.get(reverse('forecast_data')).json(), first)
+
+        with mock.patch('tracker.views.apredict_category', return_value='Food'):
+            self.client.post(reverse('add_expense'), {
+                'name': 'Big dinner', 'amount': '5000', 'date': datetime.date.today().isoformat(),
+            })
+        with mock.patch.object(forecast, 'forecast', wraps=forecast.forecast) as computed:
+            forecast_cache.get_forecast(self.user.id)
+        computed.assert_called_once()
+
+    def test_a_forecast_computed_across_a_write_is_not_served_after_it(self):
+        make_expenses(self.user, 30, start=datetime.date.today() - datetime.timedelta(days=40))
+
+        def write_midway(user_id, today):
+            forecast_cache.invalidate(user_id)  # another request's write commits during the compute
+            return {'stale': True}
+
+        with mock.patch.object(forecast, 'forecast', side_effect=write_midway):
+            self.assertEqual(forecast_cache.get_forecast(self.user.id), {'stale': True})
+        with mock.patch.object(forecast, 'forecast', return_value={'fresh': True}) as computed:
+            self.assertEqual(forecast_cache.get_forecast(self.user.id), {'fresh': True})
+        computed.assert_called_once()
+
+
+class ExpenseApiTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.user = User.objects.create_user('omar', password='not-a-real-pw-123')
+        self.client.force_login(self.user)
+        self.url = reverse('api_expenses')
+
+    def post(self, payload):
+        return self.client.post(self.url, json.dumps(payload), content_type='application/json')
+
+    def test_batch_create_update_delete(self):
+        keep, edit, drop = make_expenses(self.user, 3)
+        other = make_expenses(User.objects.create_user('pam'), 1)[0]
+        with mock.patch.object(categorizer, 'apredict_many', return_value=['Transport']) as predict:
+            response = self.post({
+                'create': [{'name': 'Uber ride', 'amount': '250.50', 'date': '2025-02-01'},
+                           {'name': 'Rent', 'amount': 15000, 'date': '2025-02-01', 'category': 'Bills'}],
+                'update': [{'id': edit.id, 'amount': '999.00', 'category': 'Health'}],
+                'delete': [drop.id],
+            })
+        self.assertEqual(response.status_code, 200)
+        result = response.json()
+        self.assertEqual((len(result['created']), result['updated'], result['deleted']), (2, 1, 1))
+        predict.assert_called_once_with(['Uber ride'])
+
+        edit.refresh_from_db()
+        self.assertEqual((edit.amount, edit.category), (Decimal('999.00'), 'Health'))
+        self.assertFalse(Expense.objects.filter(id=drop.id).exists())
+        self.assertEqual(Expense.objects.get(id=result['created'][0]).category, 'Transport')
+        self.assertEqual(rollups.total_spent(self.user),
+                         Expense.objects.filter(user=self.user).aggregate(total=Sum('amount'))['total'])
+        self.assertTrue(Expense.objects.filter(id=other.id).exists())
+
+        page = self.client.get(self.url).json()
+        self.assertEqual(len(page['expenses']), 4)
+        self.assertIsNone(page['next'])
+
+    def test_invalid_batch_writes_nothing(self):
+        expense = make_expenses(self.user, 1)[0]
+        other = make_expenses(User.objects.create_user('quinn'), 1)[0]
+        response = self.post({
+            'create': [{'name': 'Ok', 'amount': '10', 'date': '2025-02-01', 'category': 'Food'},
+                       {'name': 'Bad', 'amount': 'ten', 'date': '2025-02-01', 'category': 'Food'}],
+            'delete': [expense.id, other.id],
+        })
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual([(e['op'], e['index']) for e in response.json()['errors']],
+                         [('create', 1), ('delete', 1)])
+        self.assertEqual(Expense.objects.count(), 2)
+
+        self.assertEqual(self.post({'update': [{'name': 'x'}]}).status_code, 400)
+        self.assertEqual(self.client.post(self.url, 'nope', content_type='application/json').status_code, 400)
+        self.client.logout()
+        self.assertEqual(self.client.get(self.url).status_code, 401)
+
+
+class SyncTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.user = User.objects.create_user('rosa', password='not-a-real-pw-123')
+        self.client.force_login(self.user)
+
+    @override_settings(TRACKER_SYNC_SLACK_SECONDS=0)
+    def test_change_feed_pages_and_tombstones(self):
+        expenses = make_expenses(self.user, 5)
+        Income.objects.create(user=self.user, amount=Decimal('1000'))
+        url = reverse('api_changes')
+
+        first = self.client.get(url).json()
+        self.assertEqual(len(first['expenses']), 5)
+        self.assertEqual(first['income']['amount'], '1000.00')
+
+        feed = sync.changes(self.user, size=2)
+        self.assertTrue(feed['more'])
+        seen = [e.id for e in feed['expenses']]
+        while feed['more']:
+            feed = sync.changes(self.user, feed['cursor'], size=2)
+            seen += [e.id for e in feed['expenses']]
+        self.assertEqual(sorted(seen), sorted(e.id for e in expenses))
+
+        response = self.client.get(url, {'since': first['cursor']}).json()
+        self.assertEqual((response['expenses'], response['deleted'], response['income']), ([], [], None))
+
+        with mock.patch('tracker.views.apredict_category', return_value='Food'):
+            self.client.post(reverse('update_expense', args=[expenses[0].id]),
+                             {'name': 'Edited', 'amount': '10', 'date': '2025-01-01'})
+        self.client.get(reverse('delete_expense', args=[expenses[1].id]))
+        self.client.post(reverse('api_expenses'), json.dumps({'delete': [expenses[2].id]}),
+                         content_type='application/json')
+
+        response = self.client.get(url, {'since': first['cursor']}).json()
+        self.assertEqual([e['name'] for e in response['expenses']], ['Edited'])
+        self.assertEqual(sorted(d['id'] for d in response['deleted']), sorted([expenses[1].id, expenses[2].id]))
+        self.assertEqual(self.client.get(url, {'since': 'garbage'}).status_code, 400)
+
+    def test_each_sync_rereads_the_slack_window(self):
+        expenses = make_expenses(self.user, 3)
+        feed = sync.changes(self.user, size=2)
+        while feed['more']:
+            feed = sync.changes(self.user, feed['cursor'], size=2)
+
+        # Committed after that sync, but stamped before the rows it returned.
+        late = Expense.objects.create(user=self.user, name='Late', amount=Decimal('5'),
+                                      date=datetime.date(2025, 1, 2), category='Food')
+        Expense.objects.filter(id=late.id).update(updated_at=expenses[0].updated_at - datetime.timedelta(seconds=1))
+        feed = sync.changes(self.user, feed['cursor'], size=2)
+        seen = [e.id for e in feed['expenses']]
+        while feed['more']:
+            feed = sync.changes(self.user, feed['cursor'], size=2)
+            seen += [e.id for e in feed['expenses']]
+        self.assertEqual(sorted(set(seen)), sorted([late.id] + [e.id for e in expenses]))
+
+    def test_archiving_changes_the_etag(self):
+        make_expenses(self.user, 5)
+        Expense.objects.create(user=self.user, name='Recent', amount=Decimal('5'), date=datetime.date(2025, 3, 5),
+                               category='Food')  # the newest change stays live
+        url = reverse('api_expenses')
+        etag = self.client.get(url)['ETag']
+        call_command('archive_expenses', '--before', '2025-03-01', stdout=StringIO())
+        self.assertEqual(self.client.get(url, HTTP_IF_NONE_MATCH=etag).status_code, 200)
+
+    def test_conditional_get(self):
+        make_expenses(self.user, 5)
+        Income.objects.create(user=self.user, amount=Decimal('1000'))
+        url = reverse('dashboard')
+        response = self.client.get(url)
+        etag = response['ETag']
+        # Only the ETag covers the URL, the day and same-second writes; a bare date would not.
+        self.assertNotIn('Last-Modified', response)
+        self.assertEqual(self.client.get(url, HTTP_IF_MODIFIED_SINCE=http_date(time.time() + 60)).status_code, 200)
+
+        with mock.patch.object(anomaly_cache, 'get_alerts') as get_alerts:
+            with self.assertNumQueries(3):  # session, user, data version
+                cached = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+            get_alerts.assert_not_called()
+        self.assertEqual(cached.status_code, 304)
+
+        budget = Budget.objects.create(user=self.user, category='Food', limit=Decimal('100'))
+        changed = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(changed.status_code, 200)
+
+        etag = changed['ETag']
+        self.client.post(reverse('delete_budget', args=[budget.id]))
+        self.assertEqual(self.client.get(url, HTTP_IF_NONE_MATCH=etag).status_code, 200)
+        self.assertTrue(Tombstone.objects.filter(kind='budget', object_id=budget.id).exists())
+
+        api = reverse('api_expenses')
+        etag = self.client.get(api)['ETag']
+        self.assertEqual(self.client.get(api, HTTP_IF_NONE_MATCH=etag).status_code, 304)
@@ -1,5 +1,5 @@
 from django.urls import path
-from . import views 
+from . import api, views
 from .views import update_expense
 
 urlpatterns = [
@@ -9,6 +9,16 @@ urlpatterns = [
     path('login/', views.user_login, name='login'),
     path('logout/', views.user_logout, name='logout'),
     path('add/', views.add_expense, name='add_expense'),
+    path('import/', views.import_expenses, name='import_expenses'),
+    path('export/<str:fmt>/', views.export_expenses, name='export_expenses'),
     path('delete/<int:id>/', views.delete_expense, name='delete_expense'),
     path('set-income/', views.set_income, name='set_income'),
+    path('budgets/', views.budget_list, name='budgets'),
+    path('budgets/<int:budget_id>/delete/', views.delete_budget, name='delete_budget'),
+    path('recurring/', views.recurring_list, name='recurring'),
+    path('search/', views.search_expenses, name='search'),
+    path('api/chart/', views.chart_data, name='chart_data'),
+    path('api/expenses/', api.expenses, name='api_expenses'),
+    path('api/changes/', api.changes, name='api_changes'),
+    path('api/forecast/', views.forecast_data, name='forecast_data'),
 ]
@@ -2,65 +2,22 @@ from django.shortcuts import render
 from django.shortcuts import render, redirect
 from django.contrib.auth import login, authenticate, logout
 from django.contrib.auth.forms import AuthenticationForm
-from .models import Expense
-from .forms import ExpenseForm, RegisterForm
+from .models import Budget, Expense, RecurringExpense, Tombstone
+from .forms import BudgetForm, ExpenseForm, ImportForm, RegisterForm, SearchForm
+from . import anomaly_cache, archive, budgets, categorizer, exporter, forecast_cache, fragments, importer, perf, recurring, rollups, search, sync
+from .categorizer import apredict as apredict_category
+from .hooks import budgets_changed, expenses_changed, income_changed
+from .routers import replica_reads
 from django.contrib.auth.decorators import login_required
+from django.db import transaction
 from django.db.models import Sum
 from decimal import Decimal 
-from scipy.stats import zscore
-import numpy as np
-import pandas as pd
+import csv
 import json
-import joblib
-import os
+from asgiref.sync import sync_to_async
 from django.conf import settings
-import re
-import google.generativeai as genai
-from django.conf import settings
-
-def gemini_predict_category(expense_name):
-    """
-    Predicts expense category using Gemini API.
-    Ensures flexible parsing and more accurate matching.
-    """
-    try:
-        print("DEBUG: GEMINI_API_KEY =", os.getenv("GEMINI_API_KEY"))
-        genai.configure(api_key=settings.GEMINI_API_KEY)
-        
-
-        model = genai.GenerativeModel("gemini-2.5-flash")
-
-        prompt = f"""
-        Categorize the following expense into one of these categories ONLY:
-        [Food, Transport, Entertainment, Shopping, Bills, Health, Other]
-
-        Expense: "{expense_name}"
-
-        Output just ONE word — the category name exactly as listed above.
-        """
-
-        response = model.generate_content(prompt)
-        text = response.text.strip()
-
-        # ✅ Normalize and clean output
-        text = re.sub(r'[^a-zA-Z]', '', text).capitalize()
-
-        valid_categories = [
-            "Food", "Transport", "Entertainment", "Shopping", "Bills", "Health", "Other"
-        ]
-
-        # ✅ Fuzzy correction: handle small differences (e.g., "Foods", "Transporting")
-        for category in valid_categories:
-            if category.lower() in text.lower():
-                return category
-
-        print(f"[⚠️ Gemini Output Unrecognized] Got: {text}")
-        return "Other"
-
-    except Exception as e:
-        print("Gemini Error:", e)
-        return "Other"
-
+from django.http import HttpResponseBadRequest, JsonResponse, StreamingHttpResponse
+from django.utils.dateparse import parse_date
 
 
 def register(request):
@@ -92,139 +49,276 @@ from .forms import IncomeForm
 
 
 @login_required
+@replica_reads
+@sync.conditional_on_data
 def dashboard(request):
     try:
         # Initialize context with safe defaults
         context = {
             "expenses": [],
+            "next_cursor": None,
             "total_expense": 0,
-            "dates": json.dumps([]),
-            "amounts": json.dumps([]),
             "remaining_income": 0,
             "warning": False,
             "income_form": None,
-            "anomaly_alerts": [],
+            "anomaly_alerts": json.dumps([]),
+            "budgets": [],
             "error": None
         }
 
-        # 1. Get and process expenses
-        expenses = Expense.objects.filter(user=request.user).order_by('-date', '-amount')
-        context["expenses"] = expenses
-        
-        # Calculate totals (handling Decimal properly)
-        total_expense = float(expenses.aggregate(Sum('amount'))['amount__sum']) or 0.0
-        context["total_expense"] = total_expense
+        # The summary and table fragments are keyed by the data version; only
+        # run the queries behind the ones that are not cached
+        cursor = request.GET.get('after')
+        context["cursor"] = cursor
+        context["is_first_page"] = not cursor
+        _, summary_html = fragments.lookup(request, 'summary')
+        _, table_html = fragments.lookup(request, 'expense_table', [cursor])
+        updating_income = request.method == 'POST' and 'update_income' in request.POST
+
+        # Totals from the maintained daily/category rollups (plus archived months)
+        if summary_html is None or table_html is None:
+            spent, archived_before = rollups.spend(request.user)
+            total_expense = float(spent)
+            context["total_expense"] = total_expense
+
+        # 1. One keyset page of expenses for the table, continuing into the archive
+        # past its cutoff; the chart loads from chart_data
+        if table_html is None:
+            context["expenses"], context["next_cursor"] = archive.paginate(
+                request.user, cursor, before=archived_before
+            )
         
         # 2. Handle income
-        income_obj, created = Income.objects.get_or_create(user=request.user, defaults={'amount': Decimal('0')})
-        income = float(income_obj.amount) if income_obj.amount else 0.0
-        context["remaining_income"] = income - total_expense
-        context["warning"] = context["remaining_income"] < 500
-
-        # Income form handling
-        if request.method == 'POST' and 'update_income' in request.POST:
-            income_form = IncomeForm(request.POST, instance=income_obj)
-            if income_form.is_valid():
-                income_form.save()
-                return redirect('dashboard')
-        else:
-            income_form = IncomeForm(instance=income_obj)
-        context["income_form"] = income_form
-        context["income_obj"] = income_obj 
-
-        # 3. Enhanced Anomaly Detection System
-        if expenses.exists():
-            try:
-                # Prepare dataframe with proper decimal conversion
-                df = pd.DataFrame(list(expenses.values('id', 'name', 'category', 'amount', 'date')))
-                df['amount'] = df['amount'].apply(lambda x: float(x))  # Convert all to float
-                df['date'] = pd.to_datetime(df['date'], errors='coerce')
-                df = df.dropna()
-                
-                if not df.empty:
-                    alerts = []
-                    median_amount = float(df['amount'].median())
-                    
-                    # Detection 1: Absolute large expenses (2.5x median or ₹2000+)
-                    large_threshold = max(2000, median_amount * 2.5)
-                    large_expenses = df[df['amount'] > large_threshold]
-                    for _, row in large_expenses.iterrows():
-                        alerts.append(
-                            f"⚠️ Large Expense: ₹{row['amount']:.2f} for {row['name']} "
-                            f"(exceeds ₹{large_threshold:.2f} threshold)"
-                        )
-                    
-                    # Detection 2: Weekly bill clusters (3+ bills/week)
-                    bills = df[df['category'].str.lower().str.contains('bill')]
-                    if not bills.empty:
-                        bills['week'] = bills['date'].dt.to_period('W').apply(lambda r: r.start_time)
-                        weekly_bills = bills.groupby('week').agg(
-                            count=('amount', 'count'),
-                            total=('amount', 'sum')
-                        ).reset_index()
-                        
-                        for _, row in weekly_bills[weekly_bills['count'] >= 2].iterrows():
-                            alerts.append(
-                                f"⚠️ Bill Cluster: {row['count']} bills totaling "
-                                f"₹{row['total']:.2f} (week of {row['week'].strftime('%m/%d')})"
-                            )
-                    
-                    # Detection 3: Category anomalies (IQR method)
-                    df['week'] = df['date'].dt.to_period('W')
-                    for (category, week), group in df.groupby(['category', 'week']):
-                        if len(group) > 1:
-                            amounts = group['amount'].values.astype(float)
-                            q1, q3 = np.percentile(amounts, [25, 75])
-                            iqr = q3 - q1
-                            lower, upper = q1 - 1.5*iqr, q3 + 1.5*iqr
-                            
-                            anomalies = group[(group['amount'] < lower) | (group['amount'] > upper)]
-                            for _, row in anomalies.iterrows():
-                                alerts.append(
-                                    f"⚠️ Unusual {category} spending: ₹{row['amount']:.2f} "
-                                    f"(typical range: ₹{lower:.2f}-₹{upper:.2f})"
-                                )
-                    
-                    context["anomaly_alerts"] = alerts[:5]  # Show max 5 alerts
-
-            except Exception as e:
-                print(f"Anomaly detection error: {str(e)}")
-                context["error"] = "Could not analyze spending patterns"
-
-        # 4. Prepare chart data with proper decimal handling
+        if summary_html is None or updating_income:
+            income_obj, created = Income.objects.get_or_create(user=request.user, defaults={'amount': Decimal('0')})
+            if summary_html is None:
+                income = float(income_obj.amount) if income_obj.amount else 0.0
+                context["remaining_income"] = income - total_expense
+                context["warning"] = context["remaining_income"] < 500
+
+            # Income form handling
+            if updating_income:
+                income_form = IncomeForm(request.POST, instance=income_obj)
+                if income_form.is_valid():
+                    income_form.save()
+                    income_changed(request.user.id)
+                    return redirect('dashboard')
+            else:
+                income_form = IncomeForm(instance=income_obj)
+            context["income_form"] = income_form
+            context["income_obj"] = income_obj 
+
+        # Budgets: period and burn-window spend from the rollups
+        context["budgets"] = budgets.status(request.user)
+
+        # 3. Anomaly detection: last computed alerts, recomputed after writes
         try:
-            dates = [e.date.strftime("%Y-%m-%d") for e in expenses]
-            amounts = [float(e.amount) for e in expenses]  # Convert Decimal to float
-            context["dates"] = json.dumps(dates)
-            context["amounts"] = json.dumps(amounts)
+            alerts = anomaly_cache.get_alerts(request.user.id)
+            context["anomaly_alerts"] = json.dumps([alert.message for alert in alerts]).replace('<', '\\u003c')
         except Exception as e:
-            print(f"Chart data error: {str(e)}")
-            context["error"] = "Could not prepare chart data"
+            print(f"Anomaly detection error: {str(e)}")
+            context["error"] = "Could not analyze spending patterns"
 
-        return render(request, "tracker/dashboard.html", context)
+        with perf.span('render'):
+            return render(request, "tracker/dashboard.html", context)
 
     except Exception as e:
         print(f"Dashboard error: {str(e)}")
         context["error"] = "System error loading dashboard"
         return render(request, "tracker/dashboard.html", context)
+
+
+def _date_range(request):
+    """Optional start/end=YYYY-MM-DD query params; ValueError names the bad one."""
+    bounds = []
+    for key in ('start', 'end'):
+        value = request.GET.get(key)
+        try:
+            day = parse_date(value) if value else None
+        except ValueError:
+            day = None
+        if value and day is None:
+            raise ValueError(f"{key} must be a YYYY-MM-DD date")
+        bounds.append(day)
+    return bounds
+
+
+@login_required
+@replica_reads
+@sync.conditional_on_data
+async def chart_data(request):
+    """
+    Chart.js series bucketed server-side. Query params: bucket=day|week|month
+    (default: picked from the range), start/end=YYYY-MM-DD (default: all data).
+    """
+    try:
+        start, end = _date_range(request)
+    except ValueError as e:
+        return JsonResponse({"error": str(e)}, status=400)
+    bucket = request.GET.get('bucket') or None
+    if bucket not in (None,) + rollups.BUCKETS:
+        return JsonResponse({"error": f"bucket must be one of {', '.join(rollups.BUCKETS)}"}, status=400)
+
+    user = await request.auser()
+    with perf.span('chart'):
+        bucket, series = await sync_to_async(rollups.bucketed_series)(user, bucket, start, end)
+    return JsonResponse({
+        "bucket": bucket,
+        "labels": [period.strftime("%Y-%m-%d") for period, _ in series],
+        "amounts": [float(amount) for _, amount in series],
+    })
+
+
 @login_required
-def add_expense(request):
+@replica_reads
+@sync.conditional_on_data
+async def forecast_data(request):
+    """Projected spend per category for next month, cached until expenses change."""
+    user = await request.auser()
+    return JsonResponse(await sync_to_async(forecast_cache.get_forecast)(user.id))
+
+
+@login_required
+@replica_reads
+def search_expenses(request):
+    """Text search over names and categories with category, date and amount filters; keyset paged."""
+    form = SearchForm(request.GET)
+    expenses, next_query = [], None
+    if form.is_valid():
+        filters = form.cleaned_data
+        with perf.span('search'):
+            expenses, next_cursor = search.search(
+                request.user, filters['q'], filters['category'], filters['start'], filters['end'],
+                filters['min_amount'], filters['max_amount'], cursor=request.GET.get('after'),
+            )
+        if next_cursor:
+            params = request.GET.copy()
+            params['after'] = next_cursor
+            next_query = params.urlencode()
+    return render(request, 'tracker/search.html', {'form': form, 'expenses': expenses, 'next_query': next_query})
+
+
+@login_required
+def export_expenses(request, fmt):
+    """Stream the user's expenses as CSV or NDJSON; optional start, end and category filters."""
+    if fmt not in exporter.FORMATS:
+        return HttpResponseBadRequest(f"format must be one of {', '.join(exporter.FORMATS)}")
+    try:
+        start, end = _date_range(request)
+    except ValueError as e:
+        return HttpResponseBadRequest(str(e))
+
+    rows = exporter.export_rows(request.user, start, end, request.GET.get('category') or None)
+    content_type, extension = exporter.FORMATS[fmt]
+    response = StreamingHttpResponse(exporter.encode(rows, fmt), content_type=content_type)
+    response['Content-Disposition'] = f'attachment; filename="expenses.{extension}"'
+    return response
+
+
+def _save_new_expense(expense, predict_later):
+    # The row and its rollup delta commit together, or neither does.
+    with transaction.atomic():
+        expense.save()
+        rollups.record_expense(expense)
+    expenses_changed(expense.user_id)
+    if predict_later:
+        categorizer.categorize_later(expense)
+
+
+@login_required
+async def add_expense(request):
+    # Async so a remote category prediction waits without holding a worker thread.
+    user = await request.auser()
     if request.method == 'POST':
         form = ExpenseForm(request.POST)
         if form.is_valid():
             expense = form.save(commit=False)
-            expense.user = request.user
+            expense.user = user
             
             # If category is empty or "Other", try to predict it
+            predict_later = False
             if not expense.category or expense.category == 'Other':
-                expense.category = gemini_predict_category(expense.name)
-               
+                if settings.TRACKER_CATEGORY_ASYNC:
+                    # Save now; the background queue fills in the category
+                    expense.category = categorizer.cached_category(expense.name) or 'Other'
+                    predict_later = expense.category == 'Other'
+                else:
+                    expense.category = await apredict_category(expense.name)
             
-            expense.save()
+            await sync_to_async(_save_new_expense)(expense, predict_later)
             return redirect('dashboard')
     else:
         form = ExpenseForm()
-    return render(request, 'tracker/add_expense.html', {'form': form})
+    return await sync_to_async(render)(request, 'tracker/add_expense.html', {'form': form})
+
+
+@login_required
+def budget_list(request):
+    """List the user's budgets; POST adds one or replaces the limit of the same category/period."""
+    if request.method == 'POST':
+        form = BudgetForm(request.POST)
+        if form.is_valid():
+            Budget.objects.update_or_create(
+                user=request.user,
+                category=form.cleaned_data['category'],
+                period=form.cleaned_data['period'],
+                defaults={'limit': form.cleaned_data['limit']},
+            )
+            budgets_changed(request.user.id)
+            return redirect('budgets')
+    else:
+        form = BudgetForm()
+    return render(request, 'tracker/budgets.html', {
+        'form': form,
+        'statuses': budgets.status(request.user),
+    })
+
+
+@login_required
+def delete_budget(request, budget_id):
+    if request.method == 'POST':
+        if Budget.objects.filter(id=budget_id, user=request.user).delete()[0]:
+            Tombstone.objects.create(user=request.user, kind='budget', object_id=budget_id)
+            budgets_changed(request.user.id)
+    return redirect('budgets')
+
+
+@login_required
+def recurring_list(request):
+    """Scheduled series plus series detected in the history; POST schedules or stops one."""
+    if request.method == 'POST':
+        if 'stop' in request.POST:
+            RecurringExpense.objects.filter(id=request.POST['stop'], user=request.user).update(active=False)
+        elif 'schedule' in request.POST:
+            for candidate in recurring.detect(request.user):
+                if f"{candidate.name}|{candidate.amount}|{candidate.cadence}" == request.POST['schedule']:
+                    recurring.schedule(request.user, candidate)
+                    break
+        return redirect('recurring')
+
+    return render(request, 'tracker/recurring.html', {
+        'scheduled': RecurringExpense.objects.filter(user=request.user, active=True).order_by('next_date'),
+        'candidates': recurring.detect(request.user),
+    })
+
+
+@login_required
+def import_expenses(request):
+    result = None
+    if request.method == 'POST':
+        form = ImportForm(request.POST, request.FILES)
+        if form.is_valid():
+            upload = form.cleaned_data['file']
+            fmt = form.cleaned_data['format'] or importer.detect_format(upload.name)
+            try:
+                result = importer.import_file(request.user, upload.file, fmt)
+            except (ValueError, csv.Error) as e:
+                form.add_error('file', str(e))
+            else:
+                form = ImportForm()
+    else:
+        form = ImportForm()
+    return render(request, 'tracker/import_expenses.html', {'form': form, 'result': result})
 
 
 @login_required
@@ -232,13 +326,21 @@ def delete_expense(request, id):
     expense = get_object_or_404(Expense, id=id, user=request.user)
     
     if request.method == 'POST':
-        expense.delete()
+        _delete_expense(expense)
         return redirect('dashboard')
     
     # For delete via modal (GET request)
-    expense.delete()
+    _delete_expense(expense)
     return redirect('dashboard')
 
+
+def _delete_expense(expense):
+    with transaction.atomic():
+        rollups.forget_expense(expense)
+        sync.record_deletions([expense])
+        expense.delete()
+    expenses_changed(expense.user_id)
+
 def user_logout(request):
     logout(request)
     return redirect('login')
@@ -247,9 +349,13 @@ def update_expense(request, expense_id):
     expense = get_object_or_404(Expense, id=expense_id, user=request.user)
 
     if request.method == "POST":
+        before = rollups.snapshot(expense)  # the form mutates the instance while validating
         form = ExpenseForm(request.POST, instance=expense)
         if form.is_valid():
-            form.save()
+            with transaction.atomic():
+                form.save()
+                rollups.move_expense(before, expense)
+            expenses_changed(request.user.id)
             return redirect("dashboard")  # Redirect to dashboard after updating
     else:
         form = ExpenseForm(instance=expense)  # Pre-fill the form with existing data
@@ -271,6 +377,7 @@ def set_income(request):
             new_income = form.save(commit=False)
             new_income.user = request.user
             new_income.save()
+            income_changed(request.user.id)
             return redirect('dashboard')
     else:
         form = IncomeForm(instance=income)
@@ -285,8 +392,12 @@ def recategorize(request, expense_id):
     if request.method == 'POST':
         new_category = request.POST.get('category')
         if new_category in STANDARD_CATEGORIES:
+            before = rollups.snapshot(expense)
             expense.category = new_category
-            expense.save()
+            with transaction.atomic():
+                expense.save()
+                rollups.move_expense(before, expense)
+            expenses_changed(request.user.id)
             return redirect('dashboard')
     
     return render(request, 'tracker/recategorize.html', {